@@ -1,22 +1,40 @@
 import click
+import contextlib
 import json
+import os
 import sys
-from rich.console import Console
-from rich.table import Table
-from rich.panel import Panel
-from rich.progress import Progress, SpinnerColumn, TextColumn
+from datetime import datetime, timedelta
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
 from rich import box
 
-from ironflow.core.engine import IronEngine
 from ironflow.core.config import config
 from ironflow.core.logger import logger, print_banner, console
 from ironflow.core.error_handler import handle_exception
-from ironflow.risk.scorer import RiskScorer
-from ironflow.topology.graph_builder import TopologyMapper
-from ironflow.discovery.active import ActiveDiscovery
-from ironflow.discovery.passive import PassiveDiscovery
-from ironflow.core.database import AssetDatabase
-from ironflow.reporting.generator import ReportGenerator
+from ironflow.discovery.targets import TargetSet, read_target_file, split_specs
+# Cheap: scapy is only imported by the passive code paths that need it
+from ironflow.discovery.passive import PassiveDiscovery, expand_sources, DEFAULT_SHARD_SIZE
+
+# Everything else (asyncio engine, SQLite, YAML rules, reporting, protocol
+# plugins) is imported inside the commands that use it, to keep
+# startup fast for scripted runs.
+if TYPE_CHECKING:
+    from ironflow.core.engine import IronEngine
+
+# Assets saved per transaction while a scan streams results
+DB_BATCH_SIZE = 256
+
+def build_engine(use_cache: bool = True) -> "IronEngine":
+    """
+    Engine with all bundled plugins, sharing the persisted dead-host cache.
+    """
+    from ironflow.core.cache import NegativeCache
+    from ironflow.core.database import DEFAULT_DB_PATH
+    from ironflow.core.engine import IronEngine, BUNDLED_PLUGIN_PACKAGES
+
+    cache = NegativeCache.for_database(DEFAULT_DB_PATH) if use_cache else None
+    engine = IronEngine(negative_cache=cache)
+    engine.discover_plugins(package_paths=BUNDLED_PLUGIN_PACKAGES)
+    return engine
 
 @click.group()
 @click.version_option(version="0.1.0")
@@ -32,75 +50,234 @@ def cli(debug):
     print_banner()
 
 @cli.command()
-@click.option("--target", required=True, help="Target IP or CIDR")
+@click.option("--target", multiple=True, help="Target IP, CIDR, range (10.0.0.1-50) or hostname; comma-separated and repeatable")
+@click.option("--target-file", type=click.Path(exists=True, dir_okay=False), multiple=True, help="File of targets, one or more per line")
+@click.option("--exclude", multiple=True, help="Addresses, CIDRs or ranges to skip; comma-separated and repeatable")
+@click.option("--exclude-file", type=click.Path(exists=True, dir_okay=False), multiple=True, help="File of addresses/ranges to skip")
+@click.option("--sequential", is_flag=True, help="Scan addresses in order instead of a randomized permutation")
+@click.option("--seed", type=int, help="Seed for the randomized scan order (reproducible runs)")
 @click.option("--protocol", type=click.Choice(["modbus", "s7", "dnp3", "bacnet", "ethernetip", "iec104", "opcua", "all"]), default="all")
 @click.option("--dangerous", is_flag=True, help="Disable SAFE_MODE (Allows write operations)")
 @click.option("--no-db", is_flag=True, help="Skip saving to local database")
 @click.option("--report", is_flag=True, help="Generate HTML report")
-def scan(target, protocol, dangerous, no_db, report):
+@click.option("--concurrency", type=click.IntRange(min=1), default=config.MAX_CONCURRENCY, show_default=True, help="Maximum probes in flight")
+@click.option("--per-host", type=click.IntRange(min=1), default=config.MAX_PER_HOST, show_default=True, help="Maximum concurrent probes per host")
+@click.option("--rate", type=click.FloatRange(min=0), default=config.RATE_LIMIT_GLOBAL, show_default=True, help="Overall probe rate limit (probes/s, 0 = unlimited)")
+@click.option("--host-rate", type=click.FloatRange(min=0), default=config.RATE_LIMIT_HOST, show_default=True, help="Per-device probe rate limit (probes/s, 0 = unlimited)")
+@click.option("--no-presweep", is_flag=True, help="Skip the port sweep and handshake every protocol on every host")
+@click.option("--no-cache", is_flag=True, help="Ignore and do not update the dead-host cache")
+@click.option("--broadcast", is_flag=True, help="Discover BACnet/EtherNet/IP devices with one broadcast per fully targeted /24")
+@click.option("--broadcast-window", type=click.FloatRange(min=0), default=config.BROADCAST_WINDOW, show_default=True, help="Seconds to collect broadcast replies")
+@click.option("--broadcast-address", multiple=True, help="Send broadcast requests to these addresses instead of the derived /24 broadcasts; repeatable")
+@click.option("--incremental", is_flag=True, help="Only liveness-check hosts fully scanned within --fresh-ttl")
+@click.option("--fresh-ttl", type=click.IntRange(min=0), default=config.INCREMENTAL_TTL, show_default=True, help="Seconds a full scan of a host stays fresh in incremental mode")
+@click.option("--resume", is_flag=True, help="Continue an interrupted scan of the same target from its checkpoint journal")
+def scan(target, target_file, exclude, exclude_file, sequential, seed, protocol, dangerous, no_db, report, concurrency, per_host,
+         rate, host_rate, no_presweep, no_cache, broadcast, broadcast_window, broadcast_address, incremental, fresh_ttl, resume):
     """Scan targets for ICS protocols and assets"""
+    from rich.progress import Progress, SpinnerColumn, TextColumn
+    from rich.table import Table
+    from ironflow.core.database import AssetDatabase, DEFAULT_DB_PATH, merge_results
+    from ironflow.discovery.active import ActiveDiscovery, DEFAULT_PROTOCOLS
+    from ironflow.discovery.journal import ScanJournal
+    from ironflow.plugins.base import ipv4_address
+    from ironflow.reporting.generator import ReportGenerator
+    from ironflow.risk.scorer import RiskScorer
+
+    specs = split_specs(target) + [spec for path in target_file for spec in read_target_file(path)]
+    if not specs:
+        raise click.UsageError("Provide --target or --target-file")
+    excludes = split_specs(exclude) + [spec for path in exclude_file for spec in read_target_file(path)]
+    try:
+        targets = TargetSet(specs, excludes, randomize=not sequential, seed=seed)
+    except ValueError as e:
+        raise click.BadParameter(str(e), param_hint="--target/--exclude")
+    target = str(targets)
+
     if dangerous:
         if click.confirm("⚠️ [bold red]WARNING:[/] Dangerous mode will disable safety guards. Are you sure?", abort=True):
             config.disable_safe_mode()
 
-    engine = IronEngine()
-    engine.discover_plugins(package_paths=["ironflow.plugins", "ironflow.protocols"])
+    config.MAX_CONCURRENCY = concurrency
+    config.MAX_PER_HOST = per_host
+    config.RATE_LIMIT_GLOBAL = rate
+    config.RATE_LIMIT_HOST = host_rate
+    config.PRESWEEP = not no_presweep
+    config.BROADCAST_DISCOVERY = broadcast or bool(broadcast_address)
+    config.BROADCAST_WINDOW = broadcast_window
+    try:
+        config.BROADCAST_ADDRESSES = [str(ipv4_address(address)) for address in split_specs(broadcast_address)]
+    except ValueError as e:
+        raise click.BadParameter(str(e), param_hint="--broadcast-address")
+
+    if incremental and no_db:
+        raise click.UsageError("--incremental reads the asset database and cannot be combined with --no-db")
+
+    engine = build_engine(use_cache=not no_cache)
     
     active = ActiveDiscovery(engine)
     protocols = None if protocol == "all" else [protocol]
+    db = None if no_db else AssetDatabase()
+
+    known = {}
+    if incremental:
+        fresh_since = (datetime.now() - timedelta(seconds=fresh_ttl)).isoformat()
+        known = {asset["target"]: asset for asset in db.find_assets(scanned_since=fresh_since)}
+        logger.info(f"Incremental scan: {len(known)} host(s) scanned within the last {fresh_ttl}s")
     
-    results = []
-    with Progress(
-        SpinnerColumn(),
-        TextColumn("[progress.description]{task.description}"),
-        transient=True,
-    ) as progress:
-        progress.add_task(description=f"Scanning {target}...", total=None)
-        results = active.scan_network(target, protocols)
+    # Checkpoints of finished probes/hosts, so an interrupted sweep can resume
+    journal = ScanJournal.for_database(DEFAULT_DB_PATH)
+    planned = protocols or DEFAULT_PROTOCOLS
+    if resume:
+        if not journal.load():
+            raise click.UsageError(f"No scan journal to resume at {journal.path}")
+        if not journal.matches(target, planned):
+            raise click.UsageError(f"The journal belongs to a scan of {journal.header.get('scan')}; rerun that scan to resume it")
+    journal.start(target, planned, resume=resume)
     
-    # Enrichment: Run risk assessment on each result
     scorer = RiskScorer()
-    db = None if no_db else AssetDatabase()
-    
-    table = Table(title=f"Scan Results for {target}", box=box.ROUNDED, show_header=True, header_style="bold magenta")
-    table.add_column("Target", style="cyan")
-    table.add_column("Protocol", style="green")
-    table.add_column("Risk Score", justify="right")
-    table.add_column("Severity", justify="center")
+    # Reports are aborted (temporary files removed) if the scan fails
+    with (ReportGenerator().stream() if report else contextlib.nullcontext()) as stream:
+        pending: List[Dict[str, Any]] = []
+        found = 0
     
-    for res in results:
-        assessment = scorer.calculate_risk([res])
-        res["risk"] = assessment
+        table = Table(title=f"Scan Results for {target}", box=box.ROUNDED, show_header=True, header_style="bold magenta")
+        table.add_column("Target", style="cyan")
+        table.add_column("Protocols", style="green")
+        table.add_column("Risk Score", justify="right")
+        table.add_column("Severity", justify="center")
+
+        def flush():
+            if db and pending:
+                db.save_assets(pending)
+                pending.clear()
+
+        # Pipeline: each host is scored, shown, saved and reported as it finishes
+        try:
+            with Progress(
+                SpinnerColumn(),
+                TextColumn("[progress.description]{task.description}"),
+                TextColumn("[dim]{task.completed}/{task.total} hosts"),
+                transient=True,
+            ) as progress:
+                task = progress.add_task(description=f"Scanning {target}...", total=targets.size)
+                for host, online in active.iter_hosts(targets, protocols, known, journal):
+                    progress.advance(task)
+                    if not online:
+                        continue
+                
+                    # Enrichment: one record and one risk assessment per host
+                    asset = merge_results(online)[0]
+                    assessment = scorer.calculate_risk([{"protocol": name} for name in asset["protocols"]])
+                    asset["risk"] = assessment
+                    found += 1
+
+                    severity_style = "bold red" if assessment["severity"] == "High" else "yellow" if assessment["severity"] == "Medium" else "green"
+                    row = (host, ", ".join(asset["protocols"]), str(assessment["score"]), f"[{severity_style}]{assessment['severity']}[/]")
+                    table.add_row(*row)
+                    progress.console.print(f"[bold green]+[/] [cyan]{row[0]}[/] [green]{row[1]}[/] {row[2]} {row[3]}")
+
+                    pending.append(asset)
+                    if len(pending) >= DB_BATCH_SIZE:
+                        flush()
+                    if stream:
+                        stream.add(asset)
+        except KeyboardInterrupt:
+            journal.close()
+            flush()
+            console.print("\n[bold yellow]Scan interrupted.[/] Completed work is saved; rerun with --resume to continue.")
+            sys.exit(130)
+        journal.discard()
+        flush()
         if db:
-            db.save_asset(res["target"], res)
-        
-        severity_style = "bold red" if assessment["severity"] == "High" else "yellow" if assessment["severity"] == "Medium" else "green"
-        table.add_row(
-            res["target"],
-            res["protocol"],
-            str(assessment["score"]),
-            f"[{severity_style}]{assessment['severity']}[/]"
-        )
+            db.close()
+        if engine.watchdog_events:
+            quarantined = sum(event["event"] == "quarantined" for event in engine.watchdog_events)
+            logger.warning(f"Watchdog: {len(engine.watchdog_events)} plugin call(s) exceeded their deadline, "
+                           f"{quarantined} plugin/host pair(s) quarantined")
             
-    if results:
-        console.print(table)
-        if report:
-            rep_gen = ReportGenerator()
-            rep_gen.generate_html({"results": results})
-            rep_gen.generate_json({"results": results})
-            console.print(f"\n[bold green]✓[/] Reports generated successfully.")
-    else:
-        logger.warning("No assets identified.")
+        if found:
+            console.print(table)
+            if stream:
+                stream.close()
+                console.print(f"\n[bold green]✓[/] Reports generated successfully.")
+        else:
+            if stream:
+                stream.abort()
+            logger.warning("No assets identified.")
+
+def run_passive(pcap, workers: int = 0, shard_size: int = DEFAULT_SHARD_SIZE // (1024 * 1024)):
+    """Run passive analysis over the given capture sources, with a status line."""
+    sources = expand_sources(pcap)
+    missing = [path for path in sources if path != "-" and not os.path.isfile(path)]
+    if not sources or missing:
+        raise click.BadParameter(f"No such capture: {', '.join(missing or pcap)}", param_hint="--pcap")
+
+    passive = PassiveDiscovery()
+    name = "stdin" if sources == ["-"] else sources[0] if len(sources) == 1 else f"{len(sources)} captures"
+    
+    with console.status(f"[bold green]Analyzing {name}...") as status:
+        def on_progress(packets, pps):
+            status.update(f"[bold green]Analyzing {name}... [dim]{packets:,} packets ({pps:,.0f} pkt/s)[/]")
+        if len(sources) == 1 and workers == 1:
+            # Simple case: stream the single capture in this process
+            results = passive.analyze_pcap(sources[0], progress=on_progress)
+        else:
+            # Also streams in this process when the captures make a single shard
+            results = passive.analyze_many(sources, workers=workers, shard_size=shard_size * 1024 * 1024, progress=on_progress)
+    if passive.flows.dropped:
+        logger.warning(f"Flow table full: {passive.flows.dropped} packets of new conversations were not tracked")
+    return passive, results
+
+def run_live(source, no_db: bool, flush_interval: float, buffer_size: int, duration: Optional[float]):
+    """Continuous passive analysis of an interface, pipe or growing capture file."""
+    from ironflow.core.database import AssetDatabase
+
+    passive = PassiveDiscovery()
+    db = None if no_db else AssetDatabase()
+    name = "stdin" if source == "-" else source
+
+    with console.status(f"[bold green]Live analysis of {name}... [dim](Ctrl+C to stop)[/]") as status:
+        def on_progress(packets, pps):
+            status.update(f"[bold green]Live analysis of {name}... [dim]{packets:,} packets ({pps:,.0f} pkt/s), Ctrl+C to stop[/]")
+        results = passive.analyze_live(source, db=db, flush_interval=flush_interval, buffer_size=buffer_size,
+                                       duration=duration, progress=on_progress)
+    if db:
+        db.close()
+    return passive, results
 
 @cli.command()
-@click.option("--pcap", required=True, type=click.Path(exists=True), help="PCAP file to analyze")
+@click.option("--pcap", multiple=True, help="PCAP/PCAPNG file, directory or glob to analyze ('-' reads stdin); repeatable")
+@click.option("--live", help="Continuously analyze an interface, a pipe ('-' for stdin) or a capture file still being written")
+@click.option("--workers", type=click.IntRange(min=0), default=0, show_default=True, help="Analysis processes (0 = one per CPU)")
+@click.option("--shard-size", type=click.IntRange(min=1), default=DEFAULT_SHARD_SIZE // (1024 * 1024), show_default=True, help="Split pcap files larger than this many MiB across workers")
+@click.option("--flush-interval", type=click.FloatRange(min=0, min_open=True), default=config.LIVE_FLUSH_INTERVAL, show_default=True, help="Live mode: seconds between asset database flushes")
+@click.option("--buffer", "buffer_size", type=click.IntRange(min=1), default=config.LIVE_BUFFER_SIZE, show_default=True, help="Live mode: packets buffered before the oldest are dropped")
+@click.option("--duration", type=click.FloatRange(min=0), help="Live mode: stop after this many seconds")
+@click.option("--no-db", is_flag=True, help="Skip saving to local database")
+@click.option("--topology", "topology_path", type=click.Path(), help="Export the observed conversation graph as JSON")
 @click.option("--report", is_flag=True, help="Generate HTML report")
-def analyze(pcap, report):
+def analyze(pcap, live, workers, shard_size, flush_interval, buffer_size, duration, no_db, topology_path, report):
     """Analyze PCAP file for ICS traffic (Passive Discovery)"""
-    passive = PassiveDiscovery()
-    
-    with console.status(f"[bold green]Analyzing {pcap}...") as status:
-        results = passive.analyze_pcap(pcap)
+    from rich.table import Table
+    from ironflow.core.database import AssetDatabase
+    from ironflow.reporting.generator import ReportGenerator
+    from ironflow.topology.graph_builder import TopologyMapper
+
+    if bool(pcap) == bool(live):
+        raise click.UsageError("Provide either --pcap or --live")
+    if live:
+        passive, results = run_live(live, no_db, flush_interval, buffer_size, duration)
+    else:
+        passive, results = run_passive(pcap, workers, shard_size)
+        if results and not no_db:
+            with AssetDatabase() as db:
+                db.save_assets(results)
+
+    if topology_path:
+        mapper = TopologyMapper()
+        mapper.export_json(mapper.build_graph(results, passive.flows), topology_path)
+        console.print(f"[bold green]✓[/] Topology exported to {topology_path}")
     
     if results:
         table = Table(title="Passive Analysis Findings", box=box.ROUNDED)
@@ -123,17 +300,14 @@ def analyze(pcap, report):
 @click.option("--target", required=True, help="Target IP or CIDR to assess")
 def risk(target):
     """Assess risk level for a specific target"""
-    engine = IronEngine()
-    engine.discover_plugins(package_paths=["ironflow.plugins", "ironflow.protocols"])
-    
-    findings = []
-    protocols = ["modbus", "s7", "dnp3", "bacnet", "ethernetip", "iec104", "opcua"]
+    from rich.panel import Panel
+    from ironflow.discovery.active import ActiveDiscovery
+    from ironflow.risk.scorer import RiskScorer
+
+    engine = build_engine()
     
     with console.status(f"[bold yellow]Performing risk assessment on {target}...") as status:
-        for protocol in protocols:
-            res = engine.run_plugin(protocol, target)
-            if res and res.get("online"):
-                findings.append(res)
+        findings = ActiveDiscovery(engine).scan_network(target)
             
     scorer = RiskScorer()
     assessment = scorer.calculate_risk(findings)
@@ -152,24 +326,29 @@ def risk(target):
     ))
 
 @cli.command()
-@click.option("--target", required=True, help="Target network to map")
+@click.option("--target", help="Target network to map")
+@click.option("--pcap", multiple=True, help="Capture(s) whose conversations provide the edges; repeatable")
 @click.option("--export", type=click.Path(), help="Path to export JSON topology")
-def topology(target, export):
-    """Map network topology based on active discovery"""
-    engine = IronEngine()
-    engine.discover_plugins(package_paths=["ironflow.plugins", "ironflow.protocols"])
-    
-    findings = []
-    protocols = ["modbus", "s7", "dnp3", "bacnet", "ethernetip", "iec104", "opcua"]
-    
-    with console.status(f"[bold cyan]Mapping topology for {target}...") as status:
-        for protocol in protocols:
-            res = engine.run_plugin(protocol, target)
-            if res and res.get("online"):
-                findings.append(res)
+def topology(target, pcap, export):
+    """Map network topology from active discovery and/or captured traffic"""
+    from rich.panel import Panel
+    from ironflow.discovery.active import ActiveDiscovery
+    from ironflow.topology.graph_builder import TopologyMapper
+
+    if not target and not pcap:
+        raise click.UsageError("Provide --target, --pcap or both")
+
+    findings, flows = [], None
+    if pcap:
+        passive, findings = run_passive(pcap)
+        flows = passive.flows
+    if target:
+        engine = build_engine()
+        with console.status(f"[bold cyan]Mapping topology for {target}...") as status:
+            findings = findings + ActiveDiscovery(engine).scan_network(target)
             
     mapper = TopologyMapper()
-    graph = mapper.build_graph(findings)
+    graph = mapper.build_graph(findings, flows)
     
     if export:
         mapper.export_json(graph, export)
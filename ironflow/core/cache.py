@@ -0,0 +1,118 @@
+import json
+import os
+import time
+from typing import Dict, List, Optional
+from ironflow.core.config import config
+from ironflow.core.logger import logger
+from ironflow.core.storage import write_json
+
+NEGATIVE_CACHE_FILE = "dead_hosts.json"
+
+class NegativeCache:
+    """
+    TTL cache of negative probe outcomes shared by every plugin in a run.
+    Records hosts that did not answer at all, individual services that
+    refused connections, and the watchdog's deadline overruns and
+    quarantined plugins per host, optionally persisted so later runs skip
+    them too.
+    """
+
+    def __init__(self, path: Optional[str] = None, ttl: Optional[float] = None):
+        self.path = path
+        self.ttl = ttl if ttl is not None else config.NEGATIVE_CACHE_TTL
+        # key -> expiry (epoch seconds)
+        self.hosts: Dict[str, float] = {}
+        self.services: Dict[str, float] = {}
+        # "target|plugin" -> [consecutive overruns, expiry], and quarantine expiry
+        self.overruns: Dict[str, List[float]] = {}
+        self.quarantined: Dict[str, float] = {}
+        if path:
+            self._load()
+
+    @classmethod
+    def for_database(cls, db_path: str, ttl: Optional[float] = None) -> "NegativeCache":
+        """
+        Cache persisted next to the given AssetDatabase file.
+        """
+        directory = os.path.dirname(os.path.abspath(db_path))
+        return cls(os.path.join(directory, NEGATIVE_CACHE_FILE), ttl)
+
+    @staticmethod
+    def _service_key(target: str, transport: str, port: int) -> str:
+        return f"{target}|{transport}|{port}"
+
+    @staticmethod
+    def _plugin_key(target: str, plugin: str) -> str:
+        return f"{target}|{plugin.lower()}"
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r") as f:
+                data = json.load(f)
+            now = time.time()
+            self.hosts = {k: v for k, v in data.get("hosts", {}).items() if v > now}
+            self.services = {k: v for k, v in data.get("services", {}).items() if v > now}
+            self.overruns = {k: v for k, v in data.get("overruns", {}).items() if v[1] > now}
+            self.quarantined = {k: v for k, v in data.get("quarantined", {}).items() if v > now}
+        except Exception as e:
+            logger.error(f"Failed to load negative cache: {e}")
+
+    def save(self):
+        if not self.path:
+            return
+        now = time.time()
+        data = {
+            "hosts": {k: v for k, v in self.hosts.items() if v > now},
+            "services": {k: v for k, v in self.services.items() if v > now},
+            "overruns": {k: v for k, v in self.overruns.items() if v[1] > now},
+            "quarantined": {k: v for k, v in self.quarantined.items() if v > now},
+        }
+        try:
+            write_json(self.path, data)
+        except Exception as e:
+            logger.error(f"Failed to save negative cache: {e}")
+
+    @staticmethod
+    def _alive(entries: Dict[str, float], key: str) -> bool:
+        expiry = entries.get(key)
+        if expiry is None:
+            return False
+        if expiry <= time.time():
+            del entries[key]
+            return False
+        return True
+
+    def mark_unreachable(self, target: str):
+        self.hosts[target] = time.time() + self.ttl
+
+    def mark_refused(self, target: str, transport: str, port: int):
+        self.services[self._service_key(target, transport, port)] = time.time() + self.ttl
+
+    def record_overrun(self, target: str, plugin: str) -> int:
+        """Count one more consecutive deadline overrun; returns the count."""
+        key = self._plugin_key(target, plugin)
+        entry = self.overruns.get(key)
+        count = entry[0] + 1 if entry is not None and entry[1] > time.time() else 1
+        self.overruns[key] = [count, time.time() + self.ttl]
+        return int(count)
+
+    def clear_overruns(self, target: str, plugin: str):
+        self.overruns.pop(self._plugin_key(target, plugin), None)
+
+    def quarantine(self, target: str, plugin: str):
+        self.quarantined[self._plugin_key(target, plugin)] = time.time() + self.ttl
+
+    def is_quarantined(self, target: str, plugin: str) -> bool:
+        return self._alive(self.quarantined, self._plugin_key(target, plugin))
+
+    def is_dead(self, target: str) -> bool:
+        return self._alive(self.hosts, target)
+
+    def is_refused(self, target: str, transport: str, port: int) -> bool:
+        return self._alive(self.services, self._service_key(target, transport, port))
+
+    def should_skip(self, target: str, transport: str, port: int) -> bool:
+        """True while the host or this particular service is known to be dead."""
+        return self.is_dead(target) or self.is_refused(target, transport, port)
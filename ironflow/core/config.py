@@ -1,5 +1,6 @@
 import os
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+from typing import Dict, List
 
 @dataclass
 class IronConfig:
@@ -8,8 +9,60 @@ class IronConfig:
     """
     SAFE_MODE: bool = True
     LOG_LEVEL: str = "INFO"
-    TIMEOUT: int = 5
+    # Probe timeout (s): initial and upper bound of the adaptive per-subnet
+    # estimate, which never drops below TIMEOUT_MIN.
+    TIMEOUT: float = 3.0
+    TIMEOUT_MIN: float = 0.25
+    # The estimate only bounds connects, which time the network. Waits for
+    # an application reply (a PLC stack, a serial gateway polling the
+    # device behind it) are never shorter than READ_TIMEOUT.
+    READ_TIMEOUT: float = 3.0
+    # Modbus: seconds to keep waiting for the other unit IDs once one
+    # answered (stretched for devices slower than that, see ModbusScanner).
+    MODBUS_UNIT_GAP: float = 1.0
+    # Later passes re-probing ambiguous (timed-out) probes, waiting
+    # RETRY_BACKOFF * 2**n seconds before pass n.
     RETRIES: int = 2
+    RETRY_BACKOFF: float = 1.0
+    # Watchdog: hard wall-clock limit (s) on a single plugin call, and the
+    # number of consecutive overruns (counted across retry passes and runs)
+    # after which a plugin is quarantined for that host for NEGATIVE_CACHE_TTL.
+    PLUGIN_DEADLINE: float = 15.0
+    QUARANTINE_AFTER: int = 2
+    # Active scan concurrency: probes in flight overall and against one host.
+    MAX_CONCURRENCY: int = 256
+    MAX_PER_HOST: int = 1
+    # Non-blocking port sweep run before protocol handshakes.
+    PRESWEEP: bool = True
+    SWEEP_TIMEOUT: float = 1.0
+    # Subnet-wide discovery for protocols with a broadcast request (BACnet
+    # Who-Is, EtherNet/IP ListIdentity): one request per fully targeted
+    # /24 (or per explicit address), replies collected for BROADCAST_WINDOW s.
+    BROADCAST_DISCOVERY: bool = False
+    BROADCAST_WINDOW: float = 3.0
+    BROADCAST_ADDRESSES: List[str] = field(default_factory=list)
+    # Seconds an unreachable host or refused port is skipped by later probes/runs.
+    NEGATIVE_CACHE_TTL: int = 3600
+    # `scan --incremental`: hosts fully probed within this many seconds only
+    # get a liveness check of their known services.
+    INCREMENTAL_TTL: int = 86400
+    # Upper bound on distinct conversations tracked during passive analysis.
+    FLOW_TABLE_MAX: int = 1000000
+    # Live capture: packets buffered between reader and analyzer (oldest are
+    # dropped when full) and seconds between asset database flushes.
+    LIVE_BUFFER_SIZE: int = 65536
+    LIVE_FLUSH_INTERVAL: float = 5.0
+    # Probe rate limits in probes/second (0 disables a limit). Host and
+    # subnet buckets are keyed by target IP and its /RATE_LIMIT_PREFIX network.
+    RATE_LIMIT_GLOBAL: float = 500.0
+    RATE_LIMIT_SUBNET: float = 50.0
+    RATE_LIMIT_HOST: float = 2.0
+    RATE_LIMIT_PREFIX: int = 24
+    # Stricter per-protocol limits for fragile stacks, applied on top of the above.
+    PROTOCOL_RATE_LIMITS: Dict[str, Dict[str, float]] = field(default_factory=lambda: {
+        "s7": {"host": 0.5, "subnet": 10.0},
+        "dnp3": {"host": 0.5, "subnet": 10.0},
+    })
     
     def __post_init__(self):
         # Allow environment variable override for CI/CD or advanced usage, 
@@ -1,49 +1,272 @@
 import json
 import os
-from typing import Dict, List, Any
+import sqlite3
+from contextlib import contextmanager
+from typing import Dict, Iterable, Iterator, List, Any, Optional, Tuple
 from datetime import datetime
 from ironflow.core.logger import logger
 
+DEFAULT_DB_PATH = "assets.db"
+# Store used before the SQLite backend; imported on first open.
+LEGACY_DB_PATH = "assets.json"
+
+# Bumped together with a new entry in MIGRATIONS (tracked in PRAGMA user_version).
+SCHEMA_VERSION = 3
+MIGRATIONS: Dict[int, Tuple[str, ...]] = {
+    1: (
+        """CREATE TABLE IF NOT EXISTS assets (
+            target TEXT PRIMARY KEY,
+            protocol TEXT,
+            details TEXT NOT NULL DEFAULT '{}',
+            risk TEXT NOT NULL DEFAULT '{}',
+            severity TEXT,
+            score REAL,
+            last_seen TEXT NOT NULL
+        )""",
+        "CREATE INDEX IF NOT EXISTS idx_assets_protocol ON assets (protocol)",
+        "CREATE INDEX IF NOT EXISTS idx_assets_severity ON assets (severity)",
+        "CREATE INDEX IF NOT EXISTS idx_assets_last_seen ON assets (last_seen)",
+    ),
+    # One host record plus one row per protocol it speaks
+    2: (
+        """CREATE TABLE asset_protocols (
+            target TEXT NOT NULL,
+            protocol TEXT NOT NULL,
+            port INTEGER,
+            source TEXT,
+            details TEXT NOT NULL DEFAULT '{}',
+            last_seen TEXT NOT NULL,
+            PRIMARY KEY (target, protocol)
+        )""",
+        """INSERT INTO asset_protocols (target, protocol, details, last_seen)
+           SELECT target, protocol, details, last_seen FROM assets WHERE protocol IS NOT NULL""",
+        """CREATE TABLE hosts (
+            target TEXT PRIMARY KEY,
+            risk TEXT NOT NULL DEFAULT '{}',
+            severity TEXT,
+            score REAL,
+            last_seen TEXT NOT NULL
+        )""",
+        "INSERT INTO hosts SELECT target, risk, severity, score, last_seen FROM assets ORDER BY rowid",
+        "DROP TABLE assets",
+        "ALTER TABLE hosts RENAME TO assets",
+        "CREATE INDEX idx_assets_severity ON assets (severity)",
+        "CREATE INDEX idx_assets_last_seen ON assets (last_seen)",
+        "CREATE INDEX idx_asset_protocols_protocol ON asset_protocols (protocol)",
+    ),
+    # When each host last got the full active probe set (incremental scans)
+    3: (
+        "ALTER TABLE assets ADD COLUMN last_scanned TEXT",
+        "CREATE INDEX idx_assets_last_scanned ON assets (last_scanned)",
+    ),
+}
+
+def merge_results(results: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Fold per-protocol discovery results into one asset record per host
+    (first-seen order), with a map of protocol -> port/source/details.
+    Hosts with at least one fully probed active result (not a liveness
+    check) get `last_scanned`.
+    """
+    now = datetime.now().isoformat()
+    assets: Dict[str, Dict[str, Any]] = {}
+    for res in results:
+        asset = assets.setdefault(res["target"], {"target": res["target"], "protocols": {}})
+        if res.get("source", "active") == "active" and not res.get("liveness"):
+            asset["last_scanned"] = now
+        asset["protocols"][res["protocol"]] = {
+            "port": res.get("port"),
+            "source": res.get("source", "active"),
+            "details": res.get("details", {}),
+        }
+    return list(assets.values())
+
 class AssetDatabase:
     """
-    Persistence layer for discovered ICS assets using a local JSON store.
+    Persistence layer for discovered ICS assets using a local SQLite store.
+    Each host has one record in `assets` (risk, last_seen) and one row per
+    protocol it speaks in `asset_protocols`, so a device answering several
+    protocols keeps all of them. The database runs in WAL mode with
+    indexes on target, protocol, severity and last_seen. An existing
+    `assets.json` next to the database is migrated on first open.
+
+    Asset records look like:
+    {"target": ..., "protocols": {name: {"port", "source", "details", "last_seen"}},
+     "risk": {...}, "last_seen": ..., "last_scanned": ...}
+    A single discovery result ({"target", "protocol", "details", ...}) is
+    accepted wherever a record is.
     """
 
-    def __init__(self, db_path: str = "assets.json"):
+    def __init__(self, db_path: str = DEFAULT_DB_PATH):
         self.db_path = db_path
-        self.assets = self._load_db()
+        is_new = not os.path.exists(db_path)
+        self.conn = sqlite3.connect(db_path, isolation_level=None)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self._migrate()
+        if is_new:
+            self._import_legacy()
 
-    def _load_db(self) -> Dict[str, Any]:
-        if os.path.exists(self.db_path):
-            try:
-                with open(self.db_path, "r") as f:
-                    return json.load(f)
-            except Exception as e:
-                logger.error(f"Failed to load asset database: {e}")
-        return {"assets": {}, "last_update": None}
+    def _migrate(self):
+        version = self.conn.execute("PRAGMA user_version").fetchone()[0]
+        for target_version in range(version + 1, SCHEMA_VERSION + 1):
+            with self.batch():
+                for statement in MIGRATIONS[target_version]:
+                    self.conn.execute(statement)
+                self.conn.execute(f"PRAGMA user_version = {target_version}")
 
-    def save_asset(self, target: str, data: Dict[str, Any]):
+    @contextmanager
+    def batch(self) -> Iterator["AssetDatabase"]:
         """
-        Store or update an asset in the database.
+        Group every save made inside the block into one transaction,
+        committed when the outermost batch exits (rolled back on error).
         """
-        asset_info = {
-            "target": target,
-            "protocol": data.get("protocol"),
-            "details": data.get("details", {}),
-            "risk": data.get("risk", {}),
-            "last_seen": datetime.now().isoformat()
-        }
-        
-        self.assets["assets"][target] = asset_info
-        self.assets["last_update"] = datetime.now().isoformat()
-        self._commit()
+        if self.conn.in_transaction:
+            yield self
+            return
+        self.conn.execute("BEGIN")
+        try:
+            yield self
+        except BaseException:
+            self.conn.execute("ROLLBACK")
+            raise
+        self.conn.execute("COMMIT")
 
-    def _commit(self):
+    def _import_legacy(self):
+        legacy = os.path.join(os.path.dirname(os.path.abspath(self.db_path)), LEGACY_DB_PATH)
+        if not os.path.exists(legacy):
+            return
         try:
-            with open(self.db_path, "w") as f:
-                json.dump(self.assets, f, indent=4)
+            with open(legacy, "r") as f:
+                assets = json.load(f).get("assets", {})
+            self._write(assets.values())
+            os.replace(legacy, legacy + ".migrated")
+            logger.info(f"Migrated {len(assets)} asset(s) from {legacy}")
         except Exception as e:
+            logger.error(f"Failed to migrate legacy asset database: {e}")
+
+    @staticmethod
+    def _protocols(data: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+        protocols = data.get("protocols")
+        if protocols is None:
+            protocols = {data["protocol"]: data} if data.get("protocol") else {}
+        return protocols
+
+    def _write(self, assets: Iterable[Dict[str, Any]]):
+        """Upsert asset records (or single results) in a single transaction."""
+        host_rows, protocol_rows = [], []
+        for asset in assets:
+            last_seen = asset.get("last_seen") or datetime.now().isoformat()
+            risk = asset.get("risk") or {}
+            host_rows.append((
+                asset["target"], json.dumps(risk), risk.get("severity"), risk.get("score"), last_seen, asset.get("last_scanned"),
+            ))
+            for protocol, entry in self._protocols(asset).items():
+                protocol_rows.append((
+                    asset["target"], protocol, entry.get("port"), entry.get("source"),
+                    json.dumps(entry.get("details", {})), entry.get("last_seen") or last_seen,
+                ))
+        if not host_rows:
+            return
+        try:
+            with self.batch():
+                # Unscored records (e.g. passive findings) keep the stored risk
+                self.conn.executemany(
+                    """INSERT INTO assets (target, risk, severity, score, last_seen, last_scanned)
+                       VALUES (?, ?, ?, ?, ?, ?)
+                       ON CONFLICT (target) DO UPDATE SET
+                           risk = CASE WHEN excluded.severity IS NULL THEN assets.risk ELSE excluded.risk END,
+                           severity = COALESCE(excluded.severity, assets.severity),
+                           score = COALESCE(excluded.score, assets.score),
+                           last_seen = MAX(excluded.last_seen, assets.last_seen),
+                           last_scanned = COALESCE(excluded.last_scanned, assets.last_scanned)""",
+                    host_rows,
+                )
+                self.conn.executemany(
+                    """INSERT INTO asset_protocols (target, protocol, port, source, details, last_seen)
+                       VALUES (?, ?, ?, ?, ?, ?)
+                       ON CONFLICT (target, protocol) DO UPDATE SET
+                           port = COALESCE(excluded.port, asset_protocols.port),
+                           source = COALESCE(excluded.source, asset_protocols.source),
+                           details = excluded.details, last_seen = excluded.last_seen""",
+                    protocol_rows,
+                )
+        except sqlite3.Error as e:
             logger.error(f"Failed to commit asset database: {e}")
 
+    def save_asset(self, target: str, data: Dict[str, Any]):
+        """
+        Store or update an asset in the database.
+        """
+        self.save_assets([dict(data, target=target)])
+
+    def save_assets(self, results: Iterable[Dict[str, Any]]):
+        """
+        Store or update many assets (dicts with a "target" key) in one
+        transaction; inside batch() the commit is deferred further.
+        """
+        now = datetime.now().isoformat()
+        self._write(dict(res, last_seen=now) for res in results)
+
+    def _query(self, where: str = "", params: Iterable[Any] = ()) -> List[Dict[str, Any]]:
+        params = list(params)
+        assets = {
+            row["target"]: {
+                "target": row["target"],
+                "protocols": {},
+                "risk": json.loads(row["risk"]),
+                "last_seen": row["last_seen"],
+                "last_scanned": row["last_scanned"],
+            }
+            for row in self.conn.execute(f"SELECT * FROM assets{where} ORDER BY rowid", params)
+        }
+        if assets:
+            rows = self.conn.execute(
+                f"SELECT * FROM asset_protocols WHERE target IN (SELECT target FROM assets{where}) ORDER BY rowid", params
+            )
+            for row in rows:
+                assets[row["target"]]["protocols"][row["protocol"]] = {
+                    "port": row["port"],
+                    "source": row["source"],
+                    "details": json.loads(row["details"]),
+                    "last_seen": row["last_seen"],
+                }
+        return list(assets.values())
+
+    def get_asset(self, target: str) -> Optional[Dict[str, Any]]:
+        found = self._query(" WHERE target = ?", (target,))
+        return found[0] if found else None
+
     def get_all_assets(self) -> List[Dict[str, Any]]:
-        return list(self.assets["assets"].values())
+        return self._query()
+
+    def find_assets(self, protocol: Optional[str] = None, severity: Optional[str] = None,
+                    seen_since: Optional[str] = None, scanned_since: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Indexed query by protocol, risk severity, last_seen and/or
+        last_scanned (ISO timestamp lower bounds).
+        """
+        clauses, params = [], []
+        if protocol is not None:
+            clauses.append("target IN (SELECT target FROM asset_protocols WHERE protocol = ?)")
+            params.append(protocol)
+        for column, op, value in (("severity", "=", severity), ("last_seen", ">=", seen_since),
+                                  ("last_scanned", ">=", scanned_since)):
+            if value is not None:
+                clauses.append(f"{column} {op} ?")
+                params.append(value)
+        return self._query(f" WHERE {' AND '.join(clauses)}" if clauses else "", params)
+
+    @property
+    def last_update(self) -> Optional[str]:
+        return self.conn.execute("SELECT MAX(last_seen) FROM assets").fetchone()[0]
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
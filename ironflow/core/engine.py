@@ -1,59 +1,165 @@
+import asyncio
+import functools
 import importlib
-import pkgutil
-from typing import Dict, List, Type
+from datetime import datetime
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Any, AsyncIterator, Callable, Deque, Dict, Iterable, List, Optional, Tuple, Type
+from ironflow.core.cache import NegativeCache
+from ironflow.core.config import config
 from ironflow.core.logger import logger
+from ironflow.core.manifest import PluginManifest
+from ironflow.core.timing import RttEstimator
 from ironflow.plugins.base import BasePlugin
 
+# Most recent watchdog events kept on the engine
+WATCHDOG_EVENT_LOG = 1000
+# Packages holding the plugins shipped with IRONFLOW
+BUNDLED_PLUGIN_PACKAGES = ["ironflow.plugins", "ironflow.protocols"]
+
 class IronEngine:
     """
     Main orchestration engine for IRONFLOW.
     Loads and executes plugins.
     """
 
-    def __init__(self):
+    def __init__(self, negative_cache: Optional[NegativeCache] = None):
+        # Instantiated plugins, and "module:Class" of those not loaded yet
         self.plugins: Dict[str, BasePlugin] = {}
+        self.manifest: Dict[str, str] = {}
+        self._executor: Optional[ThreadPoolExecutor] = None
+        # Shared by all plugins so one dead host costs one timeout per run
+        self.negative_cache = negative_cache if negative_cache is not None else NegativeCache()
+        # Shared adaptive timeouts, learned from every reply
+        self.rtt = RttEstimator()
+        # Ambiguous probes (plugin name, target, kwargs) awaiting a later pass
+        self.retry_queue: List[Tuple[str, str, Dict[str, Any]]] = []
+        # Watchdog events (overruns, quarantines); the counters and the
+        # quarantine itself live in the negative cache
+        self.watchdog_events: Deque[Dict[str, Any]] = deque(maxlen=WATCHDOG_EVENT_LOG)
+        self._abandoned = 0
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        """
+        Thread pool used to run blocking plugins from the async scan engine.
+        Sized to the global in-flight limit so it never becomes the bottleneck.
+        """
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=max(1, config.MAX_CONCURRENCY),
+                thread_name_prefix="ironflow-probe"
+            )
+        return self._executor
+
+    def shutdown(self):
+        """
+        Release the plugin worker threads. Calls abandoned by the watchdog
+        are not waited for.
+        """
+        if self._executor is not None:
+            self._executor.shutdown(wait=not self._abandoned, cancel_futures=bool(self._abandoned))
+            self._executor = None
 
     def discover_plugins(self, package_paths: List[str] = ["plugins", "protocols"]):
         """
-        Dynamically discover and load plugins from multiple packages.
-        """
-        for package_path in package_paths:
-            logger.info(f"Scanning for plugins in {package_path}...")
-            try:
-                package = importlib.import_module(package_path)
-                # Ensure the package has a __path__
-                if not hasattr(package, "__path__"):
-                    continue
-                    
-                for loader, module_name, is_pkg in pkgutil.walk_packages(package.__path__):
-                    full_module_name = f"{package_path}.{module_name}"
-                    logger.debug(f"Checking module: {full_module_name}")
-                    
-                    try:
-                        module = importlib.import_module(full_module_name)
-                        for attribute_name in dir(module):
-                            attribute = getattr(module, attribute_name)
-                            
-                            if (isinstance(attribute, type) and 
-                                issubclass(attribute, BasePlugin) and 
-                                attribute is not BasePlugin and
-                                not attribute.__name__.startswith("Base")):
-                                
-                                # Instantiate the plugin
-                                try:
-                                    plugin_instance = attribute()
-                                    self.plugins[plugin_instance.name.lower()] = plugin_instance
-                                    logger.info(f"Loaded plugin: {plugin_instance.name}")
-                                except Exception as e:
-                                    # logger.error(f"Failed to load plugin {attribute_name}: {e}")
-                                    pass # Might be an abstract class or need args
-                    except Exception as e:
-                        logger.debug(f"Could not load module {full_module_name}: {e}")
-            except Exception as e:
-                logger.error(f"Error during plugin discovery in {package_path}: {e}")
+        Register the plugins found in the given packages and in installed
+        entry points. Only the cached manifest is read here; each plugin is
+        imported and instantiated the first time get_plugin asks for it.
+        """
+        try:
+            found = PluginManifest(package_paths).load()
+        except Exception as e:
+            logger.error(f"Error during plugin discovery in {package_paths}: {e}")
+            return
+        for name, spec in found.items():
+            self.manifest.setdefault(name, spec)
+            logger.debug(f"Registered plugin: {name} ({spec})")
+
+    def available_plugins(self) -> List[str]:
+        return sorted(set(self.manifest) | set(self.plugins))
+
+    def _load_plugin(self, name: str) -> Optional[BasePlugin]:
+        module_name, _, class_name = self.manifest[name].partition(":")
+        try:
+            plugin = getattr(importlib.import_module(module_name), class_name)()
+        except Exception as e:
+            logger.error(f"Failed to load plugin {name} from {self.manifest[name]}: {e}")
+            del self.manifest[name]
+            return None
+        self.plugins[name] = plugin
+        logger.debug(f"Loaded plugin: {plugin.name}")
+        return plugin
 
     def get_plugin(self, name: str) -> BasePlugin:
-        return self.plugins.get(name.lower())
+        plugin = self.plugins.get(name.lower())
+        if plugin is None and name.lower() in self.manifest:
+            plugin = self._load_plugin(name.lower())
+        return plugin
+
+    def is_known_dead(self, plugin: BasePlugin, target: str, **kwargs) -> bool:
+        """
+        Check the negative cache for the host, or the service the plugin would probe.
+        """
+        port = kwargs.get("port", getattr(plugin, "default_port", 0))
+        if self.negative_cache.should_skip(target, getattr(plugin, "transport", "tcp"), port):
+            logger.debug(f"Skipping {plugin.name} on {target}: cached as unreachable")
+            return True
+        return False
+
+    def is_quarantined(self, plugin: BasePlugin, target: str) -> bool:
+        if self.negative_cache.is_quarantined(target, plugin.name):
+            logger.debug(f"Skipping {plugin.name} on {target}: quarantined by the watchdog")
+            return True
+        return False
+
+    def _deadline(self, kwargs: Dict) -> float:
+        # Never shorter than one connect and one reply wait plus a grace period
+        return max(config.PLUGIN_DEADLINE, kwargs.get("timeout", 0) + config.READ_TIMEOUT + 1.0)
+
+    def _overrun(self, plugin: BasePlugin, target: str, deadline: float, kwargs: Dict) -> Optional[Dict[str, Any]]:
+        """
+        Record a call that missed its deadline and quarantine repeat
+        offenders. Returns a timed-out result, which the retry pass runs
+        again like any ambiguous probe, or None once quarantined.
+        """
+        event = "overrun"
+        if self.negative_cache.record_overrun(target, plugin.name) >= max(1, config.QUARANTINE_AFTER):
+            self.negative_cache.quarantine(target, plugin.name)
+            event = "quarantined"
+        self.watchdog_events.append({
+            "time": datetime.now().isoformat(),
+            "plugin": plugin.name,
+            "target": target,
+            "event": event,
+            "deadline": deadline,
+        })
+        logger.warning(f"Plugin {plugin.name} on {target} exceeded its {deadline:.1f}s deadline"
+                       + (" and is quarantined for this host" if event == "quarantined" else ""))
+        if event == "quarantined":
+            return None
+        return {
+            "target": target,
+            "port": kwargs.get("port", getattr(plugin, "default_port", 0)),
+            "protocol": getattr(plugin, "protocol", "") or plugin.name,
+            "online": False,
+            "details": {},
+            "timed_out": True,
+        }
+
+    def _completed(self, plugin: BasePlugin, target: str):
+        self.negative_cache.clear_overruns(target, plugin.name)
+
+    def _prepare(self, target: str, kwargs: Dict):
+        """Apply the adaptive timeout."""
+        kwargs.setdefault("timeout", self.rtt.timeout(target))
+
+    def _learn(self, target: str, result):
+        # Only a probe's connect time is an RTT sample (see ProtocolPlugin.connect);
+        # the rest of a handshake times the device's stack, not the network
+        rtt = result.pop("rtt", None) if isinstance(result, dict) else None
+        if rtt is not None:
+            self.rtt.observe(target, rtt)
 
     def run_plugin(self, name: str, target: str, **kwargs):
         plugin = self.get_plugin(name)
@@ -61,9 +167,217 @@ class IronEngine:
             logger.error(f"Plugin '{name}' not found.")
             return None
         
+        if self.is_known_dead(plugin, target, **kwargs) or self.is_quarantined(plugin, target):
+            return None
+
         logger.info(f"Running plugin: {plugin.name} on {target}")
+        self._prepare(target, kwargs)
+        deadline = self._deadline(kwargs)
+        future = self.executor.submit(plugin.run, target, **kwargs)
+        try:
+            result = future.result(timeout=deadline)
+            self._completed(plugin, target)
+            self._learn(target, result)
+            return result
+        except FutureTimeoutError:
+            # The worker thread cannot be interrupted; it is abandoned and
+            # its eventual result dropped
+            future.cancel()
+            self._abandoned += 1
+            return self._overrun(plugin, target, deadline, kwargs)
+        except Exception as e:
+            logger.error(f"Error running plugin {name}: {e}")
+            return None
+
+    async def run_plugin_async(self, name: str, target: str, **kwargs):
+        """
+        Coroutine counterpart of run_plugin.
+        Plugins exposing a native `run_async` coroutine are awaited directly;
+        classic blocking plugins are adapted through the engine thread pool.
+        Either way the call runs under the watchdog deadline: native
+        coroutines are cancelled, blocking calls abandoned to their thread.
+        """
+        plugin = self.get_plugin(name)
+        if not plugin:
+            logger.error(f"Plugin '{name}' not found.")
+            return None
+
+        if self.is_known_dead(plugin, target, **kwargs) or self.is_quarantined(plugin, target):
+            return None
+
+        logger.debug(f"Running plugin: {plugin.name} on {target}")
+        self._prepare(target, kwargs)
+        deadline = self._deadline(kwargs)
+        native = False
         try:
-            return plugin.run(target, **kwargs)
+            run_async = getattr(plugin, "run_async", None)
+            if run_async is not None and asyncio.iscoroutinefunction(run_async):
+                native = True
+                call = run_async(target, **kwargs)
+            else:
+                loop = asyncio.get_running_loop()
+                call = loop.run_in_executor(
+                    self.executor, functools.partial(plugin.run, target, **kwargs)
+                )
+            result = await asyncio.wait_for(call, deadline)
+            self._completed(plugin, target)
+            self._learn(target, result)
+            return result
+        except asyncio.TimeoutError:
+            if not native:
+                self._abandoned += 1
+            return self._overrun(plugin, target, deadline, kwargs)
         except Exception as e:
             logger.error(f"Error running plugin {name}: {e}")
             return None
+
+    async def run_batch_async(self, name: str, targets: Iterable[str], **kwargs) -> Dict[str, Any]:
+        """
+        Probe many targets with one plugin; returns target -> result (None
+        when skipped or failed). Plugins with batch_size > 1 get the whole
+        block in one run_batch call on the thread pool, under a single
+        watchdog deadline; others fall back to concurrent run_plugin_async
+        calls.
+        """
+        plugin = self.get_plugin(name)
+        if not plugin:
+            logger.error(f"Plugin '{name}' not found.")
+            return {}
+        targets = list(targets)
+        if getattr(plugin, "batch_size", 1) <= 1:
+            found = await asyncio.gather(*(self.run_plugin_async(name, target, **kwargs) for target in targets))
+            return dict(zip(targets, found))
+
+        results: Dict[str, Any] = dict.fromkeys(targets)
+        live = [target for target in targets
+                if not self.is_known_dead(plugin, target, **kwargs) and not self.is_quarantined(plugin, target)]
+        if not live:
+            return results
+        logger.debug(f"Running plugin: {plugin.name} on {len(live)} target(s)")
+        kwargs.setdefault("timeout", max(self.rtt.timeout(target) for target in live))
+        deadline = self._deadline(kwargs)
+        loop = asyncio.get_running_loop()
+        try:
+            found = await asyncio.wait_for(loop.run_in_executor(
+                self.executor, lambda: list(plugin.run_batch(live, **kwargs))
+            ), deadline)
+        except asyncio.TimeoutError:
+            self._abandoned += 1
+            for target in live:
+                results[target] = self._overrun(plugin, target, deadline, kwargs)
+            return results
+        except Exception as e:
+            logger.error(f"Error running plugin {name} on a batch: {e}")
+            return results
+        for result in found:
+            if isinstance(result, dict) and result.get("target") in results:
+                results[result["target"]] = result
+                self._completed(plugin, result["target"])
+                self._learn(result["target"], result)
+        return results
+
+    async def run_broadcast_async(self, name: str, addresses: Iterable[str], **kwargs) -> List[Dict[str, Any]]:
+        """
+        Subnet-wide discovery with a plugin that has a broadcast_payload:
+        one request per address, replies collected for `window` seconds
+        (IronConfig.BROADCAST_WINDOW). Returns one result per responder.
+        """
+        plugin = self.get_plugin(name)
+        if not plugin or getattr(plugin, "broadcast_payload", None) is None:
+            logger.error(f"Plugin '{name}' does not support broadcast discovery.")
+            return []
+        addresses = list(addresses)
+        window = kwargs.setdefault("window", config.BROADCAST_WINDOW)
+        logger.info(f"Broadcasting {plugin.protocol} discovery to {len(addresses)} address(es)...")
+        loop = asyncio.get_running_loop()
+        try:
+            return await asyncio.wait_for(loop.run_in_executor(
+                self.executor, lambda: list(plugin.run_broadcast(addresses, **kwargs))
+            ), window + config.PLUGIN_DEADLINE)
+        except asyncio.TimeoutError:
+            self._abandoned += 1
+            logger.warning(f"{plugin.name} broadcast discovery exceeded its deadline")
+        except Exception as e:
+            logger.error(f"Error running plugin {name} broadcast discovery: {e}")
+        return []
+
+    @staticmethod
+    def is_ambiguous(result) -> bool:
+        """True for a probe that timed out, as opposed to a refusal or an answer."""
+        return isinstance(result, dict) and bool(result.get("timed_out"))
+
+    def defer_retry(self, name: str, target: str, **kwargs):
+        """Queue a probe for the deferred retry pass (see run_retries_async)."""
+        kwargs.pop("timeout", None)
+        self.retry_queue.append((name, target, kwargs))
+
+    async def run_retries_async(self, slot: Optional[Callable] = None, retries: Optional[int] = None,
+                                backoff: Optional[float] = None,
+                                batch_slot: Optional[Callable] = None) -> AsyncIterator[Tuple[str, str, Any]]:
+        """
+        Re-probe the deferred queue in up to `retries` passes (IronConfig.RETRIES),
+        sleeping `backoff` * 2**n seconds before pass n and doubling each
+        probe's timeout per pass (capped at IronConfig.TIMEOUT). `slot` is an
+        async context manager factory (target, name), e.g. ProbeScheduler.slot,
+        so retries obey the same concurrency and rate limits as the main sweep.
+        Probes of batch-capable plugins (batch_size > 1) are re-run in blocks
+        through run_batch_async, admitted by `batch_slot` (targets, name),
+        e.g. ProbeScheduler.batch_slot.
+
+        Yields (name, target, result) once per deferred probe, with its final
+        result: an answer, a definite failure, or the last timeout.
+        """
+        retries = config.RETRIES if retries is None else retries
+        backoff = config.RETRY_BACKOFF if backoff is None else backoff
+
+        def backed_off(attempt: int, target: str) -> float:
+            return min(config.TIMEOUT, self.rtt.timeout(target) * 2 ** attempt)
+
+        async def retry(attempt: int, name: str, target: str, kwargs: Dict[str, Any]):
+            timeout = backed_off(attempt, target)
+            if slot is None:
+                result = await self.run_plugin_async(name, target, timeout=timeout, **kwargs)
+            else:
+                async with slot(target, name):
+                    result = await self.run_plugin_async(name, target, timeout=timeout, **kwargs)
+            return [(name, target, kwargs, result)]
+
+        async def retry_block(attempt: int, name: str, targets: List[str], kwargs: Dict[str, Any]):
+            timeout = max(backed_off(attempt, target) for target in targets)
+            if batch_slot is None:
+                results = await self.run_batch_async(name, targets, timeout=timeout, **kwargs)
+            else:
+                async with batch_slot(targets, name):
+                    results = await self.run_batch_async(name, targets, timeout=timeout, **kwargs)
+            return [(name, target, kwargs, results.get(target)) for target in targets]
+
+        def calls(attempt: int, batch: List[Tuple[str, str, Dict[str, Any]]]):
+            # (name, kwargs) -> targets of a batch-capable plugin
+            blocks: Dict[Tuple[str, Tuple], List[str]] = {}
+            for name, target, kwargs in batch:
+                if getattr(self.get_plugin(name), "batch_size", 1) > 1:
+                    blocks.setdefault((name, tuple(sorted(kwargs.items()))), []).append(target)
+                else:
+                    yield retry(attempt, name, target, kwargs)
+            for (name, items), targets in blocks.items():
+                size = self.get_plugin(name).batch_size
+                for start in range(0, len(targets), size):
+                    yield retry_block(attempt, name, targets[start:start + size], dict(items))
+
+        attempt = 0
+        while self.retry_queue and attempt < retries:
+            attempt += 1
+            batch, self.retry_queue = self.retry_queue, []
+            await asyncio.sleep(backoff * 2 ** (attempt - 1))
+            logger.info(f"Retry pass {attempt}/{retries}: {len(batch)} ambiguous probe(s)")
+            for next_done in asyncio.as_completed(list(calls(attempt, batch))):
+                for name, target, kwargs, result in await next_done:
+                    if self.is_ambiguous(result) and attempt < retries:
+                        self.retry_queue.append((name, target, kwargs))
+                    else:
+                        yield name, target, result
+
+        # Nothing left to spend on them (e.g. RETRIES = 0)
+        leftovers, self.retry_queue = self.retry_queue, []
+        for name, target, _ in leftovers:
+            yield name, target, None
@@ -1,3 +1,4 @@
+from typing import Any, Dict, Optional
 from .logger import logger
 
 class IronError(Exception):
@@ -8,6 +9,16 @@ class ProtocolError(IronError):
     """Raised when a protocol communication fails."""
     pass
 
+class ProtocolTimeoutError(ProtocolError):
+    """
+    Raised when a probe got no answer in time (ambiguous, worth a retry).
+    `details` keeps what was identified before the silence, if anything.
+    """
+
+    def __init__(self, message: str = "", details: Optional[Dict[str, Any]] = None):
+        super().__init__(message)
+        self.details = details or {}
+
 class SafetyViolationError(IronError):
     """Raised when an unsafe operation is attempted in SAFE_MODE."""
     pass
@@ -20,6 +31,10 @@ class ConfigurationError(IronError):
     """Raised when there is a configuration issue."""
     pass
 
+class CaptureFormatError(IronError):
+    """Raised when a packet capture cannot be parsed by the raw reader."""
+    pass
+
 def handle_exception(exc: Exception, context: str = "General"):
     """
     Centralized exception handler.
@@ -0,0 +1,128 @@
+import hashlib
+import importlib
+import importlib.util
+import json
+import os
+import pkgutil
+from importlib import metadata
+from typing import Dict, List, Optional
+from ironflow.core.logger import logger
+from ironflow.core.storage import write_json
+
+# Third-party plugins register "name = package.module:Class" under this group.
+ENTRY_POINT_GROUP = "ironflow.plugins"
+MANIFEST_FILE = "plugins.json"
+# Bumped whenever the cached manifest layout changes.
+MANIFEST_VERSION = 1
+
+def cache_dir() -> str:
+    """
+    Per-user cache directory: $IRONFLOW_CACHE_DIR, else
+    $XDG_CACHE_HOME/ironflow (~/.cache/ironflow).
+    """
+    explicit = os.getenv("IRONFLOW_CACHE_DIR")
+    if explicit:
+        return explicit
+    base = os.getenv("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "ironflow")
+
+def _package_dirs(package_path: str) -> List[str]:
+    spec = importlib.util.find_spec(package_path)
+    if spec is None or not spec.submodule_search_locations:
+        return []
+    return list(spec.submodule_search_locations)
+
+def _fingerprint(directories: List[str]) -> str:
+    """Hash of every module file's path, size and mtime under the package."""
+    digest = hashlib.sha1()
+    for directory in directories:
+        for root, dirs, files in os.walk(directory):
+            dirs[:] = sorted(d for d in dirs if d != "__pycache__")
+            for name in sorted(files):
+                if name.endswith(".py"):
+                    stat = os.stat(os.path.join(root, name))
+                    digest.update(f"{os.path.relpath(os.path.join(root, name), directory)}:{stat.st_size}:{stat.st_mtime_ns};".encode())
+    return digest.hexdigest()
+
+def _index_package(package_path: str, directories: List[str]) -> Dict[str, str]:
+    """
+    Import every module of a package once and map each concrete plugin's
+    lowercase name to "module:Class".
+    """
+    from ironflow.plugins.base import BasePlugin
+
+    found = {}
+    for _, module_name, _ in pkgutil.walk_packages(directories, prefix=f"{package_path}."):
+        logger.debug(f"Checking module: {module_name}")
+        try:
+            module = importlib.import_module(module_name)
+        except Exception as e:
+            logger.debug(f"Could not load module {module_name}: {e}")
+            continue
+        for attribute_name in dir(module):
+            attribute = getattr(module, attribute_name)
+            if (isinstance(attribute, type) and
+                issubclass(attribute, BasePlugin) and
+                attribute is not BasePlugin and
+                not attribute.__name__.startswith("Base") and
+                attribute.__module__ == module_name):
+                try:
+                    found[attribute().name.lower()] = f"{module_name}:{attribute.__name__}"
+                except Exception:
+                    pass # Might be an abstract class or need args
+    return found
+
+class PluginManifest:
+    """
+    Index of available plugins (name -> "module:Class") that avoids
+    importing them. Bundled packages are indexed once and cached in
+    cache_dir(), keyed by a fingerprint of their files, so the cache is
+    rebuilt only after plugin code changes. Plugins installed by other
+    distributions are read from the `ironflow.plugins` entry point group.
+    """
+
+    def __init__(self, package_paths: List[str], path: Optional[str] = None):
+        self.package_paths = list(package_paths)
+        self.path = path or os.path.join(cache_dir(), MANIFEST_FILE)
+
+    def _read_cache(self) -> Dict[str, Dict]:
+        try:
+            with open(self.path, "r") as f:
+                cached = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        if cached.get("version") != MANIFEST_VERSION:
+            return {}
+        return cached.get("packages", {})
+
+    def load(self) -> Dict[str, str]:
+        packages = self._read_cache()
+        changed = False
+        plugins: Dict[str, str] = {}
+        for package_path in self.package_paths:
+            directories = _package_dirs(package_path)
+            if not directories:
+                logger.debug(f"Plugin package {package_path} not found")
+                continue
+            fingerprint = _fingerprint(directories)
+            entry = packages.get(package_path)
+            if entry is None or entry.get("fingerprint") != fingerprint:
+                logger.info(f"Indexing plugins in {package_path}...")
+                entry = {"fingerprint": fingerprint, "plugins": _index_package(package_path, directories)}
+                packages[package_path] = entry
+                changed = True
+            plugins.update(entry["plugins"])
+
+        try:
+            for entry_point in metadata.entry_points(group=ENTRY_POINT_GROUP):
+                plugins.setdefault(entry_point.name.lower(), entry_point.value)
+        except Exception as e:
+            logger.debug(f"Could not read {ENTRY_POINT_GROUP} entry points: {e}")
+
+        if changed:
+            try:
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                write_json(self.path, {"version": MANIFEST_VERSION, "packages": packages}, indent=2)
+            except OSError as e:
+                logger.debug(f"Could not write plugin manifest {self.path}: {e}")
+        return plugins
@@ -0,0 +1,37 @@
+import json
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+from typing import Any, IO, Iterator
+
+@contextmanager
+def atomic_write(path: str, mode: str = "w") -> Iterator[IO]:
+    """
+    Write `path` through a temporary file in the same directory that is
+    renamed over it on success, so an interrupted write never leaves a
+    truncated file behind.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix=f".{os.path.basename(path)}.", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, mode) as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        if os.path.exists(path):
+            shutil.copymode(path, tmp_path)
+        else:
+            os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+def write_json(path: str, data: Any, **kwargs):
+    """json.dump `data` to `path` atomically (see atomic_write)."""
+    with atomic_write(path) as f:
+        json.dump(data, f, **kwargs)
@@ -0,0 +1,65 @@
+import ipaddress
+import threading
+from typing import Dict, Optional
+from ironflow.core.config import config, IronConfig
+
+# Subnet granularity used when grouping per-network state (RTT, rate limits).
+IPV4_SUBNET_PREFIX = 24
+IPV6_SUBNET_PREFIX = 64
+# Clock granularity term of the RFC 6298 timeout formula (seconds).
+CLOCK_GRANULARITY = 0.01
+
+def subnet_of(target: str, prefix: int = IPV4_SUBNET_PREFIX) -> str:
+    """
+    Network of `target` (/prefix for IPv4, /64 for IPv6); hostnames map
+    to themselves.
+    """
+    try:
+        ip = ipaddress.ip_address(target)
+    except ValueError:
+        return target
+    bits = prefix if ip.version == 4 else IPV6_SUBNET_PREFIX
+    return str(ipaddress.ip_network(f"{ip}/{bits}", strict=False))
+
+class RttEstimator:
+    """
+    Adaptive per-subnet timeouts shared by every probe through the engine.
+
+    Keeps a smoothed round-trip time and its variance per subnet (RFC 6298:
+    SRTT, RTTVAR) from observed replies, and derives the timeout as
+    SRTT + 4 * RTTVAR, clamped to [TIMEOUT_MIN, TIMEOUT]. Subnets without
+    samples yet use IronConfig.TIMEOUT, so a fast cell LAN converges to
+    sub-second waits within a few replies while a slow serial gateway
+    keeps generous ones.
+    """
+
+    def __init__(self, settings: IronConfig = config):
+        self.settings = settings
+        # subnet -> [srtt, rttvar]
+        self.estimates: Dict[str, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, target: str, rtt: float):
+        """Feed the round-trip time of one successful exchange with `target`."""
+        key = subnet_of(target)
+        with self._lock:
+            estimate = self.estimates.get(key)
+            if estimate is None:
+                self.estimates[key] = [rtt, rtt / 2]
+                return
+            srtt, rttvar = estimate
+            estimate[1] = 0.75 * rttvar + 0.25 * abs(srtt - rtt)
+            estimate[0] = 0.875 * srtt + 0.125 * rtt
+
+    def timeout(self, target: str, ceiling: Optional[float] = None) -> float:
+        """
+        Timeout for the next probe of `target`, never above `ceiling`
+        (IronConfig.TIMEOUT by default).
+        """
+        ceiling = ceiling if ceiling is not None else self.settings.TIMEOUT
+        estimate = self.estimates.get(subnet_of(target))
+        if estimate is None:
+            return ceiling
+        srtt, rttvar = estimate
+        rto = srtt + max(CLOCK_GRANULARITY, 4 * rttvar)
+        return min(ceiling, max(self.settings.TIMEOUT_MIN, rto))
@@ -1,37 +1,498 @@
-import ipaddress
-from typing import List, Dict, Any
+import asyncio
+import queue
+import threading
+from typing import AsyncIterator, List, Dict, Any, Iterator, Optional, Set, Tuple, Union
+from ironflow.core.config import config, IronConfig
 from ironflow.core.engine import IronEngine
 from ironflow.core.logger import logger
+from ironflow.core.timing import IPV4_SUBNET_PREFIX, subnet_of
+from ironflow.discovery.journal import ScanJournal
+from ironflow.discovery.scheduler import ProbeScheduler
+from ironflow.discovery.sweep import PortSweeper, OPEN, CLOSED, FILTERED
+from ironflow.discovery.targets import TargetSet
+
+DEFAULT_PROTOCOLS = ["modbus", "s7", "dnp3", "bacnet", "ethernetip", "iec104", "opcua"]
+
+# (target, online results) for one finished host
+HostResult = Tuple[str, List[Dict[str, Any]]]
+# End-of-stream marker for iter_hosts
+_DONE = object()
+# Seconds a partial block of a batch-capable plugin waits for more hosts
+BATCH_LINGER = 0.05
+
+class ProbeBatcher:
+    """
+    Gathers the probes that host workers submit for one batch-capable
+    plugin (batch_size > 1) into blocks of up to batch_size hosts on the
+    same port. A block goes out through IronEngine.run_batch_async as soon
+    as it is full or BATCH_LINGER seconds after its first host arrived.
+    """
+
+    def __init__(self, engine: IronEngine, scheduler: ProbeScheduler, name: str, size: int,
+                 linger: float = BATCH_LINGER):
+        self.engine = engine
+        self.scheduler = scheduler
+        self.name = name
+        self.size = size
+        self.linger = linger
+        # port -> [(target, future)] of the block being filled
+        self.pending: Dict[Optional[int], List[Tuple[str, asyncio.Future]]] = {}
+        self._timers: Dict[Optional[int], asyncio.TimerHandle] = {}
+        self._tasks: Set[asyncio.Task] = set()
+
+    def submit(self, target: str, port: Optional[int]) -> asyncio.Future:
+        """Queue one host; the future resolves to its probe result."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        block = self.pending.setdefault(port, [])
+        block.append((target, future))
+        if len(block) >= self.size:
+            self._dispatch(port)
+        elif len(block) == 1:
+            self._timers[port] = loop.call_later(self.linger, self._dispatch, port)
+        return future
+
+    def _dispatch(self, port: Optional[int]):
+        timer = self._timers.pop(port, None)
+        if timer is not None:
+            timer.cancel()
+        block = self.pending.pop(port, None)
+        if block:
+            task = asyncio.ensure_future(self._run(port, block))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, port: Optional[int], block: List[Tuple[str, asyncio.Future]]):
+        targets = [target for target, _ in block]
+        kwargs = {"port": port} if port else {}
+        try:
+            async with self.scheduler.batch_slot(targets, self.name):
+                results = await self.engine.run_batch_async(self.name, targets, **kwargs)
+        except asyncio.CancelledError:
+            for _, future in block:
+                future.cancel()
+            raise
+        except Exception as e:
+            logger.error(f"Batch of {self.name} probes failed: {e}")
+            results = {}
+        for target, future in block:
+            if not future.done():
+                future.set_result(results.get(target))
+
+    def close(self):
+        for timer in self._timers.values():
+            timer.cancel()
+        for task in self._tasks:
+            task.cancel()
 
 class ActiveDiscovery:
     """
     Orchestrates safe active discovery of ICS assets.
+    Probes run concurrently on an asyncio loop; a ProbeScheduler enforces
+    the in-flight and rate limits configured in IronConfig.
     """
 
-    def __init__(self, engine: IronEngine):
+    def __init__(self, engine: IronEngine, settings: IronConfig = config):
         self.engine = engine
+        self.settings = settings
+
+    def _plan(self, protocols: List[str]) -> List[Tuple[str, Optional[Tuple[str, int]], Optional[bytes]]]:
+        """
+        Map each protocol to the (transport, port) service its plugin probes.
+        Plugins without port metadata get no service and are always probed.
+        """
+        plan = []
+        for protocol in protocols:
+            plugin = self.engine.get_plugin(protocol)
+            port = getattr(plugin, "default_port", 0)
+            service = (getattr(plugin, "transport", "tcp"), port) if port else None
+            plan.append((protocol, service, getattr(plugin, "probe_payload", None)))
+        return plan
+
+    def _remember_negatives(self, target: str, states: Dict[Tuple[str, int], str], complete: bool):
+        """
+        Feed sweep outcomes into the engine's negative cache. A host is only
+        unreachable when the sweep covered the service of every plugin (see
+        `complete`) and none answered, not even with a refusal.
+        """
+        cache = self.engine.negative_cache
+        for (transport, port), state in states.items():
+            if state == CLOSED:
+                cache.mark_refused(target, transport, port)
+        if complete and states and all(state == FILTERED for state in states.values()):
+            cache.mark_unreachable(target)
+
+    async def _broadcast(self, targets: TargetSet, plan) -> Tuple[Dict[str, Dict[str, Dict[str, Any]]], Dict[str, Set[str]]]:
+        """
+        One broadcast request per planned protocol that supports it, sent to
+        the broadcast address of every /24 lying entirely inside the targets
+        (or to IronConfig.BROADCAST_ADDRESSES as given). Returns the
+        responders within the targets (target -> protocol -> result) and the
+        protocols each /24 is covered for (subnet -> protocols), whose hosts
+        need no unicast probe for them.
 
-    def scan_network(self, target_range: str, protocols: List[str] = None) -> List[Dict[str, Any]]:
+        A subnet only counts as covered for a protocol when its broadcast
+        got at least one reply: routers usually drop directed broadcasts
+        to routed subnets, and silence there says nothing about the hosts.
+        """
+        protocols = [protocol for protocol, _, _ in plan
+                     if getattr(self.engine.get_plugin(protocol), "broadcast_payload", None) is not None]
+        if not protocols:
+            return {}, {}
+        if self.settings.BROADCAST_ADDRESSES:
+            # Explicit addresses (e.g. a single responder): nothing is implied
+            # about hosts that stay quiet
+            addresses, subnets = list(self.settings.BROADCAST_ADDRESSES), set()
+        else:
+            networks = list(targets.full_subnets(IPV4_SUBNET_PREFIX))
+            addresses = [str(network.broadcast_address) for network in networks]
+            subnets = {str(network) for network in networks}
+        if not addresses:
+            logger.info("No /24 subnet is fully targeted; using unicast probes only")
+            return {}, {}
+
+        replies = await asyncio.gather(*(
+            self.engine.run_broadcast_async(protocol, addresses, window=self.settings.BROADCAST_WINDOW)
+            for protocol in protocols
+        ))
+        found: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        covered: Dict[str, Set[str]] = {}
+        for protocol, results in zip(protocols, replies):
+            for result in results:
+                subnet = subnet_of(result["target"])
+                if subnet in subnets:
+                    covered.setdefault(subnet, set()).add(protocol)
+                # Devices outside the requested scope are ignored
+                if result["target"] in targets:
+                    found.setdefault(result["target"], {})[protocol] = result
+        for subnet in sorted(subnets):
+            silent = [protocol for protocol in protocols if protocol not in covered.get(subnet, ())]
+            if silent:
+                logger.info(f"No {', '.join(silent)} broadcast reply from {subnet} (routed, or no such devices); "
+                            f"its hosts get unicast probes")
+        logger.info(f"Broadcast discovery: {sum(map(len, found.values()))} service(s) on {len(found)} host(s)")
+        return found, covered
+
+    def scan_network(self, target_range: Union[str, TargetSet], protocols: List[str] = None,
+                     known: Optional[Dict[str, Dict[str, Any]]] = None,
+                     journal: Optional[ScanJournal] = None) -> List[Dict[str, Any]]:
         """
         Scan a network CIDR or single IP for specified protocols.
+        Blocking wrapper around scan_network_async.
         """
-        if protocols is None:
-            protocols = ["modbus", "s7", "dnp3", "bacnet", "ethernetip", "iec104", "opcua"]
-            
-        results = []
-        
         try:
-            targets = [str(ip) for ip in ipaddress.IPv4Network(target_range, strict=False)]
-        except ValueError:
-            # Fallback for single IP
-            targets = [target_range]
-            
-        logger.info(f"Starting active discovery on {len(targets)} target(s)...")
-        
-        for target in targets:
-            for protocol in protocols:
-                res = self.engine.run_plugin(protocol, target)
-                if res and res.get("online"):
-                    results.append(res)
-                
+            return asyncio.run(self.scan_network_async(target_range, protocols, known, journal))
+        finally:
+            self.engine.shutdown()
+            self.engine.negative_cache.save()
+
+    def iter_hosts(self, target_range: Union[str, TargetSet], protocols: List[str] = None,
+                   known: Optional[Dict[str, Dict[str, Any]]] = None,
+                   journal: Optional[ScanJournal] = None) -> Iterator[HostResult]:
+        """
+        Blocking stream of (target, online results) as each host finishes.
+        The async scan runs on a background thread; closing the iterator
+        early (or an exception in the consumer) cancels it.
+        """
+        finished: queue.Queue = queue.Queue()
+        stopping = threading.Event()
+        running: Dict[str, Any] = {}
+
+        async def pump():
+            running["loop"], running["task"] = asyncio.get_running_loop(), asyncio.current_task()
+            async for item in self.iter_hosts_async(target_range, protocols, known, journal):
+                finished.put(item)
+                if stopping.is_set():
+                    break
+
+        def run():
+            try:
+                asyncio.run(pump())
+            except asyncio.CancelledError:
+                pass
+            except BaseException as e:
+                finished.put(e)
+            finally:
+                finished.put(_DONE)
+
+        thread = threading.Thread(target=run, name="ironflow-scan", daemon=True)
+        thread.start()
+        try:
+            while True:
+                item = finished.get()
+                if item is _DONE:
+                    break
+                if isinstance(item, BaseException):
+                    raise item
+                yield item
+        finally:
+            stopping.set()
+            if thread.is_alive() and "loop" in running:
+                running["loop"].call_soon_threadsafe(running["task"].cancel)
+            thread.join()
+            self.engine.shutdown()
+            self.engine.negative_cache.save()
+
+    async def scan_network_async(self, target_range: Union[str, TargetSet], protocols: List[str] = None,
+                                 known: Optional[Dict[str, Dict[str, Any]]] = None,
+                                 journal: Optional[ScanJournal] = None) -> List[Dict[str, Any]]:
+        """
+        Scan a network CIDR or single IP (or a TargetSet) for specified
+        protocols and collect every online result, in the order hosts
+        finished, then protocol order. See iter_hosts_async.
+        """
+        results = []
+        async for _, online in self.iter_hosts_async(target_range, protocols, known, journal):
+            results.extend(online)
         return results
+
+    async def iter_hosts_async(self, target_range: Union[str, TargetSet], protocols: List[str] = None,
+                               known: Optional[Dict[str, Dict[str, Any]]] = None,
+                               journal: Optional[ScanJournal] = None) -> AsyncIterator[HostResult]:
+        """
+        Scan a network CIDR or single IP (or a TargetSet) for specified
+        protocols, yielding (target, online results) as soon as each host is
+        done (hosts with nothing online yield an empty list). Targets are
+        generated lazily, so memory stays flat on huge ranges.
+
+        `known` maps targets to fresh AssetDatabase records (incremental
+        scans). Those hosts only get a liveness check of their recorded
+        services; results confirmed that way carry "liveness": True and the
+        stored details. Hosts that no longer answer get the full probe set.
+
+        With a `journal`, every finished probe and host is checkpointed;
+        hosts and probes already recorded in it (from an interrupted run
+        being resumed) are not scanned again.
+
+        Ambiguous outcomes (probes that timed out, and silent services on
+        hosts that otherwise answered) are deferred to the engine's retry
+        queue instead of being retried inline. Once every host has had its
+        first pass, up to IronConfig.RETRIES backed-off passes re-probe them;
+        hosts waiting on a retry are yielded when their last one finishes,
+        and only then can they be cached as unreachable.
+
+        With IronConfig.BROADCAST_DISCOVERY, protocols that have a broadcast
+        request are discovered subnet-wide before any host is probed (see
+        _broadcast); responders and hosts of covered subnets skip the
+        unicast probe for those protocols.
+        """
+        if protocols is None:
+            protocols = list(DEFAULT_PROTOCOLS)
+
+        targets = target_range if isinstance(target_range, TargetSet) else TargetSet([target_range])
+        total = targets.size
+
+        logger.info(f"Starting active discovery on {total} target(s)...")
+
+        scheduler = ProbeScheduler(self.settings)
+        sweeper = PortSweeper(self.settings.SWEEP_TIMEOUT, self.engine.rtt) if self.settings.PRESWEEP else None
+        plan = self._plan(protocols)
+        services = {service: payload for _, service, payload in plan if service}
+        # A host silent on the planned services may still serve another
+        # protocol (e.g. S7 behind a firewalled 502): only a sweep of every
+        # plugin's service may cache it as unreachable
+        all_services = {service for _, service, _ in self._plan(self.engine.available_plugins()) if service}
+        cache = self.engine.negative_cache
+        done: asyncio.Queue = asyncio.Queue()
+        pending = iter(targets)
+        known = known or {}
+        checker = sweeper or PortSweeper(self.settings.SWEEP_TIMEOUT, self.engine.rtt)
+        # Plugin protocol names (as stored in assets) -> plan entry
+        by_name = {getattr(self.engine.get_plugin(entry[0]), "protocol", entry[0]): entry for entry in plan}
+        confirmed = 0
+        resumed = journal.hosts if journal is not None else {}
+        ports = {protocol: service[1] if service else None for protocol, service, _ in plan}
+        # target -> {"outcome": protocol -> result, "silent": no service of a
+        #            full sweep answered,
+        #            "waiting": deferred probes not finished yet}
+        held: Dict[str, Dict[str, Any]] = {}
+        self.engine.retry_queue.clear()
+
+        # Subnet-wide discovery first: target -> protocol -> responder result
+        broadcast_found: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        covered: Dict[str, Set[str]] = {}
+        if self.settings.BROADCAST_DISCOVERY:
+            broadcast_found, covered = await self._broadcast(targets, plan)
+
+        def online_results(outcome: Dict[str, Any]) -> List[Dict[str, Any]]:
+            ordered = [outcome.get(protocol) for protocol, _, _ in plan]
+            return [res for res in ordered if res and res.get("online")]
+        if resumed:
+            logger.info(f"Resuming scan: {len(resumed)} host(s) already complete")
+
+        # Plugins that probe many hosts at once get blocks of hosts instead
+        batchers = {}
+        for protocol, _, _ in plan:
+            size = getattr(self.engine.get_plugin(protocol), "batch_size", 1)
+            if size > 1:
+                batchers[protocol] = ProbeBatcher(self.engine, scheduler, protocol, size)
+
+        async def probe(target: str, protocol: str, port: Optional[int]):
+            kwargs = {"port": port} if port else {}
+            batcher = batchers.get(protocol)
+            if batcher is None:
+                async with scheduler.slot(target, protocol):
+                    result = await self.engine.run_plugin_async(protocol, target, **kwargs)
+            else:
+                # The host keeps its probe place while its block is in flight
+                async with scheduler.host_gate(target):
+                    result = await batcher.submit(target, port)
+            if journal is not None:
+                journal.record_probe(target, protocol, result)
+            return result
+
+        async def check_known(target: str, asset: Dict[str, Any]) -> List[Dict[str, Any]]:
+            checks = {}
+            for name, entry in asset.get("protocols", {}).items():
+                planned = by_name.get(name)
+                if planned is None or planned[1] is None:
+                    continue
+                protocol, (transport, port), payload = planned
+                checks[(transport, entry.get("port") or port)] = (name, entry, protocol, payload)
+            if not checks:
+                return []
+            states = await checker.sweep_host(
+                target, [(protocol, svc, payload) for svc, (_, _, protocol, payload) in checks.items()], scheduler)
+            return [
+                {
+                    "target": target,
+                    "port": svc[1],
+                    "protocol": name,
+                    "online": True,
+                    "liveness": True,
+                    "details": entry.get("details", {}),
+                }
+                for svc, (name, entry, _, _) in checks.items()
+                if states.get(svc) == OPEN
+            ]
+
+        async def scan_host(target: str) -> Optional[List[Dict[str, Any]]]:
+            """Online results of `target`, or None when it waits on the retry pass."""
+            nonlocal confirmed
+            if cache.is_dead(target):
+                logger.debug(f"Skipping {target}: cached as unreachable")
+                return []
+
+            if target in known:
+                alive = await check_known(target, known[target])
+                if alive:
+                    confirmed += 1
+                    return alive
+                logger.debug(f"{target} did not answer on its known services; running full probe")
+
+            # Protocols settled by broadcast discovery: those the host answered,
+            # and those its whole subnet answered a broadcast for
+            heard = broadcast_found.get(target, {})
+            settled = set(heard)
+            if covered:
+                settled |= covered.get(subnet_of(target), set())
+            planned = [(protocol, service) for protocol, service, _ in plan if protocol not in settled]
+            expected = [(protocol, service, services[service]) for protocol, service in planned if service]
+
+            candidates = [(protocol, service[1] if service else None) for protocol, service in planned]
+            silent, host_silent, full_sweep = set(), False, False
+            if sweeper is not None and expected:
+                live = [check for check in expected if not cache.is_refused(target, *check[1])]
+                states = await sweeper.sweep_host(target, live, scheduler)
+                host_silent = not heard and len(live) == len(expected) and bool(states) \
+                    and all(state == FILTERED for state in states.values())
+                if self.settings.RETRIES > 0:
+                    # A lost datagram looks like no listener, and a lost SYN on
+                    # a live host like a firewall; a host silent on every
+                    # service is not worth retrying at all.
+                    silent = {
+                        protocol for protocol, service in planned
+                        if service and states.get(service) == FILTERED and not host_silent
+                    }
+                full_sweep = all_services <= set(states)
+                self._remember_negatives(target, states, complete=full_sweep and not silent and not heard)
+
+                # Only services that answered the sweep get a full handshake
+                candidates = [
+                    (protocol, service[1] if service else None)
+                    for protocol, service in planned
+                    if service is None or states.get(service) == OPEN
+                ]
+
+            finished = journal.finished_probes(target) if journal is not None else {}
+            remaining = [(protocol, port) for protocol, port in candidates if protocol not in finished]
+            found = await asyncio.gather(*(probe(target, protocol, port) for protocol, port in remaining))
+            outcome = dict(heard)
+            outcome.update(finished)
+            outcome.update(zip((protocol for protocol, _ in remaining), found))
+
+            ambiguous = silent | {protocol for protocol, res in outcome.items() if self.engine.is_ambiguous(res)}
+            if ambiguous and self.settings.RETRIES > 0:
+                for protocol in ambiguous:
+                    kwargs = {"port": ports[protocol]} if ports.get(protocol) else {}
+                    self.engine.defer_retry(protocol, target, **kwargs)
+                held[target] = {"outcome": outcome, "silent": host_silent and full_sweep, "waiting": len(ambiguous)}
+                return None
+            return online_results(outcome)
+
+        async def worker():
+            # Each worker owns one host at a time; the scheduler decides when
+            # each of that host's handshakes may actually go out.
+            for target in pending:
+                if target in resumed:
+                    online = resumed[target]
+                else:
+                    online = await scan_host(target)
+                    if online is None:
+                        continue
+                    if journal is not None:
+                        journal.record_host(target, online)
+                done.put_nowait((target, online))
+
+        # Enough hosts in flight to saturate the global limit, no more.
+        max_per_host = max(1, self.settings.MAX_PER_HOST)
+        workers = [asyncio.ensure_future(worker()) for _ in range(min(total, max(1, self.settings.MAX_CONCURRENCY // max_per_host)))]
+        all_workers = asyncio.gather(*workers)
+        all_workers.add_done_callback(lambda _: done.put_nowait(None))
+        try:
+            while True:
+                item = await done.get()
+                if item is None:
+                    break
+                yield item
+            # Surface worker errors
+            await all_workers
+
+            if held:
+                logger.info(f"{len(held)} host(s) with ambiguous results deferred to the retry pass")
+            recovered = 0
+            async for protocol, target, result in self.engine.run_retries_async(
+                    scheduler.slot, self.settings.RETRIES, self.settings.RETRY_BACKOFF, scheduler.batch_slot):
+                if journal is not None:
+                    journal.record_probe(target, protocol, result)
+                entry = held[target]
+                if result is not None and not self.engine.is_ambiguous(result):
+                    entry["silent"] = False
+                if result is not None:
+                    recovered += bool(result.get("online"))
+                    entry["outcome"][protocol] = result
+                entry["waiting"] -= 1
+                if entry["waiting"]:
+                    continue
+                del held[target]
+                online = online_results(entry["outcome"])
+                if entry["silent"] and not online:
+                    cache.mark_unreachable(target)
+                if journal is not None:
+                    journal.record_host(target, online)
+                yield target, online
+            if recovered:
+                logger.info(f"Retry pass recovered {recovered} probe(s)")
+        finally:
+            # Cancelling the gather cancels the workers; awaiting it retrieves
+            # the outcome so an interrupted scan does not log it as lost
+            all_workers.cancel()
+            try:
+                await all_workers
+            except (asyncio.CancelledError, Exception):
+                pass
+            for batcher in batchers.values():
+                batcher.close()
+
+        if known:
+            logger.info(f"{confirmed} known host(s) confirmed by liveness check only")
@@ -0,0 +1,422 @@
+import mmap
+import os
+import socket
+import struct
+import sys
+from typing import BinaryIO, Iterator, NamedTuple, Optional, Tuple, Union
+from ironflow.core.error_handler import CaptureFormatError
+
+# Link-layer header types, see https://www.tcpdump.org/linktypes.html
+LINKTYPE_NULL = 0
+LINKTYPE_ETHERNET = 1
+LINKTYPE_RAW = 101
+LINKTYPE_LINUX_SLL = 113
+LINKTYPE_IPV4 = 228
+LINKTYPE_IPV6 = 229
+LINKTYPE_LINUX_SLL2 = 276
+SUPPORTED_LINKTYPES = frozenset((
+    LINKTYPE_NULL, LINKTYPE_ETHERNET, LINKTYPE_RAW, LINKTYPE_LINUX_SLL,
+    LINKTYPE_IPV4, LINKTYPE_IPV6, LINKTYPE_LINUX_SLL2,
+))
+
+ETH_IPV4 = 0x0800
+ETH_IPV6 = 0x86DD
+VLAN_TPIDS = frozenset((0x8100, 0x88A8, 0x9100))
+
+IPPROTO_TCP = 6
+IPPROTO_UDP = 17
+# Hop-by-hop, routing and destination options share the (len + 1) * 8 layout
+IPV6_EXT_HEADERS = frozenset((0, 43, 60))
+IPV6_FRAGMENT = 44
+IPV6_AH = 51
+
+PCAP_MAGIC_US = 0xA1B2C3D4
+PCAP_MAGIC_NS = 0xA1B23C4D
+PCAPNG_SHB = 0x0A0D0D0A
+PCAPNG_BOM = 0x1A2B3C4D
+PCAPNG_IDB = 0x00000001
+PCAPNG_OPB = 0x00000002
+PCAPNG_SPB = 0x00000003
+PCAPNG_EPB = 0x00000006
+PCAPNG_OPT_TSRESOL = 9
+# Largest caplen accepted when resynchronising inside a pcap file
+MAX_SNAPLEN = 262144
+MAX_WIRE_LENGTH = 262144
+
+_u16 = struct.Struct("!H").unpack_from
+_ports = struct.Struct("!HH").unpack_from
+_inet_ntoa = socket.inet_ntoa
+_inet_ntop = socket.inet_ntop
+
+class PacketInfo(NamedTuple):
+    """Header fields the passive analyzers need from one frame."""
+    timestamp: float
+    src: str
+    dst: str
+    transport: int
+    sport: int
+    dport: int
+    length: int
+
+# (timestamp, linktype, buffer, offset, caplen, wire length); the frame is
+# buffer[offset:offset + caplen]. Plain tuples keep the per-packet cost low.
+Record = Tuple[float, int, Union[bytes, mmap.mmap], int, int, int]
+
+def decode_frame(linktype: int, buf, offset: int, caplen: int) -> Optional[Tuple[str, str, int, int, int]]:
+    """
+    Parse link, VLAN, IPv4/IPv6 and TCP/UDP headers in place.
+    Returns (src, dst, ip_proto, sport, dport), or None for anything that
+    is not an unfragmented TCP/UDP packet.
+    """
+    end = offset + caplen
+    if linktype == LINKTYPE_ETHERNET:
+        if caplen < 14:
+            return None
+        ethertype = _u16(buf, offset + 12)[0]
+        off = offset + 14
+        while ethertype in VLAN_TPIDS:
+            if off + 4 > end:
+                return None
+            ethertype = _u16(buf, off + 2)[0]
+            off += 4
+    elif linktype in (LINKTYPE_RAW, LINKTYPE_IPV4, LINKTYPE_IPV6):
+        if caplen < 1:
+            return None
+        version = buf[offset] >> 4
+        ethertype = ETH_IPV4 if version == 4 else ETH_IPV6 if version == 6 else 0
+        off = offset
+    elif linktype == LINKTYPE_LINUX_SLL:
+        if caplen < 16:
+            return None
+        ethertype = _u16(buf, offset + 14)[0]
+        off = offset + 16
+    elif linktype == LINKTYPE_LINUX_SLL2:
+        if caplen < 20:
+            return None
+        ethertype = _u16(buf, offset)[0]
+        off = offset + 20
+    elif linktype == LINKTYPE_NULL:
+        if caplen < 4:
+            return None
+        # Address family in the capturing host's byte order
+        family = buf[offset] or buf[offset + 3]
+        ethertype = ETH_IPV4 if family == 2 else ETH_IPV6 if family in (24, 28, 30) else 0
+        off = offset + 4
+    else:
+        return None
+
+    if ethertype == ETH_IPV4:
+        if off + 20 > end:
+            return None
+        if _u16(buf, off + 6)[0] & 0x1FFF:
+            # Non-first fragment: no transport header
+            return None
+        proto = buf[off + 9]
+        if proto != IPPROTO_TCP and proto != IPPROTO_UDP:
+            return None
+        src = _inet_ntoa(buf[off + 12:off + 16])
+        dst = _inet_ntoa(buf[off + 16:off + 20])
+        off += (buf[off] & 0x0F) * 4
+    elif ethertype == ETH_IPV6:
+        if off + 40 > end:
+            return None
+        proto = buf[off + 6]
+        src_off = off + 8
+        off += 40
+        while proto in IPV6_EXT_HEADERS or proto == IPV6_FRAGMENT or proto == IPV6_AH:
+            if off + 8 > end:
+                return None
+            if proto == IPV6_FRAGMENT:
+                if _u16(buf, off + 2)[0] & 0xFFF8:
+                    return None
+                size = 8
+            elif proto == IPV6_AH:
+                size = (buf[off + 1] + 2) * 4
+            else:
+                size = (buf[off + 1] + 1) * 8
+            proto = buf[off]
+            off += size
+        if proto != IPPROTO_TCP and proto != IPPROTO_UDP:
+            return None
+        src = _inet_ntop(socket.AF_INET6, buf[src_off:src_off + 16])
+        dst = _inet_ntop(socket.AF_INET6, buf[src_off + 16:src_off + 32])
+    else:
+        return None
+
+    if off + 4 > end:
+        return None
+    sport, dport = _ports(buf, off)
+    return src, dst, proto, sport, dport
+
+def decode_record(record: Record) -> Optional[PacketInfo]:
+    """Convenience wrapper turning a capture record into a PacketInfo."""
+    timestamp, linktype, buf, offset, caplen, length = record
+    decoded = decode_frame(linktype, buf, offset, caplen)
+    if decoded is None:
+        return None
+    return PacketInfo(timestamp, *decoded, length)
+
+def capture_format(head: bytes) -> Optional[str]:
+    """
+    Identify a capture from its first four bytes: "pcap", "pcapng" or None.
+    """
+    if len(head) < 4:
+        return None
+    if struct.unpack("<I", head[:4])[0] == PCAPNG_SHB:
+        return "pcapng"
+    magics = (PCAP_MAGIC_US, PCAP_MAGIC_NS)
+    if struct.unpack("<I", head[:4])[0] in magics or struct.unpack(">I", head[:4])[0] in magics:
+        return "pcap"
+    return None
+
+class CaptureReader:
+    """
+    Minimal pcap/pcapng reader yielding raw records without dissection.
+    Regular files are memory-mapped and walked in place; pipes and stdin
+    are read sequentially, one record at a time.
+    """
+
+    def __init__(self, source: Union[str, BinaryIO]):
+        self._owned = None
+        self._mmap = None
+        if source == "-":
+            stream = sys.stdin.buffer
+        elif isinstance(source, (str, os.PathLike)):
+            stream = self._owned = open(source, "rb")
+        else:
+            stream = source
+
+        self.stream = stream
+        self.buf = None
+        try:
+            self._open()
+        except Exception:
+            self.close()
+            raise
+
+    def _open(self):
+        stream = self.stream
+        try:
+            if stream.seekable() and os.fstat(stream.fileno()).st_size > 0:
+                self._mmap = mmap.mmap(stream.fileno(), 0, access=mmap.ACCESS_READ)
+                if hasattr(self._mmap, "madvise") and hasattr(mmap, "MADV_SEQUENTIAL"):
+                    self._mmap.madvise(mmap.MADV_SEQUENTIAL)
+                self.buf = self._mmap
+        except (OSError, ValueError, AttributeError):
+            # Not backed by a regular file (pipe, socket, BytesIO...)
+            self._mmap = None
+
+        self._head = self.buf[:4] if self.buf is not None else self._read(4)
+        if len(self._head) < 4:
+            raise CaptureFormatError("Capture is empty or truncated")
+        self.format = capture_format(self._head)
+        if self.format is None:
+            raise CaptureFormatError(f"Unknown capture magic {self._head.hex()}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+        if self._owned is not None:
+            self._owned.close()
+            self._owned = None
+
+    def _read(self, size: int) -> bytes:
+        data = self.stream.read(size)
+        # Pipes may return short reads before EOF
+        while data is not None and len(data) < size:
+            more = self.stream.read(size - len(data))
+            if not more:
+                break
+            data += more
+        return data or b""
+
+    def __iter__(self) -> Iterator[Record]:
+        if self.format == "pcap":
+            if self.buf is not None:
+                return self.iter_pcap_range()
+            return self._iter_pcap_stream()
+        return self._iter_pcapng()
+
+    # -- classic pcap ------------------------------------------------------
+
+    def pcap_header(self, header: bytes) -> Tuple[str, float, int, int]:
+        """
+        Parse the 24-byte global header into (endian, ts scale, snaplen, linktype).
+        """
+        if len(header) < 24:
+            raise CaptureFormatError("Truncated pcap global header")
+        endian = "<" if struct.unpack("<I", header[:4])[0] in (PCAP_MAGIC_US, PCAP_MAGIC_NS) else ">"
+        magic, _, _, _, _, snaplen, linktype = struct.unpack(endian + "IHHiIII", header[:24])
+        scale = 1e-9 if magic == PCAP_MAGIC_NS else 1e-6
+        return endian, scale, snaplen, linktype & 0xFFFF
+
+    def find_pcap_boundary(self, offset: int, chain: int = 8) -> int:
+        """
+        First record boundary at or after `offset` in a mapped pcap file.
+        A candidate is accepted when `chain` consecutive record headers
+        (or all records up to end of file) are plausible, link up and carry
+        timestamps within a day of each other and not before the capture
+        start. The latter rejects the parse shifted by four bytes, which
+        chains just as well whenever caplen equals the wire length. The
+        result depends only on `offset`, so adjacent shards agree on their
+        shared boundary.
+        """
+        buf = self.buf
+        endian, scale, snaplen, _ = self.pcap_header(buf[:24])
+        if offset <= 24:
+            return 24
+        size = len(buf)
+        unpack = struct.Struct(endian + "IIII").unpack_from
+        max_caplen = max(snaplen, MAX_SNAPLEN)
+        max_frac = 1000000000 if scale < 1e-6 else 1000000
+        capture_start = unpack(buf, 24)[0] - 86400 if size >= 40 else 0
+
+        def plausible(pos: int) -> bool:
+            first_ts = None
+            for _ in range(chain):
+                if pos == size:
+                    return True
+                if pos + 16 > size:
+                    return False
+                ts_sec, ts_frac, caplen, length = unpack(buf, pos)
+                if (ts_frac >= max_frac or not 0 < caplen <= max_caplen
+                        or caplen > length or length > MAX_WIRE_LENGTH or ts_sec < capture_start):
+                    return False
+                if first_ts is None:
+                    first_ts = ts_sec
+                elif abs(ts_sec - first_ts) > 86400:
+                    return False
+                pos += 16 + caplen
+            return pos <= size
+
+        while offset < size:
+            if plausible(offset):
+                return offset
+            offset += 1
+        return size
+
+    def iter_pcap_range(self, start: int = 24, stop: Optional[int] = None) -> Iterator[Record]:
+        """
+        Walk mapped pcap records whose header begins in [start, stop).
+        `start` must be a record boundary (see find_pcap_boundary).
+        """
+        buf = self.buf
+        endian, scale, _, linktype = self.pcap_header(buf[:24])
+        size = len(buf)
+        stop = size if stop is None else min(stop, size)
+        unpack = struct.Struct(endian + "IIII").unpack_from
+        offset = start
+        while offset < stop and offset + 16 <= size:
+            ts_sec, ts_frac, caplen, length = unpack(buf, offset)
+            offset += 16
+            if offset + caplen > size:
+                break
+            yield ts_sec + ts_frac * scale, linktype, buf, offset, caplen, length
+            offset += caplen
+
+    def _iter_pcap_stream(self) -> Iterator[Record]:
+        endian, scale, _, linktype = self.pcap_header(self._head + self._read(20))
+        unpack = struct.Struct(endian + "IIII").unpack
+        read = self._read
+        while True:
+            header = read(16)
+            if len(header) < 16:
+                return
+            ts_sec, ts_frac, caplen, length = unpack(header)
+            data = read(caplen)
+            if len(data) < caplen:
+                return
+            yield ts_sec + ts_frac * scale, linktype, data, 0, caplen, length
+
+    # -- pcapng ------------------------------------------------------------
+
+    def _iter_blocks(self) -> Iterator[Tuple[int, object, int, int, str]]:
+        """
+        Yield (block type, buffer, body offset, body length, endian).
+        """
+        endian = "<"
+        if self.buf is not None:
+            buf = self.buf
+            size = len(buf)
+            offset = 0
+            while offset + 12 <= size:
+                block_type = struct.unpack_from(endian + "I", buf, offset)[0]
+                if block_type == PCAPNG_SHB:
+                    endian = "<" if struct.unpack_from("<I", buf, offset + 8)[0] == PCAPNG_BOM else ">"
+                total = struct.unpack_from(endian + "I", buf, offset + 4)[0]
+                if total < 12 or offset + total > size:
+                    return
+                yield block_type, buf, offset + 8, total - 12, endian
+                offset += total
+            return
+
+        head = self._head
+        while True:
+            head = head + self._read(8 - len(head))
+            if len(head) < 8:
+                return
+            block_type = struct.unpack(endian + "I", head[:4])[0]
+            if block_type == PCAPNG_SHB:
+                bom = self._read(4)
+                if len(bom) < 4:
+                    return
+                endian = "<" if struct.unpack("<I", bom)[0] == PCAPNG_BOM else ">"
+                total = struct.unpack(endian + "I", head[4:8])[0]
+                body = bom + self._read(total - 16)
+            else:
+                total = struct.unpack(endian + "I", head[4:8])[0]
+                body = self._read(total - 12)
+            if total < 12 or len(body) < total - 12:
+                return
+            self._read(4)  # trailing block length
+            yield block_type, body, 0, total - 12, endian
+            head = b""
+
+    def _iter_pcapng(self) -> Iterator[Record]:
+        interfaces = []  # (linktype, snaplen, ts scale)
+        for block_type, buf, off, length, endian in self._iter_blocks():
+            if block_type == PCAPNG_EPB:
+                iface, ts_high, ts_low, caplen, wire = struct.unpack_from(endian + "IIIII", buf, off)
+                if iface >= len(interfaces) or caplen > length - 20:
+                    continue
+                linktype, _, scale = interfaces[iface]
+                yield ((ts_high << 32) | ts_low) * scale, linktype, buf, off + 20, caplen, wire
+            elif block_type == PCAPNG_SPB:
+                if not interfaces:
+                    continue
+                wire = struct.unpack_from(endian + "I", buf, off)[0]
+                linktype, snaplen, _ = interfaces[0]
+                caplen = min(wire, length - 4, snaplen or wire)
+                yield 0.0, linktype, buf, off + 4, caplen, wire
+            elif block_type == PCAPNG_IDB:
+                linktype, _, snaplen = struct.unpack_from(endian + "HHI", buf, off)
+                interfaces.append((linktype, snaplen, self._tsresol(buf, off + 8, off + length, endian)))
+            elif block_type == PCAPNG_OPB:
+                iface, _, ts_high, ts_low, caplen, wire = struct.unpack_from(endian + "HHIIII", buf, off)
+                if iface >= len(interfaces) or caplen > length - 20:
+                    continue
+                linktype, _, scale = interfaces[iface]
+                yield ((ts_high << 32) | ts_low) * scale, linktype, buf, off + 20, caplen, wire
+            elif block_type == PCAPNG_SHB:
+                # A new section redefines its interfaces
+                interfaces = []
+
+    @staticmethod
+    def _tsresol(buf, offset: int, end: int, endian: str) -> float:
+        """Timestamp scale from the if_tsresol option (microseconds by default)."""
+        while offset + 4 <= end:
+            code, length = struct.unpack_from(endian + "HH", buf, offset)
+            if code == 0:
+                break
+            if code == PCAPNG_OPT_TSRESOL and length >= 1:
+                value = buf[offset + 4]
+                return 2.0 ** -(value & 0x7F) if value & 0x80 else 10.0 ** -value
+            offset += 4 + ((length + 3) & ~3)
+        return 1e-6
@@ -0,0 +1,79 @@
+import sys
+from array import array
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from ironflow.core.config import config
+
+# (client, server, protocol, service port)
+FlowKey = Tuple[str, str, str, int]
+
+class FlowTable:
+    """
+    Compact conversation table built while packets stream through passive
+    analysis. Counters live in typed arrays indexed by flow number, so each
+    flow costs a few dozen bytes beyond its key, and the table stops growing
+    at `max_flows` (further new conversations are only counted as dropped).
+    """
+
+    def __init__(self, max_flows: Optional[int] = None):
+        self.max_flows = max_flows or config.FLOW_TABLE_MAX
+        self.index: Dict[FlowKey, int] = {}
+        self.keys: List[FlowKey] = []
+        self.packets = array("Q")
+        self.bytes = array("Q")
+        self.first_seen = array("d")
+        self.last_seen = array("d")
+        self.dropped = 0
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def add(self, src: str, dst: str, protocol: str, port: int, length: int, timestamp: float, packets: int = 1):
+        key = (src, dst, protocol, port)
+        i = self.index.get(key)
+        if i is None:
+            if len(self.keys) >= self.max_flows:
+                self.dropped += packets
+                return
+            # Interning keeps one copy of each address across all its flows
+            key = (sys.intern(src), sys.intern(dst), protocol, port)
+            self.index[key] = len(self.keys)
+            self.keys.append(key)
+            self.packets.append(packets)
+            self.bytes.append(length)
+            self.first_seen.append(timestamp)
+            self.last_seen.append(timestamp)
+            return
+
+        self.packets[i] += packets
+        self.bytes[i] += length
+        if timestamp < self.first_seen[i]:
+            self.first_seen[i] = timestamp
+        if timestamp > self.last_seen[i]:
+            self.last_seen[i] = timestamp
+
+    def merge(self, other: "FlowTable"):
+        """Fold another table (e.g. from a capture shard) into this one."""
+        for i, (src, dst, protocol, port) in enumerate(other.keys):
+            self.add(src, dst, protocol, port, other.bytes[i], other.first_seen[i], other.packets[i])
+            # add() only saw the first timestamp; widen to the full range
+            j = self.index.get(other.keys[i])
+            if j is not None and other.last_seen[i] > self.last_seen[j]:
+                self.last_seen[j] = other.last_seen[i]
+        self.dropped += other.dropped
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        for i, (src, dst, protocol, port) in enumerate(self.keys):
+            yield {
+                "source": src,
+                "target": dst,
+                "protocol": protocol,
+                "port": port,
+                "packets": self.packets[i],
+                "bytes": self.bytes[i],
+                "first_seen": datetime.fromtimestamp(self.first_seen[i]).isoformat(),
+                "last_seen": datetime.fromtimestamp(self.last_seen[i]).isoformat(),
+            }
+
+    def to_edges(self) -> List[Dict[str, Any]]:
+        return list(self)
@@ -0,0 +1,135 @@
+import json
+import os
+import time
+from typing import Any, Dict, List, Optional
+from ironflow.core.logger import logger
+
+JOURNAL_FILE = "scan_journal.jsonl"
+# Seconds of completed work that may sit in the write buffer.
+JOURNAL_FLUSH_INTERVAL = 1.0
+JOURNAL_BUFFER_SIZE = 64 * 1024
+
+class ScanJournal:
+    """
+    Append-only checkpoint journal of an active scan, one JSON object per
+    line: a header describing the scan, a line per finished probe
+    (target, protocol, result) and a line per finished host with its
+    online results. Lines are appended through a large write buffer that
+    is flushed at most every JOURNAL_FLUSH_INTERVAL seconds, so a crash or
+    Ctrl-C loses about a second of work at most. A truncated last line is
+    ignored when the journal is loaded, and cut off before a resumed scan
+    appends to it.
+    """
+
+    def __init__(self, path: str = JOURNAL_FILE):
+        self.path = path
+        self.header: Optional[Dict[str, Any]] = None
+        # target -> protocol -> probe result (None when nothing answered)
+        self.probes: Dict[str, Dict[str, Optional[Dict[str, Any]]]] = {}
+        # target -> online results of a finished host
+        self.hosts: Dict[str, List[Dict[str, Any]]] = {}
+        self._file = None
+        self._flushed = 0.0
+
+    @classmethod
+    def for_database(cls, db_path: str) -> "ScanJournal":
+        """
+        Journal kept next to the given AssetDatabase file.
+        """
+        directory = os.path.dirname(os.path.abspath(db_path))
+        return cls(os.path.join(directory, JOURNAL_FILE))
+
+    def load(self) -> bool:
+        """
+        Read a previous journal; returns False when there is none.
+        """
+        if not os.path.exists(self.path):
+            return False
+        with open(self.path, "r") as f:
+            for number, line in enumerate(f, 1):
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    logger.debug(f"Ignoring unreadable journal line {number}")
+                    continue
+                if "scan" in entry:
+                    self.header = entry
+                elif entry.get("done"):
+                    self.hosts[entry["target"]] = entry.get("results", [])
+                    self.probes.pop(entry["target"], None)
+                elif "protocol" in entry:
+                    self.probes.setdefault(entry["target"], {})[entry["protocol"]] = entry.get("result")
+        return self.header is not None
+
+    def matches(self, target_range: str, protocols: List[str]) -> bool:
+        return self.header is not None and self.header.get("scan") == target_range \
+            and self.header.get("protocols") == list(protocols)
+
+    def start(self, target_range: str, protocols: List[str], resume: bool = False):
+        """
+        Open the journal for appending; a fresh scan truncates it first,
+        a resumed one drops a partial last line left by a crash.
+        """
+        if resume:
+            self._trim_partial_line()
+        self._file = open(self.path, "a" if resume else "w", buffering=JOURNAL_BUFFER_SIZE)
+        if not resume:
+            self.header = {"scan": target_range, "protocols": list(protocols)}
+            self.probes, self.hosts = {}, {}
+            self._append(self.header)
+        self._file.flush()
+
+    def _trim_partial_line(self):
+        """
+        Cut the journal back to its last newline, so the next record does
+        not get glued to a fragment (and lost with it on the next load).
+        """
+        try:
+            f = open(self.path, "rb+")
+        except FileNotFoundError:
+            return
+        with f:
+            end = position = f.seek(0, os.SEEK_END)
+            keep = 0
+            while position > 0:
+                start = max(0, position - 4096)
+                f.seek(start)
+                newline = f.read(position - start).rfind(b"\n")
+                if newline >= 0:
+                    keep = start + newline + 1
+                    break
+                position = start
+            if keep < end:
+                logger.debug(f"Dropping {end - keep} byte(s) of an unfinished journal line")
+                f.truncate(keep)
+
+    def _append(self, entry: Dict[str, Any]):
+        if self._file is None:
+            return
+        self._file.write(json.dumps(entry, default=str) + "\n")
+        now = time.monotonic()
+        if now - self._flushed >= JOURNAL_FLUSH_INTERVAL:
+            self._file.flush()
+            self._flushed = now
+
+    def record_probe(self, target: str, protocol: str, result: Optional[Dict[str, Any]]):
+        self._append({"target": target, "protocol": protocol, "result": result})
+
+    def record_host(self, target: str, results: List[Dict[str, Any]]):
+        self._append({"target": target, "done": True, "results": results})
+
+    def finished_probes(self, target: str) -> Dict[str, Optional[Dict[str, Any]]]:
+        return self.probes.get(target, {})
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def discard(self):
+        """Remove the journal once its scan has completed."""
+        self.close()
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
@@ -0,0 +1,215 @@
+import contextlib
+import os
+import stat
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, List, Optional, Set
+from ironflow.core.config import config
+from ironflow.core.logger import logger
+from ironflow.discovery.decoder import CaptureReader, PacketInfo
+from ironflow.discovery.flows import FlowTable
+from ironflow.discovery.passive import PassiveDiscovery, ProgressCallback
+
+# Seconds between end-of-file polls while following a growing capture.
+FOLLOW_POLL_INTERVAL = 0.2
+# Seconds between progress reports.
+LIVE_PROGRESS_INTERVAL = 1.0
+
+class FollowStream:
+    """
+    Read-only view of a capture file that is still being written. Reads
+    block at end of file until more data arrives (like `tail -f`) and
+    return short only once `stop` is set.
+    """
+
+    def __init__(self, path: str, stop: threading.Event, poll: float = FOLLOW_POLL_INTERVAL):
+        self.name = path
+        self.file = open(path, "rb")
+        self.stop = stop
+        self.poll = poll
+
+    def seekable(self) -> bool:
+        # Keeps CaptureReader from mapping a snapshot of the file
+        return False
+
+    def read(self, size: int = -1) -> bytes:
+        if size < 0:
+            return self.file.read()
+        chunks = []
+        while size > 0:
+            data = self.file.read(size)
+            if data:
+                chunks.append(data)
+                size -= len(data)
+            elif self.stop.wait(self.poll):
+                break
+        return b"".join(chunks)
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class LiveCapture:
+    """
+    Near-real-time passive discovery over a continuous packet source.
+
+    A reader thread (or Scapy's sniffer for interfaces) decodes packets into
+    a bounded ring buffer; the analyzing loop drains it, updates findings
+    incrementally and flushes new or re-seen assets to the AssetDatabase at
+    a fixed interval. When the analyzer falls behind, the oldest buffered
+    packets are dropped rather than growing memory without bound.
+    """
+
+    def __init__(self, passive: Optional[PassiveDiscovery] = None, db=None,
+                 buffer_size: Optional[int] = None, flush_interval: Optional[float] = None):
+        self.passive = passive if passive is not None else PassiveDiscovery()
+        self.db = db
+        self.buffer: deque = deque(maxlen=buffer_size or config.LIVE_BUFFER_SIZE)
+        self.flush_interval = flush_interval if flush_interval is not None else config.LIVE_FLUSH_INTERVAL
+        if self.flush_interval <= 0:
+            raise ValueError(f"Live flush interval must be positive, got {self.flush_interval}")
+        self.findings: Dict[str, Dict[str, Any]] = {}
+        self.stats = {"captured": 0, "processed": 0, "dropped": 0, "flushes": 0}
+        self._dirty: Set[str] = set()
+        self._stop = threading.Event()
+        self._done = threading.Event()
+        self._ready = threading.Event()
+        self._sniffer = None
+        # Reader thread of a followed capture file, joined on stop
+        self._follower: Optional[threading.Thread] = None
+
+    def _push(self, info: PacketInfo):
+        if len(self.buffer) == self.buffer.maxlen:
+            self.stats["dropped"] += 1
+        self.buffer.append(info)
+        self._ready.set()
+
+    def _read_stream(self, source: str, follow: bool = False):
+        try:
+            # The followed file is opened and closed by this thread
+            opened = FollowStream(source, self._stop) if follow else contextlib.nullcontext(source)
+            with opened as stream, CaptureReader(stream) as reader:
+                for info in self.passive.decode_records(reader):
+                    self.stats["captured"] += 1
+                    if info is not None:
+                        self._push(info)
+                    if self._stop.is_set():
+                        break
+        except Exception as e:
+            logger.error(f"Live capture stopped: {e}")
+        finally:
+            self._done.set()
+            self._ready.set()
+
+    def _on_sniffed(self, pkt):
+        self.stats["captured"] += 1
+        info = self.passive.decode_packet(pkt)
+        if info is not None:
+            self._push(info)
+
+    def start(self, source: str):
+        """
+        Start capturing from `source`: "-" (stdin), a named pipe, a capture
+        file to follow, or otherwise a network interface name.
+        """
+        if source == "-" or (os.path.exists(source) and stat.S_ISFIFO(os.stat(source).st_mode)):
+            name, follow = "stdin" if source == "-" else source, False
+        elif os.path.isfile(source):
+            name, follow = source, True
+        else:
+            from scapy.all import AsyncSniffer
+
+            logger.info(f"Sniffing OT traffic on interface {source}...")
+            self._sniffer = AsyncSniffer(iface=source, prn=self._on_sniffed, store=False)
+            self._sniffer.start()
+            return
+
+        logger.info(f"Reading live capture from {name}...")
+        reader = threading.Thread(target=self._read_stream, args=(source, follow), name="ironflow-live", daemon=True)
+        reader.start()
+        if follow:
+            self._follower = reader
+
+    def stop(self):
+        self._stop.set()
+        if self._follower is not None:
+            # Wakes within FOLLOW_POLL_INTERVAL and closes the file
+            self._follower.join()
+            self._follower = None
+        if self._sniffer is not None:
+            try:
+                self._sniffer.stop()
+            except Exception as e:
+                logger.debug(f"Sniffer did not stop cleanly: {e}")
+            self._sniffer = None
+            self._done.set()
+
+    def drain(self) -> int:
+        """Analyze everything currently buffered; returns the packet count."""
+        count = 0
+        while self.buffer:
+            target = self.passive.process_packet(self.buffer.popleft(), self.findings)
+            if target is not None:
+                self._dirty.add(target)
+            count += 1
+        self.stats["processed"] += count
+        return count
+
+    def flush(self):
+        """Persist assets discovered or seen again since the last flush."""
+        dirty, self._dirty = self._dirty, set()
+        if self.db is None or not dirty:
+            return
+        self.db.save_assets(self.findings[target] for target in dirty)
+        self.stats["flushes"] += 1
+        logger.debug(f"Flushed {len(dirty)} live asset(s) to the database")
+
+    def run(self, source: str, duration: Optional[float] = None,
+            progress: Optional[ProgressCallback] = None) -> List[Dict[str, Any]]:
+        """
+        Capture and analyze until the source ends, `duration` seconds pass
+        or the user interrupts, then return the findings.
+        """
+        self.passive.flows = FlowTable()
+        started = time.monotonic()
+        deadline = started + duration if duration else None
+        next_flush = started + self.flush_interval
+        next_progress = started + LIVE_PROGRESS_INTERVAL
+
+        self.start(source)
+        try:
+            while True:
+                now = time.monotonic()
+                wake = min(next_flush, next_progress, deadline or next_flush)
+                self._ready.wait(max(0.0, wake - now))
+                self._ready.clear()
+                self.drain()
+
+                now = time.monotonic()
+                if now >= next_flush:
+                    self.flush()
+                    next_flush = now + self.flush_interval
+                if progress and now >= next_progress:
+                    progress(self.stats["processed"], self.stats["processed"] / max(now - started, 1e-9))
+                    next_progress = now + LIVE_PROGRESS_INTERVAL
+                if (self._done.is_set() and not self.buffer) or (deadline and now >= deadline):
+                    break
+        except KeyboardInterrupt:
+            logger.info("Live capture interrupted")
+        finally:
+            self.stop()
+            self.drain()
+            self.flush()
+
+        elapsed = time.monotonic() - started
+        self.passive.record_stats(self.stats["processed"], elapsed)
+        self.passive.log_stats()
+        if self.stats["dropped"]:
+            logger.warning(f"Ring buffer overflowed: {self.stats['dropped']} packets dropped")
+        return list(self.findings.values())
@@ -1,47 +1,314 @@
-from typing import List, Dict, Any
-from scapy.all import rdpcap, IP, TCP
+import glob
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Dict, Any, Callable, Iterable, Iterator, Optional, Tuple, Union, BinaryIO
+from ironflow.core.error_handler import CaptureFormatError
 from ironflow.core.logger import logger
+from ironflow.discovery.decoder import (
+    CaptureReader, PacketInfo, Record, capture_format, decode_frame,
+    SUPPORTED_LINKTYPES, IPPROTO_TCP, IPPROTO_UDP,
+)
+from ironflow.discovery.flows import FlowTable
+from ironflow.discovery.ports import PortClassifier
+
+# Packets between two progress reports while streaming a capture.
+PROGRESS_INTERVAL = 10000
+# Classic pcap files larger than this are split into byte-range shards.
+DEFAULT_SHARD_SIZE = 256 * 1024 * 1024
+
+# Callback receiving (packets processed so far, packets per second)
+ProgressCallback = Callable[[int, float], None]
+
+# (src, dst, ip_proto, sport, dport) as produced by decode_frame
+Decoded = Tuple[str, str, int, int, int]
+
+# (path, start byte, stop byte or None for end of file)
+Shard = Tuple[str, int, Optional[int]]
+
+def _capture_format(path: str) -> Optional[str]:
+    try:
+        with open(path, "rb") as f:
+            return capture_format(f.read(4))
+    except OSError:
+        return None
+
+def expand_sources(sources: Iterable[str]) -> List[str]:
+    """
+    Resolve capture files, directories and glob patterns into an ordered
+    list of paths. Directory entries are kept when they start with a
+    pcap/pcapng magic number, so rotated names like `span1.pcap7` work.
+    """
+    paths = []
+    for source in sources:
+        if source == "-":
+            paths.append(source)
+        elif os.path.isdir(source):
+            for name in sorted(os.listdir(source)):
+                path = os.path.join(source, name)
+                if os.path.isfile(path) and _capture_format(path) is not None:
+                    paths.append(path)
+        elif glob.has_magic(source):
+            paths.extend(p for p in sorted(glob.glob(source)) if os.path.isfile(p))
+        else:
+            paths.append(source)
+    return paths
+
+def plan_shards(paths: Iterable[str], shard_size: int = DEFAULT_SHARD_SIZE) -> List[Shard]:
+    """
+    Split work into shards: whole files, plus byte ranges of large classic
+    pcap files (pcapng blocks cannot be resynchronised cheaply).
+    """
+    shards = []
+    for path in paths:
+        size = os.path.getsize(path) if path != "-" else 0
+        if shard_size > 0 and size > shard_size and _capture_format(path) == "pcap":
+            for start in range(0, size, shard_size):
+                stop = start + shard_size
+                shards.append((path, start, stop if stop < size else None))
+        else:
+            shards.append((path, 0, None))
+    return shards
+
+def _analyze_shard(shard: Shard, classifier: PortClassifier,
+                   progress: Optional[ProgressCallback] = None) -> Dict[str, Any]:
+    """Process-pool entry point; returns picklable per-shard results."""
+    passive = PassiveDiscovery(classifier)
+    findings = passive.analyze_shard(*shard, progress=progress)
+    return {"findings": findings, "flows": passive.flows, "packets": passive.stats["packets"]}
 
 class PassiveDiscovery:
     """
-    Passive discovery using PCAP analysis via Scapy.
+    Passive discovery using PCAP analysis.
+    Captures are streamed packet by packet through a struct-based header
+    decoder; Scapy is only used for frames the decoder does not understand.
     """
 
-    def __init__(self):
-        self.port_map = {
-            502: "Modbus",
-            102: "S7Comm",
-            20000: "DNP3"
-        }
+    def __init__(self, classifier: Optional[PortClassifier] = None):
+        self.classifier = classifier if classifier is not None else PortClassifier.default()
+        self.stats = {"packets": 0, "elapsed": 0.0, "pps": 0.0}
+        # Conversations seen by the last analysis, for topology edges
+        self.flows = FlowTable()
+
+    def iter_packets(self, source: Union[str, BinaryIO]) -> Iterator:
+        """
+        Yield Scapy packets one at a time from a pcap/pcapng path, "-" for
+        stdin, or an already opened binary stream.
+        """
+        from scapy.all import PcapReader
+
+        if source == "-":
+            source = sys.stdin.buffer
+        # PcapReader sniffs the magic number and hands pcapng over to PcapNgReader
+        with PcapReader(source) as reader:
+            for pkt in reader:
+                yield pkt
 
-    def analyze_pcap(self, file_path: str) -> List[Dict[str, Any]]:
+    def iter_decoded(self, source: Union[str, BinaryIO]) -> Iterator[Optional[PacketInfo]]:
+        """
+        Yield the decoded headers of every packet (None for non TCP/UDP frames).
+        """
+        try:
+            reader = CaptureReader(source)
+        except CaptureFormatError as e:
+            if source == "-" or not isinstance(source, str):
+                raise
+            logger.debug(f"Raw reader cannot handle {source} ({e}); falling back to Scapy")
+            for pkt in self.iter_packets(source):
+                yield self.decode_packet(pkt)
+            return
+
+        with reader:
+            yield from self.decode_records(reader)
+
+    def decode_records(self, records: Iterable[Record]) -> Iterator[Optional[PacketInfo]]:
+        """
+        Decode raw CaptureReader records one by one (None for non TCP/UDP
+        frames), e.g. for a caller that buffers packets before process_packet.
+        """
+        for timestamp, linktype, buf, offset, caplen, length in records:
+            if linktype in SUPPORTED_LINKTYPES:
+                decoded = decode_frame(linktype, buf, offset, caplen)
+            else:
+                decoded = self._decode_scapy_frame(linktype, bytes(buf[offset:offset + caplen]))
+            yield PacketInfo(timestamp, *decoded, length) if decoded else None
+
+    def analyze_pcap(self, file_path: Union[str, BinaryIO], progress: Optional[ProgressCallback] = None) -> List[Dict[str, Any]]:
         """
         Analyze a PCAP/PCAPNG file for OT protocols based on common ports.
         """
-        logger.info(f"Analyzing {file_path} for OT traffic...")
+        name = file_path if isinstance(file_path, str) else getattr(file_path, "name", "stream")
+        name = "stdin" if name == "-" else name
+        logger.info(f"Analyzing {name} for OT traffic...")
+        findings = self._analyze(self.iter_decoded(file_path), progress)
+        self.log_stats()
+        return findings
+
+    def analyze_shard(self, path: str, start: int = 0, stop: Optional[int] = None,
+                      progress: Optional[ProgressCallback] = None) -> List[Dict[str, Any]]:
+        """
+        Analyze the records of a classic pcap file whose headers begin in
+        the byte range [start, stop). Adjacent shards resolve the same
+        boundary, so each record is counted exactly once.
+        """
+        if start == 0 and stop is None:
+            return self.analyze_pcap(path, progress)
+
+        def records():
+            with CaptureReader(path) as reader:
+                first = reader.find_pcap_boundary(start)
+                last = reader.find_pcap_boundary(stop) if stop is not None else None
+                yield from self.decode_records(reader.iter_pcap_range(first, last))
+
+        logger.debug(f"Analyzing {path} bytes {start}-{stop if stop is not None else 'EOF'}")
+        return self._analyze(records(), progress)
+
+    def analyze_many(self, sources: Iterable[str], workers: int = 0, shard_size: int = DEFAULT_SHARD_SIZE,
+                     progress: Optional[ProgressCallback] = None) -> List[Dict[str, Any]]:
+        """
+        Analyze several captures (files, directories or globs) across a
+        process pool and merge the findings. Shards are merged in order,
+        so the result matches analyzing the captures one after another.
+        `workers` of 0 uses every CPU. A single shard is streamed in this
+        process, reporting progress as it goes.
+        """
+        shards = plan_shards(expand_sources(sources), shard_size)
+        if len(shards) == 1:
+            return self.analyze_pcap(shards[0][0], progress)
+        workers = min(workers or os.cpu_count() or 1, len(shards))
+        logger.info(f"Analyzing {len(shards)} capture shard(s) with {workers} worker(s)...")
+
+        findings: Dict[str, Dict[str, Any]] = {}
+        flows = FlowTable()
+        count = 0
+        started = time.monotonic()
+
+        def merge(result: Dict[str, Any]):
+            nonlocal count
+            for finding in result["findings"]:
+                findings.setdefault(finding["target"], finding)
+            flows.merge(result["flows"])
+            count += result["packets"]
+            if progress:
+                progress(count, count / max(time.monotonic() - started, 1e-9))
+
+        def analyze_here(shard: Shard) -> Dict[str, Any]:
+            # Shards analyzed in this process report their packets as they stream
+            def shard_progress(packets: int, _):
+                progress(count + packets, (count + packets) / max(time.monotonic() - started, 1e-9))
+            return _analyze_shard(shard, self.classifier, shard_progress if progress else None)
+
+        if workers <= 1:
+            for shard in shards:
+                merge(analyze_here(shard))
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                # stdin can only be read by this process
+                futures = [None if shard[0] == "-" else pool.submit(_analyze_shard, shard, self.classifier) for shard in shards]
+                for shard, future in zip(shards, futures):
+                    merge(future.result() if future is not None else analyze_here(shard))
+
+        self.flows = flows
+        self.record_stats(count, time.monotonic() - started)
+        self.log_stats()
+        return list(findings.values())
+
+    def analyze_live(self, source: str, db=None, flush_interval: Optional[float] = None,
+                     buffer_size: Optional[int] = None, duration: Optional[float] = None,
+                     progress: Optional[ProgressCallback] = None) -> List[Dict[str, Any]]:
+        """
+        Continuously analyze an interface, a pipe ("-" for stdin) or a
+        capture file that is still being written, flushing findings to the
+        given AssetDatabase every `flush_interval` seconds. Runs until the
+        stream ends, `duration` elapses or the user interrupts.
+        """
+        from ironflow.discovery.live import LiveCapture
+
+        live = LiveCapture(self, db=db, buffer_size=buffer_size, flush_interval=flush_interval)
+        return live.run(source, duration=duration, progress=progress)
+
+    def _analyze(self, packets: Iterable[Optional[PacketInfo]], progress: Optional[ProgressCallback]) -> List[Dict[str, Any]]:
         findings = {}
+        self.flows = FlowTable()
+        count = 0
+        started = time.monotonic()
 
         try:
-            packets = rdpcap(file_path)
-            for pkt in packets:
-                if IP in pkt and TCP in pkt:
-                    src_ip = pkt[IP].src
-                    dst_ip = pkt[IP].dst
-                    sport = pkt[TCP].sport
-                    dport = pkt[TCP].dport
-                    
-                    for port, proto in self.port_map.items():
-                        if sport == port or dport == port:
-                            target_ip = dst_ip if dport == port else src_ip
-                            if target_ip not in findings:
-                                findings[target_ip] = {
-                                    "target": target_ip,
-                                    "protocol": proto,
-                                    "source": "passive",
-                                    "online": True,
-                                    "details": {"identified_via": "port_analysis"}
-                                }
+            for info in packets:
+                count += 1
+                if info is not None:
+                    self.process_packet(info, findings)
+                if progress and count % PROGRESS_INTERVAL == 0:
+                    progress(count, count / max(time.monotonic() - started, 1e-9))
         except Exception as e:
             logger.error(f"Error during PCAP analysis: {e}")
-            
+
+        self.record_stats(count, time.monotonic() - started)
         return list(findings.values())
+
+    def record_stats(self, count: int, elapsed: float):
+        """Set the packet count and throughput reported by log_stats."""
+        self.stats = {"packets": count, "elapsed": elapsed, "pps": count / elapsed if elapsed > 0 else 0.0}
+
+    def log_stats(self):
+        stats = self.stats
+        logger.info(f"Processed {stats['packets']} packets in {stats['elapsed']:.2f}s ({stats['pps']:.0f} pkt/s)")
+
+    def process_packet(self, info: PacketInfo, findings: Dict[str, Dict[str, Any]]) -> Optional[str]:
+        """
+        Classify one decoded packet, updating `findings` (target -> finding)
+        and the flow table. Returns the OT server address it involved, if any.
+        """
+        hit = self.classifier.classify(info.transport, info.sport, info.dport)
+        if hit is None:
+            return None
+
+        proto, port, to_server = hit
+        if to_server:
+            client_ip, target_ip = info.src, info.dst
+        else:
+            client_ip, target_ip = info.dst, info.src
+        self.flows.add(client_ip, target_ip, proto, port, info.length, info.timestamp)
+        if target_ip not in findings:
+            findings[target_ip] = {
+                "target": target_ip,
+                "protocol": proto,
+                "source": "passive",
+                "online": True,
+                "details": {"identified_via": "port_analysis"}
+            }
+        return target_ip
+
+    def decode_packet(self, pkt) -> Optional[PacketInfo]:
+        """
+        Decoded headers of a Scapy packet (e.g. from a sniffer), or None for
+        non TCP/UDP frames.
+        """
+        decoded = self._decode_scapy(pkt)
+        return PacketInfo(float(pkt.time), *decoded, getattr(pkt, "wirelen", None) or len(pkt)) if decoded else None
+
+    @staticmethod
+    def _decode_scapy(pkt) -> Optional[Decoded]:
+        """
+        Deep-dissection fallback producing the same tuple as decode_frame.
+        """
+        from scapy.all import IP, IPv6, TCP, UDP
+
+        layer = pkt.getlayer(IP) or pkt.getlayer(IPv6)
+        if layer is None:
+            return None
+        for transport, proto in ((TCP, IPPROTO_TCP), (UDP, IPPROTO_UDP)):
+            if transport in pkt:
+                return layer.src, layer.dst, proto, pkt[transport].sport, pkt[transport].dport
+        return None
+
+    def _decode_scapy_frame(self, linktype: int, frame: bytes) -> Optional[Decoded]:
+        from scapy.all import conf, Raw
+
+        cls = conf.l2types.get(linktype, Raw)
+        try:
+            return self._decode_scapy(cls(frame))
+        except Exception as e:
+            logger.debug(f"Could not dissect frame with linktype {linktype}: {e}")
+            return None
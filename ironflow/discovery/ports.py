@@ -0,0 +1,90 @@
+from array import array
+from typing import Iterable, List, Optional, Tuple
+from ironflow.discovery.decoder import IPPROTO_TCP, IPPROTO_UDP
+
+TRANSPORTS = {"tcp": IPPROTO_TCP, "udp": IPPROTO_UDP}
+
+class PortClassifier:
+    """
+    Constant-time mapping of (transport, port) to an OT protocol.
+    Each transport has a dense 65536-entry table of label indices, so
+    classifying a packet costs two array reads however many protocols are
+    registered. Earlier registrations win when both ports of a packet match.
+    """
+
+    def __init__(self):
+        # Index 0 means "not an OT service"
+        self.labels: List[str] = [""]
+        self.tables = {number: array("H", bytes(2 * 65536)) for number in TRANSPORTS.values()}
+        self._priority = {number: array("H", bytes(2 * 65536)) for number in TRANSPORTS.values()}
+        self._registered = 0
+
+    @classmethod
+    def default(cls) -> "PortClassifier":
+        """
+        Classifier over the bundled protocol plugins, read through the
+        plugin manifest.
+        """
+        from ironflow.core.engine import IronEngine, BUNDLED_PLUGIN_PACKAGES
+
+        engine = IronEngine()
+        engine.discover_plugins(package_paths=BUNDLED_PLUGIN_PACKAGES)
+        return cls.for_engine(engine)
+
+    @classmethod
+    def for_engine(cls, engine) -> "PortClassifier":
+        """
+        Classifier over every plugin in an IronEngine's manifest, in name order.
+        """
+        plugins = (engine.get_plugin(name) for name in engine.available_plugins())
+        return cls.from_plugins(plugin for plugin in plugins if plugin is not None)
+
+    @classmethod
+    def from_plugins(cls, plugins: Iterable, base: Optional["PortClassifier"] = None) -> "PortClassifier":
+        """
+        Register the `passive_ports` metadata of protocol plugins (their
+        probed service when they declare none) on a new classifier, or on
+        `base` if given. Ports already registered keep their protocol.
+        """
+        classifier = base if base is not None else cls()
+        for plugin in plugins:
+            label = getattr(plugin, "protocol", "")
+            services = getattr(plugin, "passive_ports", ())
+            if not services and getattr(plugin, "default_port", 0):
+                services = ((plugin.transport, plugin.default_port),)
+            for transport, port in services:
+                if label and classifier.lookup(transport, port) is None:
+                    classifier.register(transport, port, label)
+        return classifier
+
+    def register(self, transport: str, port: int, label: str):
+        number = TRANSPORTS[transport.lower()]
+        if label not in self.labels:
+            if len(self.labels) >= 0xFFFF:
+                raise ValueError("Too many protocol labels for the port table")
+            self.labels.append(label)
+        self._registered += 1
+        self.tables[number][port] = self.labels.index(label)
+        self._priority[number][port] = min(self._registered, 0xFFFF)
+
+    def lookup(self, transport: str, port: int) -> Optional[str]:
+        index = self.tables[TRANSPORTS[transport.lower()]][port]
+        return self.labels[index] if index else None
+
+    def classify(self, ip_proto: int, sport: int, dport: int) -> Optional[Tuple[str, int, bool]]:
+        """
+        Classify a TCP/UDP packet.
+        Returns (protocol, service port, True if the destination is the
+        server side), or None for non-OT traffic.
+        """
+        table = self.tables.get(ip_proto)
+        if table is None:
+            return None
+        dst_index = table[dport]
+        src_index = table[sport]
+        if not dst_index and not src_index:
+            return None
+        priority = self._priority[ip_proto]
+        if dst_index and (not src_index or priority[dport] <= priority[sport]):
+            return self.labels[dst_index], dport, True
+        return self.labels[src_index], sport, False
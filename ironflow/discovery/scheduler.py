@@ -0,0 +1,147 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from typing import Dict, Hashable, Iterable, Optional
+from ironflow.core.config import config, IronConfig
+from ironflow.core.timing import subnet_of
+
+# Idle buckets are pruned once this many accumulate, keeping /16 sweeps flat.
+PRUNE_THRESHOLD = 4096
+
+class TokenBucket:
+    """
+    Token bucket granting `rate` probes per second with bursts of `capacity`.
+    Tokens are reserved up front so concurrent waiters queue fairly.
+    """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self) -> float:
+        """
+        Take one token and return how many seconds to wait before using it.
+        """
+        self._refill(time.monotonic())
+        self.tokens -= 1.0
+        return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    async def acquire(self):
+        delay = self.reserve()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def is_idle(self) -> bool:
+        """A full bucket carries no state and can be dropped."""
+        self._refill(time.monotonic())
+        return self.tokens >= self.capacity
+
+class ProbeScheduler:
+    """
+    OT-safe admission control for active probes.
+
+    Every probe passes a per-host concurrency gate, then token buckets per
+    target IP, per subnet and overall (plus any stricter per-protocol
+    buckets), and finally the global in-flight limit. A host waiting for
+    its next token yields the slot to other hosts, so probes interleave
+    across the range instead of bursting at a single device.
+    """
+
+    def __init__(self, settings: IronConfig = config):
+        self.settings = settings
+        self.global_inflight = asyncio.Semaphore(max(1, settings.MAX_CONCURRENCY))
+        self.global_bucket = self._new_bucket(settings.RATE_LIMIT_GLOBAL)
+        self.buckets: Dict[Hashable, TokenBucket] = {}
+        self.host_gates: Dict[str, asyncio.Semaphore] = {}
+        self.host_users: Dict[str, int] = {}
+
+    @staticmethod
+    def _new_bucket(rate: float) -> Optional[TokenBucket]:
+        return TokenBucket(rate) if rate and rate > 0 else None
+
+    def subnet_of(self, target: str) -> str:
+        # Hostnames get a bucket of their own
+        return subnet_of(target, self.settings.RATE_LIMIT_PREFIX)
+
+    def _bucket(self, key: Hashable, rate: float) -> Optional[TokenBucket]:
+        if not rate or rate <= 0:
+            return None
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            if len(self.buckets) >= PRUNE_THRESHOLD:
+                self._prune()
+            bucket = self.buckets[key] = TokenBucket(rate)
+        return bucket
+
+    def _prune(self):
+        for key in [k for k, b in self.buckets.items() if b.is_idle()]:
+            del self.buckets[key]
+
+    def _buckets_for(self, target: str, protocol: str):
+        """
+        Buckets a probe must pass, narrowest scope first.
+        """
+        subnet = self.subnet_of(target)
+        overrides = self.settings.PROTOCOL_RATE_LIMITS.get(protocol.lower(), {})
+        chain = [
+            self._bucket(("host", protocol, target), overrides.get("host")),
+            self._bucket(("host", target), self.settings.RATE_LIMIT_HOST),
+            self._bucket(("subnet", protocol, subnet), overrides.get("subnet")),
+            self._bucket(("subnet", subnet), self.settings.RATE_LIMIT_SUBNET),
+            self.global_bucket,
+        ]
+        return [b for b in chain if b is not None]
+
+    async def _admit(self, target: str, protocol: str):
+        # Waiting on sequential buckets avoids burning broader tokens
+        # while a narrower limit is still holding the probe back.
+        for bucket in self._buckets_for(target, protocol):
+            await bucket.acquire()
+
+    @asynccontextmanager
+    async def host_gate(self, target: str):
+        """
+        Hold one of the MAX_PER_HOST concurrent probe places of `target`.
+        """
+        gate = self.host_gates.get(target)
+        if gate is None:
+            gate = self.host_gates[target] = asyncio.Semaphore(max(1, self.settings.MAX_PER_HOST))
+        self.host_users[target] = self.host_users.get(target, 0) + 1
+        try:
+            async with gate:
+                yield
+        finally:
+            self.host_users[target] -= 1
+            if not self.host_users[target]:
+                del self.host_users[target]
+                del self.host_gates[target]
+
+    @asynccontextmanager
+    async def slot(self, target: str, protocol: str):
+        """
+        Hold admission for one probe of `protocol` against `target`.
+        """
+        async with self.host_gate(target):
+            await self._admit(target, protocol)
+            async with self.global_inflight:
+                yield
+
+    @asynccontextmanager
+    async def batch_slot(self, targets: Iterable[str], protocol: str):
+        """
+        Admission for one batched call covering `targets`: every target pays
+        its rate-limit tokens, and the call holds a single in-flight place.
+        Host gates are left to the callers waiting on the batch, so batches
+        never hold several semaphores at once.
+        """
+        for target in targets:
+            await self._admit(target, protocol)
+        async with self.global_inflight:
+            yield
+
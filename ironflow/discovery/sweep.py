@@ -0,0 +1,123 @@
+import asyncio
+import time
+from typing import Dict, Iterable, Optional, Tuple
+from ironflow.core.config import config
+from ironflow.core.logger import logger
+from ironflow.core.timing import RttEstimator
+
+OPEN = "open"
+CLOSED = "closed"
+FILTERED = "filtered"
+
+# (transport, port)
+Service = Tuple[str, int]
+
+class _UDPProbe(asyncio.DatagramProtocol):
+    """Resolves with the port state once a datagram or ICMP error arrives."""
+
+    def __init__(self, done: asyncio.Future):
+        self.done = done
+
+    def datagram_received(self, data: bytes, addr):
+        if not self.done.done():
+            self.done.set_result(OPEN)
+
+    def error_received(self, exc: Exception):
+        # ICMP port-unreachable surfaces as ConnectionRefusedError on a connected socket
+        if not self.done.done():
+            self.done.set_result(CLOSED if isinstance(exc, ConnectionRefusedError) else FILTERED)
+
+class PortSweeper:
+    """
+    First-stage reachability sweep run before any protocol handshake.
+    TCP ports are checked with non-blocking connects that are closed
+    immediately; UDP ports are checked by sending the plugin's probe payload
+    and waiting for any reply.
+    """
+
+    def __init__(self, timeout: Optional[float] = None, rtt: Optional[RttEstimator] = None):
+        self.timeout = timeout or config.SWEEP_TIMEOUT
+        # Shared estimator: handshakes and refusals are RTT samples, and
+        # the timeout for silent ports shrinks with the measured RTT.
+        self.rtt = rtt
+
+    def _timeout(self, target: str) -> float:
+        return self.rtt.timeout(target, ceiling=self.timeout) if self.rtt is not None else self.timeout
+
+    def _observe(self, target: str, started: float):
+        if self.rtt is not None:
+            self.rtt.observe(target, time.monotonic() - started)
+
+    async def check_tcp(self, target: str, port: int) -> str:
+        started = time.monotonic()
+        try:
+            _, writer = await asyncio.wait_for(asyncio.open_connection(target, port), self._timeout(target))
+        except ConnectionRefusedError:
+            self._observe(target, started)
+            return CLOSED
+        except (asyncio.TimeoutError, OSError):
+            return FILTERED
+
+        self._observe(target, started)
+
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except OSError:
+            pass
+        return OPEN
+
+    async def check_udp(self, target: str, port: int, payload: bytes) -> str:
+        loop = asyncio.get_running_loop()
+        done = loop.create_future()
+        try:
+            transport, _ = await loop.create_datagram_endpoint(
+                lambda: _UDPProbe(done), remote_addr=(target, port)
+            )
+        except OSError as e:
+            logger.debug(f"UDP sweep of {target}:{port} failed: {e}")
+            return FILTERED
+
+        try:
+            started = time.monotonic()
+            transport.sendto(payload)
+            state = await asyncio.wait_for(done, self._timeout(target))
+            if state != FILTERED:
+                self._observe(target, started)
+            return state
+        except asyncio.TimeoutError:
+            return FILTERED
+        finally:
+            transport.close()
+
+    async def check(self, target: str, service: Service, payload: Optional[bytes] = None) -> str:
+        transport, port = service
+        if transport == "udp":
+            if payload is None:
+                # Without a request to send, silence proves nothing: let the plugin decide
+                return OPEN
+            return await self.check_udp(target, port, payload)
+        return await self.check_tcp(target, port)
+
+    async def sweep_host(self, target: str, checks: Iterable[Tuple[str, Service, Optional[bytes]]],
+                         scheduler=None) -> Dict[Service, str]:
+        """
+        Check the services of one host, given as (protocol, service, payload).
+        When a ProbeScheduler is given, every check is admitted like a probe
+        of its protocol (host gate, per-host, per-subnet and per-protocol
+        rate limits), since a bare SYN or datagram is already load on a
+        fragile stack; without one the checks run one at a time.
+        """
+        checks = list(checks)
+        states: Dict[Service, str] = {}
+        if scheduler is None:
+            for _, service, payload in checks:
+                states[service] = await self.check(target, service, payload)
+            return states
+
+        async def gated(protocol: str, service: Service, payload: Optional[bytes]):
+            async with scheduler.slot(target, protocol):
+                states[service] = await self.check(target, service, payload)
+
+        await asyncio.gather(*(gated(*check) for check in checks))
+        return states
@@ -0,0 +1,201 @@
+import bisect
+import ipaddress
+import random
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+# (IP version, first address, last address + 1) as integers
+Interval = Tuple[int, int, int]
+
+def _merge(intervals: Iterable[Interval]) -> List[Interval]:
+    merged: List[Interval] = []
+    for version, start, end in sorted(intervals):
+        if merged and merged[-1][0] == version and start <= merged[-1][2]:
+            last = merged[-1]
+            merged[-1] = (version, last[1], max(last[2], end))
+        else:
+            merged.append((version, start, end))
+    return merged
+
+def parse_spec(spec: str) -> Optional[Interval]:
+    """
+    Parse a CIDR ("10.0.0.0/16", "fd00::/120"), a range ("10.0.0.1-10.0.0.50"
+    or the short form "10.0.0.1-50") or a single address. Returns None for
+    anything else (e.g. a hostname).
+    """
+    if "/" in spec:
+        network = ipaddress.ip_network(spec, strict=False)
+        first = int(network.network_address)
+        return network.version, first, first + network.num_addresses
+    if "-" in spec:
+        low, high = (part.strip() for part in spec.split("-", 1))
+        try:
+            start = ipaddress.ip_address(low)
+        except ValueError:
+            # A hostname such as plc-01.plant.local
+            return None
+        if high.isdigit() and start.version == 4:
+            # Short form replaces the last octet
+            high = low.rsplit(".", 1)[0] + "." + high
+        end = ipaddress.ip_address(high)
+        if end.version != start.version or int(end) < int(start):
+            raise ValueError(f"Invalid address range: {spec}")
+        return start.version, int(start), int(end) + 1
+    try:
+        address = ipaddress.ip_address(spec)
+    except ValueError:
+        return None
+    return address.version, int(address), int(address) + 1
+
+def read_target_file(path: str) -> List[str]:
+    """
+    Target specs from a file: one or more per line (comma or whitespace
+    separated), with blank lines and '#' comments ignored.
+    """
+    specs = []
+    with open(path, "r") as f:
+        for line in f:
+            line = line.split("#", 1)[0]
+            specs.extend(token for token in line.replace(",", " ").split() if token)
+    return specs
+
+def split_specs(values: Iterable[str]) -> List[str]:
+    """Flatten comma-separated command-line values into single specs."""
+    return [token.strip() for value in values for token in value.split(",") if token.strip()]
+
+class TargetSet:
+    """
+    Lazy set of scan targets built from CIDRs, address ranges, single
+    addresses (IPv4 and IPv6) and hostnames, minus exclusions.
+
+    Only the merged intervals are stored, so a /8 or an IPv6 /64 costs the
+    same memory as a single host. With `randomize`, addresses come out in a
+    pseudo-random permutation: a full-period linear congruential walk over
+    the next power of two (Hull-Dobell: c odd, a = 1 mod 4), skipping
+    indices past the end (cycle walking). Each address is produced exactly
+    once in O(1) memory, and consecutive probes land far apart, which
+    spreads load across subnets instead of hammering one segment.
+    """
+
+    def __init__(self, specs: Iterable[str], exclude: Iterable[str] = (), randomize: bool = False,
+                 seed: Optional[int] = None):
+        self.specs = list(specs)
+        self.excludes = list(exclude)
+        self.randomize = randomize
+        self.seed = seed
+
+        intervals, self.hostnames = [], []
+        for spec in self.specs:
+            interval = parse_spec(spec)
+            if interval is None:
+                if spec not in self.hostnames:
+                    self.hostnames.append(spec)
+            else:
+                intervals.append(interval)
+        self.intervals = _merge(intervals)
+
+        excluded = []
+        self.excluded_names = set()
+        for spec in self.excludes:
+            interval = parse_spec(spec)
+            if interval is None:
+                self.excluded_names.add(spec)
+            else:
+                excluded.append(interval)
+        self.excluded = _merge(excluded)
+        self.hostnames = [name for name in self.hostnames if name not in self.excluded_names]
+
+        # Cumulative offsets map a flat index onto (interval, address)
+        self._offsets = []
+        total = 0
+        for _, start, end in self.intervals:
+            self._offsets.append(total)
+            total += end - start
+        self._addresses = total
+
+    def __str__(self) -> str:
+        text = ",".join(self.specs)
+        if self.excludes:
+            text += " excluding " + ",".join(self.excludes)
+        return text
+
+    def _overlap(self, version: int, start: int, end: int) -> int:
+        count = 0
+        for ex_version, ex_start, ex_end in self.excluded:
+            if ex_version == version and ex_start < end and ex_end > start:
+                count += min(end, ex_end) - max(start, ex_start)
+        return count
+
+    @property
+    def size(self) -> int:
+        """
+        Number of targets. A plain int rather than __len__, which cannot
+        exceed sys.maxsize and so fails for an IPv6 /64.
+        """
+        excluded = sum(self._overlap(*interval) for interval in self.intervals)
+        return self._addresses - excluded + len(self.hostnames)
+
+    def is_excluded(self, version: int, value: int) -> bool:
+        i = bisect.bisect_right(self.excluded, (version, value, float("inf"))) - 1
+        if i < 0:
+            return False
+        ex_version, ex_start, ex_end = self.excluded[i]
+        return ex_version == version and ex_start <= value < ex_end
+
+    def __contains__(self, target: str) -> bool:
+        try:
+            address = ipaddress.ip_address(target)
+        except ValueError:
+            return target in self.hostnames
+        version, value = address.version, int(address)
+        i = bisect.bisect_right(self.intervals, (version, value, float("inf"))) - 1
+        if i < 0:
+            return False
+        in_version, start, end = self.intervals[i]
+        return in_version == version and start <= value < end and not self.is_excluded(version, value)
+
+    def full_subnets(self, prefix: int = 24) -> Iterator[ipaddress.IPv4Network]:
+        """
+        IPv4 /prefix networks lying entirely inside the targets with no
+        excluded address, i.e. those a broadcast may reach as a whole.
+        """
+        size = 1 << (32 - prefix)
+        for version, start, end in self.intervals:
+            if version != 4:
+                continue
+            first = -(-start // size) * size
+            for network_start in range(first, end - size + 1, size):
+                if self._overlap(4, network_start, network_start + size):
+                    continue
+                yield ipaddress.IPv4Network((network_start, prefix))
+
+    def _at(self, index: int) -> Optional[str]:
+        if index >= self._addresses:
+            return self.hostnames[index - self._addresses]
+        i = bisect.bisect_right(self._offsets, index) - 1
+        version, start, _ = self.intervals[i]
+        value = start + index - self._offsets[i]
+        if self.excluded and self.is_excluded(version, value):
+            return None
+        return str(ipaddress.IPv4Address(value) if version == 4 else ipaddress.IPv6Address(value))
+
+    def _indices(self) -> Iterator[int]:
+        total = self._addresses + len(self.hostnames)
+        if not self.randomize or total < 3:
+            yield from range(total)
+            return
+
+        modulus = 1 << (total - 1).bit_length()
+        rng = random.Random(self.seed)
+        multiplier = 4 * rng.randrange(modulus // 4 or 1) + 1
+        increment = 2 * rng.randrange(modulus // 2) + 1
+        value = rng.randrange(modulus)
+        for _ in range(modulus):
+            value = (multiplier * value + increment) % modulus
+            if value < total:
+                yield value
+
+    def __iter__(self) -> Iterator[str]:
+        for index in self._indices():
+            target = self._at(index)
+            if target is not None:
+                yield target
@@ -1,8 +1,28 @@
+import ipaddress
+import socket
+import threading
+import time
 from abc import ABC, abstractmethod
-from typing import Any, Dict, Optional
+from typing import Any, Dict, Iterable, Iterator, Optional, Tuple, Union
 from ironflow.core.config import config
 from ironflow.core.logger import logger
-from ironflow.core.error_handler import SafetyViolationError
+from ironflow.core.error_handler import ProtocolTimeoutError, SafetyViolationError
+
+# Connect time of the probe running on this thread, see ProtocolPlugin.connect
+_probe = threading.local()
+
+def ipv4_address(address: str) -> ipaddress.IPv4Address:
+    """
+    Parse an IPv4 literal for broadcast discovery, raising ValueError for
+    anything else (hostnames, IPv6).
+    """
+    try:
+        parsed = ipaddress.ip_address(address.strip())
+    except ValueError:
+        raise ValueError(f"Invalid broadcast address '{address}': expected an IPv4 address")
+    if parsed.version != 4:
+        raise ValueError(f"Broadcast discovery is IPv4-only; '{address}' is IPv6")
+    return parsed
 
 class BasePlugin(ABC):
     """
@@ -21,6 +41,15 @@ class BasePlugin(ABC):
         """
         pass
 
+    def run_batch(self, targets: Iterable[str], **kwargs) -> Iterator[Dict[str, Any]]:
+        """
+        Execute the plugin against many targets, yielding one result per
+        target. Plugins able to share a socket, pipeline or broadcast across
+        targets override this; the default runs them one by one.
+        """
+        for target in targets:
+            yield self.run(target, **kwargs)
+
     def check_safety(self, operation: str = "Write"):
         """
         Helper to check if an operation is safe to perform.
@@ -32,11 +61,192 @@ class BasePlugin(ABC):
 class ProtocolPlugin(BasePlugin):
     """
     Base class for protocol-specific scanners/analyzers.
+    Subclasses describe their service through class attributes so the
+    discovery layer can plan probes (e.g. port sweeps) without running them.
     """
-    
+
+    # Protocol name reported in results, e.g. "Modbus TCP"
+    protocol: str = ""
+    default_port: int = 0
+    # "tcp" or "udp"
+    transport: str = "tcp"
+    # UDP request expected to elicit a reply, used to sweep UDP services
+    probe_payload: Optional[bytes] = None
+    # (transport, port) pairs recognised in passive traffic; defaults to the probed service
+    passive_ports: Tuple[Tuple[str, int], ...] = ()
+    # Hosts handed to run_batch at once by the discovery layer; 1 means the
+    # plugin gains nothing from batching and is probed host by host
+    batch_size: int = 1
+    # UDP request every listening device answers when it is sent to a
+    # broadcast address (subnet-wide discovery); None if not supported
+    broadcast_payload: Optional[bytes] = None
+    # Devices answer broadcasts on the service port rather than back to the
+    # sender's port (BACnet I-Am), so the collector tries to listen there
+    broadcast_replies_to_port: bool = False
+
+    def _result(self, target: str, port: int, info: Union[Dict[str, Any], ProtocolTimeoutError, None],
+                rtt: Optional[float] = None) -> Dict[str, Any]:
+        result = {
+            "target": target,
+            "port": port,
+            "protocol": self.protocol,
+            "online": False,
+            "details": {}
+        }
+        if rtt is not None:
+            # Consumed by the engine's RTT estimator
+            result["rtt"] = rtt
+        if isinstance(info, ProtocolTimeoutError):
+            # Silence is not a refusal: flag it so the scan can retry later,
+            # keeping whatever the probe learnt before it
+            logger.debug(f"{self.protocol} probe timed out: {info}")
+            result["timed_out"] = True
+            if info.details:
+                result["online"] = True
+                result["details"] = info.details
+        elif info:
+            result["online"] = True
+            result["details"] = info
+        return result
+
+    def run(self, target: str, **kwargs) -> Dict[str, Any]:
+        port = kwargs.get("port", self.default_port)
+        logger.info(f"Scanning {target}:{port} for {self.protocol} services...")
+
+        # Adaptive per-subnet timeout from the engine, else the configured one
+        timeout = kwargs.get("timeout") or config.TIMEOUT
+        id_info = self._identify(target, port, timeout)
+        return self._result(target, port, id_info, _probe.rtt)
+
+    def run_batch(self, targets: Iterable[str], **kwargs) -> Iterator[Dict[str, Any]]:
+        port = kwargs.get("port", self.default_port)
+        timeout = kwargs.get("timeout") or config.TIMEOUT
+        for target, id_info in self.identify_many(targets, port, timeout):
+            yield self._result(target, port, id_info, getattr(_probe, "rtt", None))
+            _probe.rtt = None
+
+    def parse_broadcast_reply(self, data: bytes) -> Optional[Dict[str, Any]]:
+        """
+        Details from one reply to broadcast_payload, or None to ignore the
+        datagram (e.g. our own broadcast looped back).
+        """
+        return None
+
+    def broadcast(self, addresses: Iterable[str], port: int, window: float) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """
+        Send broadcast_payload once to each address (directed broadcasts or
+        single hosts) and yield (responder, details) for every device that
+        answers within `window` seconds; repeated answers are reported once.
+        Addresses must be IPv4 literals (ValueError otherwise): the socket is
+        AF_INET and IPv6 has no broadcast.
+        """
+        addresses = [str(ipv4_address(address)) for address in addresses]
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+            if self.broadcast_replies_to_port:
+                try:
+                    sock.bind(("", port))
+                except OSError as e:
+                    logger.debug(f"Cannot listen on UDP {port} ({e}); collecting direct replies only")
+            for address in addresses:
+                try:
+                    sock.sendto(self.broadcast_payload, (address, port))
+                except OSError as e:
+                    logger.debug(f"{self.protocol} broadcast to {address}:{port} failed: {e}")
+
+            deadline = time.monotonic() + window
+            seen = set()
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                sock.settimeout(remaining)
+                try:
+                    data, (responder, _) = sock.recvfrom(4096)
+                except socket.timeout:
+                    break
+                except OSError as e:
+                    logger.debug(f"{self.protocol} broadcast receive error: {e}")
+                    continue
+                if responder in seen:
+                    continue
+                details = self.parse_broadcast_reply(data)
+                if details is not None:
+                    seen.add(responder)
+                    yield responder, details
+
+    def run_broadcast(self, addresses: Iterable[str], **kwargs) -> Iterator[Dict[str, Any]]:
+        """
+        Result dicts (flagged "broadcast": True) for the responders of broadcast().
+        """
+        port = kwargs.get("port", self.default_port)
+        window = kwargs.get("window") or config.BROADCAST_WINDOW
+        for responder, details in self.broadcast(addresses, port, window):
+            result = self._result(responder, port, details)
+            result["broadcast"] = True
+            yield result
+
+    def identify_many(self, targets: Iterable[str], port: int,
+                      timeout: float) -> Iterator[Tuple[str, Union[Dict[str, Any], ProtocolTimeoutError, None]]]:
+        """
+        Identify many targets on the same port, yielding (target, info) in
+        any order. A ProtocolTimeoutError in place of info marks a target
+        that did not answer in time. The default calls identify per target.
+        """
+        for target in targets:
+            logger.info(f"Scanning {target}:{port} for {self.protocol} services...")
+            yield target, self._identify(target, port, timeout)
+
+    def _identify(self, target: str, port: int, timeout: float) -> Union[Dict[str, Any], ProtocolTimeoutError, None]:
+        """
+        identify() with its failures mapped once for every scanner: a
+        ProtocolTimeoutError when nothing answered in time (including a
+        plain socket.timeout), None when the probe failed otherwise.
+        """
+        _probe.rtt = None
+        try:
+            return self.identify(target, port, timeout)
+        except ProtocolTimeoutError as e:
+            return e
+        except socket.timeout:
+            return ProtocolTimeoutError(f"No answer from {target}:{port} within {timeout:.2f}s")
+        except Exception as e:
+            logger.debug(f"{self.protocol} identification failed for {target}: {e}")
+            return None
+
+    def connect(self, target: str, port: int, timeout: float) -> socket.socket:
+        """
+        Open the TCP connection of a probe within `timeout`. Its handshake
+        time becomes the result's "rtt": unlike the whole exchange, it
+        measures the network rather than how long the device's stack takes
+        to answer. The returned socket waits read_timeout() for replies.
+        """
+        started = time.monotonic()
+        sock = socket.create_connection((target, port), timeout=timeout)
+        _probe.rtt = time.monotonic() - started
+        sock.settimeout(self.read_timeout(timeout))
+        return sock
+
+    @staticmethod
+    def read_timeout(timeout: float) -> float:
+        """
+        Wait for an application reply: `timeout` (learnt from connect times)
+        but never less than IronConfig.READ_TIMEOUT, since a device or the
+        serial link behind a gateway answers slower than the network.
+        """
+        return max(timeout, config.READ_TIMEOUT)
+
     @abstractmethod
-    def identify(self, target: str, port: int) -> Optional[Dict[str, Any]]:
+    def identify(self, target: str, port: int, timeout: float) -> Optional[Dict[str, Any]]:
         """
-        Attempt to identify the device behind the target/port using the protocol.
+        Attempt to identify the device behind the target/port using the
+        protocol, connecting within `timeout` seconds (see connect) and
+        waiting read_timeout(timeout) for each reply. A reply that never
+        comes after a partial identification can be raised as a
+        ProtocolTimeoutError carrying those details, so the result stays
+        online while the retry pass tries again.
+        Socket timeouts (or a ProtocolTimeoutError) mark a probe nothing
+        answered in time; any other exception counts as no answer. Both
+        are handled by the caller, so scanners can let them propagate.
         """
         pass
@@ -1,66 +1,167 @@
 import socket
-from typing import Any, Dict, Optional
+import time
+from typing import Any, Dict, Iterable, Iterator, Optional, Tuple, Union
 from ironflow.plugins.base import ProtocolPlugin
 from ironflow.core.logger import logger
+from ironflow.core.error_handler import ProtocolTimeoutError
+
+# BVLC: Type=0x81 (BACnet/IP), Function=0x0a (Original-Broadcast-NPDU), Length=12
+# NPDU: Version=1, Control=0x20 (Expect response)
+# APDU: Type=0x10 (UnconfirmedRequest), Service=0x08 (Who-Is)
+WHO_IS = (
+    b"\x81\x0a\x00\x0c"  # BVLC
+    b"\x01\x20\xff\xff\x00\xff" # NPDU
+    b"\x10\x08"          # APDU (Who-Is)
+)
+
+SEGMENTATION = {0: "both", 1: "transmit", 2: "receive", 3: "none"}
+
+def parse_i_am(data: bytes) -> Optional[Dict[str, Any]]:
+    """
+    Decode the identity carried by a BACnet/IP I-Am (device instance, max
+    APDU length, segmentation, vendor ID); None for any other datagram.
+    """
+    try:
+        if data[0] != 0x81 or data[4] != 0x01:
+            return None
+        control = data[5]
+        if control & 0x80:
+            # Network layer message, not an APDU
+            return None
+        offset = 6
+        if control & 0x20:
+            # DNET (2), DLEN (1), DADR
+            offset += 3 + data[offset + 2]
+        if control & 0x08:
+            # SNET (2), SLEN (1), SADR
+            offset += 3 + data[offset + 2]
+        if control & 0x20:
+            # Hop count
+            offset += 1
+        apdu = data[offset:]
+        # Unconfirmed request, service I-Am (0x00)
+        if apdu[0] != 0x10 or apdu[1] != 0x00:
+            return None
+
+        # Four application-tagged values: object id, max APDU, segmentation, vendor
+        values, i = [], 2
+        while len(values) < 4:
+            tag = apdu[i]
+            length = tag & 0x07
+            i += 1
+            if length == 5:
+                length = apdu[i]
+                i += 1
+            value = apdu[i:i + length]
+            if len(value) != length:
+                return None
+            values.append((tag >> 4, int.from_bytes(value, "big")))
+            i += length
+    except IndexError:
+        return None
+
+    (object_tag, object_id), (_, max_apdu), (_, segmentation), (_, vendor_id) = values
+    if object_tag != 12:
+        return None
+    return {
+        "device_instance": object_id & 0x3FFFFF,
+        "max_apdu": max_apdu,
+        "segmentation": SEGMENTATION.get(segmentation, segmentation),
+        "vendor_id": vendor_id,
+    }
 
 class BACnetScanner(ProtocolPlugin):
     """
     Plugin for BACnet/IP device discovery and identification.
-    Uses BACnet "Who-Is" NPDU over UDP 47808 (BAC0).
+    Uses BACnet "Who-Is" NPDU over UDP 47808 (BAC0). Blocks of hosts are
+    asked from a single socket and share one reply window.
     """
 
+    protocol = "BACnet/IP"
+    default_port = 47808
+    transport = "udp"
+    probe_payload = WHO_IS
+    broadcast_payload = WHO_IS
+    # I-Am answers to a broadcast Who-Is are usually broadcast on UDP 47808
+    broadcast_replies_to_port = True
+    batch_size = 64
+
     def __init__(self):
         super().__init__(
             name="BACnet",
             description="BACnet/IP Protocol Scanner and Identifier"
         )
 
-    def run(self, target: str, **kwargs) -> Dict[str, Any]:
-        port = kwargs.get("port", 47808)
-        logger.info(f"Scanning {target}:{port} for BACnet services...")
-        
-        result = {
-            "target": target,
-            "port": port,
-            "protocol": "BACnet/IP",
-            "online": False,
-            "details": {}
-        }
-        
-        id_info = self.identify(target, port)
-        if id_info:
-            result["online"] = True
-            result["details"] = id_info
-            
-        return result
-
-    def identify(self, target: str, port: int) -> Optional[Dict[str, Any]]:
+    def identify(self, target: str, port: int, timeout: float) -> Optional[Dict[str, Any]]:
         """
         Attempt to identify device via BACnet Who-Is request.
         """
-        # BVLC: Type=0x81 (BACnet/IP), Function=0x0a (Original-Broadcast-NPDU), Length=12
-        # NPDU: Version=1, Control=0x20 (Expect response)
-        # APDU: Type=0x10 (UnconfirmedRequest), Service=0x08 (Who-Is)
-        who_is_payload = (
-            b"\x81\x0a\x00\x0c"  # BVLC
-            b"\x01\x20\xff\xff\x00\xff" # NPDU
-            b"\x10\x08"          # APDU (Who-Is)
-        )
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+            # No connect to time: the whole wait is for the device's reply
+            sock.settimeout(self.read_timeout(timeout))
+            sock.sendto(WHO_IS, (target, port))
+            response, _ = sock.recvfrom(1024)
+            return self._identity(response)
 
-        try:
-            with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
-                sock.settimeout(3)
-                sock.sendto(who_is_payload, (target, port))
-                response, _ = sock.recvfrom(1024)
-                
-                if response and len(response) >= 4 and response[0] == 0x81:
-                    return {
-                        "status": "connected",
-                        "transport": "UDP",
-                        "fingerprint": "BACnet compatible",
-                        "response_len": len(response)
-                    }
-        except Exception as e:
-            logger.debug(f"BACnet identification failed for {target}: {e}")
-            
+    @staticmethod
+    def _identity(response: bytes) -> Optional[Dict[str, Any]]:
+        if response and len(response) >= 4 and response[0] == 0x81:
+            info = {
+                "status": "connected",
+                "transport": "UDP",
+                "fingerprint": "BACnet compatible",
+                "response_len": len(response)
+            }
+            info.update(parse_i_am(response) or {})
+            return info
         return None
+
+    def identify_many(self, targets: Iterable[str], port: int,
+                      timeout: float) -> Iterator[Tuple[str, Union[Dict[str, Any], ProtocolTimeoutError, None]]]:
+        """
+        Send Who-Is to every target from one socket, then wait a single
+        read_timeout(timeout) for their replies, matched to targets by
+        source address. Targets still silent at the end yield a
+        ProtocolTimeoutError.
+        """
+        timeout = self.read_timeout(timeout)
+        # Resolved address -> target as given
+        pending: Dict[str, str] = {}
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+            for target in targets:
+                logger.info(f"Scanning {target}:{port} for {self.protocol} services...")
+                try:
+                    address = socket.gethostbyname(target)
+                    sock.sendto(WHO_IS, (address, port))
+                except OSError as e:
+                    logger.debug(f"BACnet identification failed for {target}: {e}")
+                    yield target, None
+                    continue
+                pending[address] = target
+
+            deadline = time.monotonic() + timeout
+            while pending:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                sock.settimeout(remaining)
+                try:
+                    response, (responder, _) = sock.recvfrom(1024)
+                except socket.timeout:
+                    break
+                except OSError as e:
+                    logger.debug(f"BACnet receive error: {e}")
+                    continue
+                info = self._identity(response) if responder in pending else None
+                if info is not None:
+                    yield pending.pop(responder), info
+
+        for target in pending.values():
+            yield target, ProtocolTimeoutError(f"No answer from {target}:{port} within {timeout:.2f}s")
+
+    def parse_broadcast_reply(self, data: bytes) -> Optional[Dict[str, Any]]:
+        identity = parse_i_am(data)
+        if identity is None:
+            # Our own Who-Is looped back, or another device's request
+            return None
+        return dict({"status": "connected", "transport": "UDP", "fingerprint": "BACnet device"}, **identity)
@@ -1,7 +1,5 @@
-import socket
 from typing import Any, Dict, Optional
 from ironflow.plugins.base import ProtocolPlugin
-from ironflow.core.logger import logger
 
 class DNP3Scanner(ProtocolPlugin):
     """
@@ -9,32 +7,17 @@ class DNP3Scanner(ProtocolPlugin):
     Uses basic DNP3 link-layer confirmed user data request logic (benign).
     """
 
+    protocol = "DNP3"
+    default_port = 20000
+    passive_ports = (("tcp", 20000), ("udp", 20000))
+
     def __init__(self):
         super().__init__(
             name="DNP3",
             description="DNP3 Protocol Scanner and Identifier"
         )
 
-    def run(self, target: str, **kwargs) -> Dict[str, Any]:
-        port = kwargs.get("port", 20000)
-        logger.info(f"Scanning {target}:{port} for DNP3 services...")
-        
-        result = {
-            "target": target,
-            "port": port,
-            "protocol": "DNP3",
-            "online": False,
-            "details": {}
-        }
-        
-        id_info = self.identify(target, port)
-        if id_info:
-            result["online"] = True
-            result["details"] = id_info
-            
-        return result
-
-    def identify(self, target: str, port: int) -> Optional[Dict[str, Any]]:
+    def identify(self, target: str, port: int, timeout: float) -> Optional[Dict[str, Any]]:
         """
         Attempt to identify device via DNP3 link layer handshake.
         """
@@ -48,18 +31,15 @@ class DNP3Scanner(ProtocolPlugin):
             b"\x00\x00"  # CRC (simplified/invalid but often triggers response)
         )
 
-        try:
-            with socket.create_connection((target, port), timeout=3) as sock:
-                sock.sendall(dnp3_probe)
-                response = sock.recv(1024)
-                
-                if response and len(response) >= 2 and response[0:2] == b"\x05\x64":
-                    return {
-                        "status": "connected",
-                        "transport": "TCP",
-                        "fingerprint": "DNP3 compatible"
-                    }
-        except Exception as e:
-            logger.debug(f"DNP3 identification failed for {target}: {e}")
+        with self.connect(target, port, timeout) as sock:
+            sock.sendall(dnp3_probe)
+            response = sock.recv(1024)
+
+            if response and len(response) >= 2 and response[0:2] == b"\x05\x64":
+                return {
+                    "status": "connected",
+                    "transport": "TCP",
+                    "fingerprint": "DNP3 compatible"
+                }
             
         return None
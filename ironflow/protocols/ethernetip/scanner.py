@@ -1,7 +1,45 @@
-import socket
+import struct
 from typing import Any, Dict, Optional
 from ironflow.plugins.base import ProtocolPlugin
-from ironflow.core.logger import logger
+
+# Encapsulation Header: Command=0x0063 (ListIdentity), Length=0, Session=0, Status=0, SenderContext=0, Options=0
+LIST_IDENTITY = b"\x63\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00"
+# CPF item type of the CIP Identity item in a ListIdentity reply
+CIP_IDENTITY_ITEM = 0x0C
+
+def parse_list_identity(data: bytes) -> Optional[Dict[str, Any]]:
+    """
+    Decode the CIP Identity item of a ListIdentity reply (vendor, device
+    type, product code, revision, serial number, product name); None when
+    the datagram is not one.
+    """
+    try:
+        if data[0:2] != b"\x63\x00" or len(data) < 26:
+            return None
+        (count,) = struct.unpack_from("<H", data, 24)
+        offset = 26
+        for _ in range(count):
+            item_type, item_length = struct.unpack_from("<HH", data, offset)
+            offset += 4
+            item = data[offset:offset + item_length]
+            offset += item_length
+            if item_type != CIP_IDENTITY_ITEM:
+                continue
+            # Encapsulation version (2) and socket address (16) come first
+            vendor, device_type, product_code, major, minor, _, serial, name_length = \
+                struct.unpack_from("<HHHBBHIB", item, 18)
+            name = item[33:33 + name_length].decode("ascii", errors="replace")
+            return {
+                "vendor_id": vendor,
+                "device_type": device_type,
+                "product_code": product_code,
+                "revision": f"{major}.{minor}",
+                "serial": f"{serial:08x}",
+                "product_name": name,
+            }
+    except struct.error:
+        return None
+    return None
 
 class EthernetIPScanner(ProtocolPlugin):
     """
@@ -9,51 +47,40 @@ class EthernetIPScanner(ProtocolPlugin):
     Uses "List Identity" request over TCP 44818.
     """
 
+    protocol = "EtherNet/IP"
+    default_port = 44818
+    passive_ports = (("tcp", 44818), ("udp", 44818), ("udp", 2222))
+    # ListIdentity is also answered over UDP 44818, including to broadcasts
+    broadcast_payload = LIST_IDENTITY
+
     def __init__(self):
         super().__init__(
             name="EthernetIP",
             description="EtherNet/IP & CIP Protocol Scanner and Identifier"
         )
 
-    def run(self, target: str, **kwargs) -> Dict[str, Any]:
-        port = kwargs.get("port", 44818)
-        logger.info(f"Scanning {target}:{port} for EtherNet/IP services...")
-        
-        result = {
-            "target": target,
-            "port": port,
-            "protocol": "EtherNet/IP",
-            "online": False,
-            "details": {}
-        }
-        
-        id_info = self.identify(target, port)
-        if id_info:
-            result["online"] = True
-            result["details"] = id_info
-            
-        return result
-
-    def identify(self, target: str, port: int) -> Optional[Dict[str, Any]]:
+    def identify(self, target: str, port: int, timeout: float) -> Optional[Dict[str, Any]]:
         """
         Attempt to identify device via EtherNet/IP List Identity request.
         """
-        # Encapsulation Header: Command=0x0063 (ListIdentity), Length=0, Session=0, Status=0, SenderContext=0, Options=0
-        list_identity_cmd = b"\x63\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00"
-
-        try:
-            with socket.create_connection((target, port), timeout=3) as sock:
-                sock.sendall(list_identity_cmd)
-                response = sock.recv(1024)
-                
-                if response and len(response) >= 2 and response[0:2] == b"\x63\x00":
-                    return {
-                        "status": "connected",
-                        "transport": "TCP",
-                        "fingerprint": "EtherNet/IP compatible",
-                        "response_header": response[:24].hex()
-                    }
-        except Exception as e:
-            logger.debug(f"EtherNet/IP identification failed for {target}: {e}")
+        with self.connect(target, port, timeout) as sock:
+            sock.sendall(LIST_IDENTITY)
+            response = sock.recv(1024)
+
+            if response and len(response) >= 2 and response[0:2] == b"\x63\x00":
+                info = {
+                    "status": "connected",
+                    "transport": "TCP",
+                    "fingerprint": "EtherNet/IP compatible",
+                    "response_header": response[:24].hex()
+                }
+                info.update(parse_list_identity(response) or {})
+                return info
             
         return None
+
+    def parse_broadcast_reply(self, data: bytes) -> Optional[Dict[str, Any]]:
+        identity = parse_list_identity(data)
+        if identity is None:
+            return None
+        return dict({"status": "connected", "transport": "UDP", "fingerprint": "EtherNet/IP device"}, **identity)
@@ -1,75 +1,189 @@
-from typing import Any, Dict, Optional
-from ironflow.plugins.base import ProtocolPlugin
+import socket
+import struct
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from ironflow.core.config import config
+from ironflow.core.error_handler import ProtocolTimeoutError
 from ironflow.core.logger import logger
-from ironflow.core.error_handler import ProtocolError
+from ironflow.plugins.base import ProtocolPlugin
+
+# Encapsulated Interface Transport (FC 43), MEI type 14: Read Device Identification
+MEI_FUNCTION = 0x2B
+MEI_READ_DEVICE_ID = 0x0E
+# Read Device ID code 1: basic identification stream (objects 0x00-0x02)
+READ_DEVICE_ID_BASIC = 0x01
+# Standard object IDs of the basic and regular identification categories
+DEVICE_ID_OBJECTS = {
+    0x00: "vendor",
+    0x01: "product_code",
+    0x02: "revision",
+    0x03: "vendor_url",
+    0x04: "product_name",
+    0x05: "model_name",
+    0x06: "application_name",
+}
+# Follow-up requests per unit when a device splits its objects ("more follows")
+MAX_FOLLOW_UPS = 4
 
-try:
-    from pymodbus.client import ModbusTcpClient
-except ImportError:
-    ModbusTcpClient = None
+def build_read_device_id(transaction_id: int, unit_id: int, object_id: int = 0) -> bytes:
+    """MBAP header plus a Read Device Identification request PDU."""
+    pdu = bytes((MEI_FUNCTION, MEI_READ_DEVICE_ID, READ_DEVICE_ID_BASIC, object_id))
+    return struct.pack(">HHHB", transaction_id, 0, len(pdu) + 1, unit_id) + pdu
+
+def parse_device_id(pdu: bytes) -> Optional[Tuple[Dict[str, str], Optional[int]]]:
+    """
+    Decode a Read Device Identification response PDU into (objects, next
+    object ID when more follow, else None); None if it is not one.
+    """
+    if len(pdu) < 7 or pdu[0] != MEI_FUNCTION or pdu[1] != MEI_READ_DEVICE_ID:
+        return None
+    more_follows, next_object, count = pdu[4], pdu[5], pdu[6]
+    objects, offset = {}, 7
+    for _ in range(count):
+        if offset + 2 > len(pdu):
+            break
+        object_id, length = pdu[offset], pdu[offset + 1]
+        value = pdu[offset + 2:offset + 2 + length]
+        offset += 2 + length
+        name = DEVICE_ID_OBJECTS.get(object_id, f"object_{object_id:#04x}")
+        objects[name] = value.decode("ascii", errors="replace").strip()
+    return objects, (next_object if more_follows == 0xFF else None)
 
 class ModbusScanner(ProtocolPlugin):
     """
     Plugin for Modbus TCP device discovery and identification.
+    Speaks Modbus/TCP directly: one connection per host, with Read Device
+    Identification requests for every candidate unit ID pipelined on it.
     """
 
+    protocol = "Modbus TCP"
+    default_port = 502
+    # Unit IDs asked in one round: 255 and 0 address a TCP device itself,
+    # 1 is the usual first slave behind a gateway
+    unit_ids: Tuple[int, ...] = (255, 0, 1)
+
     def __init__(self):
         super().__init__(
             name="Modbus",
             description="Modbus TCP Protocol Scanner and Identifier"
         )
 
-    def run(self, target: str, **kwargs) -> Dict[str, Any]:
-        port = kwargs.get("port", 502)
-        logger.info(f"Scanning {target}:{port} for Modbus services...")
-        
-        result = {
-            "target": target,
-            "port": port,
-            "protocol": "Modbus TCP",
-            "online": False,
-            "details": {}
-        }
-        
-        id_info = self.identify(target, port)
-        if id_info:
-            result["online"] = True
-            result["details"] = id_info
-            
-        return result
+    @staticmethod
+    def _read_frames(sock: socket.socket, buffer: bytearray) -> List[Tuple[int, int, bytes]]:
+        """Receive once and split complete (transaction, unit, PDU) frames off the buffer."""
+        data = sock.recv(4096)
+        if not data:
+            raise ConnectionResetError("connection closed by peer")
+        buffer.extend(data)
+        frames = []
+        while len(buffer) >= 7:
+            transaction_id, protocol_id, length, unit_id = struct.unpack_from(">HHHB", buffer)
+            if protocol_id != 0 or length < 2:
+                raise ValueError("not a Modbus/TCP frame")
+            if len(buffer) < 6 + length:
+                break
+            frames.append((transaction_id, unit_id, bytes(buffer[7:6 + length])))
+            del buffer[:6 + length]
+        return frames
 
-    def identify(self, target: str, port: int) -> Optional[Dict[str, Any]]:
+    def _exchange(self, sock: socket.socket, requests: Dict[int, Tuple[int, int]]) -> Dict[int, bytes]:
+        """
+        Send every request in one write and collect the answers by
+        transaction ID until all arrived or the socket times out. Units a
+        device does not serve usually stay silent rather than answer with
+        an exception, so once the first answer is in, the wait for the rest
+        shrinks to an idle gap: IronConfig.MODBUS_UNIT_GAP, or twice the
+        first answer's delay when the device is slower (units behind one
+        gateway answer at its pace), never beyond the socket's timeout.
+        """
+        sock.sendall(b"".join(build_read_device_id(tid, unit, obj) for tid, (unit, obj) in requests.items()))
+        answers: Dict[int, bytes] = {}
+        buffer = bytearray()
+        timeout = sock.gettimeout()
+        started = time.monotonic()
+        gap: Optional[float] = None
+        try:
+            while len(answers) < len(requests):
+                try:
+                    frames = self._read_frames(sock, buffer)
+                except socket.timeout:
+                    if gap is not None:
+                        logger.debug(f"Modbus: {len(requests) - len(answers)} request(s) unanswered "
+                                     f"{gap:.2f}s after the last reply")
+                    break
+                except ConnectionError:
+                    # Keep what arrived before the peer hung up
+                    if not answers:
+                        raise
+                    break
+                for transaction_id, _, pdu in frames:
+                    if transaction_id in requests:
+                        answers[transaction_id] = pdu
+                if answers and gap is None and timeout is not None:
+                    gap = min(timeout, max(config.MODBUS_UNIT_GAP, 2 * (time.monotonic() - started)))
+                    sock.settimeout(gap)
+        finally:
+            sock.settimeout(timeout)
+        return answers
+
+    def identify_units(self, sock: socket.socket, unit_ids: Iterable[int]) -> Dict[int, Any]:
+        """
+        Pipelined Read Device Identification over an open connection.
+        Returns unit ID -> identification objects, or the Modbus exception
+        code for units that answered with an exception.
+        """
+        units: Dict[int, Any] = {}
+        pending = {tid: (unit, 0) for tid, unit in enumerate(unit_ids, 1)}
+        next_tid = len(pending) + 1
+        for _ in range(MAX_FOLLOW_UPS + 1):
+            if not pending:
+                break
+            answers = self._exchange(sock, pending)
+            follow_ups = {}
+            for tid, pdu in answers.items():
+                unit = pending[tid][0]
+                if pdu and pdu[0] == MEI_FUNCTION | 0x80:
+                    # Exception response: a Modbus device without (this) MEI support
+                    units.setdefault(unit, pdu[1] if len(pdu) > 1 else None)
+                    continue
+                parsed = parse_device_id(pdu)
+                if parsed is None:
+                    continue
+                objects, next_object = parsed
+                known = units.get(unit)
+                units[unit] = dict(known, **objects) if isinstance(known, dict) else objects
+                if next_object is not None:
+                    follow_ups[next_tid] = (unit, next_object)
+                    next_tid += 1
+            pending = follow_ups
+        return units
+
+    def identify(self, target: str, port: int, timeout: float) -> Optional[Dict[str, Any]]:
         """
         Attempt to identify device via Modbus Device Identification (MEI) - Function Code 43/14.
         """
-        if not ModbusTcpClient:
-            logger.error("pymodbus not installed. Skipping Modbus active identification.")
-            return None
+        with self.connect(target, port, timeout) as sock:
+            units = self.identify_units(sock, self.unit_ids)
 
-        client = ModbusTcpClient(target, port=port, timeout=3)
-        try:
-            if not client.connect():
-                logger.debug(f"Could not connect to {target}:{port}")
-                return None
+        info: Dict[str, Any] = {
+            "status": "connected",
+            "transport": "TCP",
+            "fingerprint": "Modbus TCP",
+        }
+        if not units:
+            # The port accepted the connection but no unit answered in time,
+            # which a slow gateway does as often as a non-Modbus service
+            info["fingerprint"] = "Modbus TCP port open (no response)"
+            raise ProtocolTimeoutError(f"No Modbus answer from {target}:{port}", details=info)
 
-            # Attempt to read Device Identification (FC 43, MEI 14)
-            # Note: Many PLCs don't support MEI, so using simple connection detection for MVP.
-            
-            vendor = "Unknown"
-            model = "Unknown"
-            
-            # Simulated pattern identification for MVP
-            # In a real environment, we'd parse the actual MEI response bytes.
-            
-            return {
-                "status": "connected",
-                "transport": "TCP",
-                "vendor_hint": "Schneider/Unity", # Example hint
-                "likely_type": "PLC"
-            }
-            
-        except Exception as e:
-            logger.debug(f"Modbus identification failed for {target}: {e}")
-            return None
-        finally:
-            client.close()
+        identified = {unit: objects for unit, objects in units.items() if isinstance(objects, dict) and objects}
+        info["units"] = sorted(units)
+        if identified:
+            unit = next(unit for unit in self.unit_ids + tuple(identified) if unit in identified)
+            objects = identified[unit]
+            info["unit_id"] = unit
+            info.update(objects)
+        else:
+            info["fingerprint"] = "Modbus TCP (device identification not supported)"
+            info["exception_code"] = next(iter(units.values()))
+        return info
@@ -1,78 +1,254 @@
 import socket
-from typing import Any, Dict, Optional
+import struct
+from typing import Any, Dict, List, Optional, Tuple
 from ironflow.plugins.base import ProtocolPlugin
 from ironflow.core.logger import logger
+from ironflow.core.error_handler import ProtocolTimeoutError
+
+# COTP PDU types
+COTP_CONNECT_CONFIRM = 0xD0
+COTP_DATA = 0xF0
+# S7 PDU types (ROSCTR)
+S7_JOB = 0x01
+S7_ACK_DATA = 0x03
+S7_USERDATA = 0x07
+# Source TSAP of a PG connection
+LOCAL_TSAP = 0x0100
+# (rack, slot) tried in order: S7-300 CPUs sit in slot 2, S7-1200/1500 answer on 0/1,
+# S7-400 CPUs are commonly in slot 3
+RACK_SLOTS: Tuple[Tuple[int, int], ...] = ((0, 2), (0, 1), (0, 0), (0, 3))
+# SZL lists read after setup: module identification and component identification
+SZL_MODULE_ID = 0x0011
+SZL_COMPONENT_ID = 0x001C
+# SZL 0x001C record index -> detail name
+COMPONENT_FIELDS = {
+    0x0001: "plc_name",
+    0x0002: "module_name",
+    0x0003: "plant_id",
+    0x0004: "copyright",
+    0x0005: "serial_number",
+    0x0007: "module_type",
+    0x0008: "memory_card_serial",
+    0x000B: "location",
+}
+# Order number prefixes (MLFB) of the CPU families
+MODEL_PREFIXES = (
+    ("6ES7 21", "S7-1200"),
+    ("6ES7 51", "S7-1500"),
+    ("6ES7 31", "S7-300"),
+    ("6ES7 41", "S7-400"),
+)
+
+def tpkt(payload: bytes) -> bytes:
+    """Wrap a COTP packet in a TPKT header (RFC 1006)."""
+    return struct.pack(">BBH", 3, 0, len(payload) + 4) + payload
+
+def cotp_connect_request(rack: int, slot: int) -> bytes:
+    remote_tsap = 0x0100 | (rack * 0x20 + slot)
+    return tpkt(
+        b"\x11\xe0\x00\x00\x00\x01\x00"
+        + b"\xc1\x02" + struct.pack(">H", LOCAL_TSAP)
+        + b"\xc2\x02" + struct.pack(">H", remote_tsap)
+        + b"\xc0\x01\x0a"  # TPDU size 1024
+    )
+
+def s7_packet(rosctr: int, reference: int, parameters: bytes, data: bytes = b"") -> bytes:
+    """S7 header plus parameters/data inside a COTP data TPDU."""
+    header = struct.pack(">BBHHHH", 0x32, rosctr, 0, reference, len(parameters), len(data))
+    return tpkt(b"\x02\xf0\x80" + header + parameters + data)
+
+def setup_communication(reference: int) -> bytes:
+    # Function 0xF0, max AMQ calling/called 1, PDU size 960
+    return s7_packet(S7_JOB, reference, b"\xf0\x00\x00\x01\x00\x01\x03\xc0")
+
+def read_szl(reference: int, szl_id: int, index: int = 0) -> bytes:
+    # Userdata request: CPU functions (0x4), subfunction Read SZL (0x01)
+    parameters = b"\x00\x01\x12\x04\x11\x44\x01\x00"
+    data = b"\xff\x09" + struct.pack(">HHH", 4, szl_id, index)
+    return s7_packet(S7_USERDATA, reference, parameters, data)
+
+def parse_s7(packet: bytes) -> Optional[Tuple[int, bytes, bytes]]:
+    """
+    Split a TPKT/COTP data packet into (ROSCTR, parameters, data); None if
+    it does not carry an S7 PDU.
+    """
+    if len(packet) < 7 or packet[5] != COTP_DATA:
+        return None
+    s7 = packet[4 + 1 + packet[4]:]
+    if len(s7) < 10 or s7[0] != 0x32:
+        return None
+    rosctr = s7[1]
+    parameter_length, data_length = struct.unpack_from(">HH", s7, 6)
+    # Ack-data headers carry two more bytes (error class and code)
+    offset = 12 if rosctr in (0x02, S7_ACK_DATA) else 10
+    parameters = s7[offset:offset + parameter_length]
+    return rosctr, parameters, s7[offset + parameter_length:offset + parameter_length + data_length]
+
+def szl_records(data: bytes) -> List[bytes]:
+    """Records of an SZL read response's data part (empty on an error return code)."""
+    if len(data) < 12 or data[0] != 0xFF:
+        return []
+    record_length, count = struct.unpack_from(">HH", data, 8)
+    return [data[12 + i * record_length:12 + (i + 1) * record_length] for i in range(count)
+            if 12 + (i + 1) * record_length <= len(data)]
+
+def _text(raw: bytes) -> str:
+    return raw.split(b"\x00", 1)[0].decode("ascii", errors="replace").strip()
+
+def parse_module_id(records: List[bytes]) -> Dict[str, str]:
+    """SZL 0x0011 records: order number and hardware/firmware versions."""
+    info = {}
+    for record in records:
+        if len(record) < 28:
+            continue
+        (index,) = struct.unpack_from(">H", record)
+        version = f"V{record[25]}.{record[26]}.{record[27]}"
+        if index == 0x0001:
+            info["order_number"] = _text(record[2:22])
+        elif index == 0x0006:
+            info["hardware_version"] = version
+        elif index == 0x0007:
+            info["firmware"] = version
+    return info
+
+def parse_component_id(records: List[bytes]) -> Dict[str, str]:
+    """SZL 0x001C records: names, serial numbers and location strings."""
+    info = {}
+    for record in records:
+        if len(record) < 4:
+            continue
+        (index,) = struct.unpack_from(">H", record)
+        name = COMPONENT_FIELDS.get(index)
+        value = _text(record[2:34])
+        if name and value:
+            info[name] = value
+    return info
+
+def recv_tpkt(sock: socket.socket) -> bytes:
+    """Read exactly one TPKT-framed packet."""
+    header = _recv_exact(sock, 4)
+    if header[0] != 3:
+        raise ValueError("not a TPKT packet")
+    (length,) = struct.unpack_from(">H", header, 2)
+    return header + _recv_exact(sock, length - 4)
+
+def _recv_exact(sock: socket.socket, size: int) -> bytes:
+    data = b""
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            raise ConnectionResetError("connection closed by peer")
+        data += chunk
+    return data
 
 class S7Scanner(ProtocolPlugin):
     """
     Plugin for Siemens S7Comm device discovery and identification.
-    Uses benign S7 Setup Communication requests.
+    Uses benign S7 Setup Communication and SZL read requests, all on one
+    ISO-on-TCP connection.
     """
 
+    protocol = "S7Comm"
+    default_port = 102
+
     def __init__(self):
         super().__init__(
             name="S7",
             description="S7Comm Protocol Scanner and Identifier"
         )
 
-    def run(self, target: str, **kwargs) -> Dict[str, Any]:
-        port = kwargs.get("port", 102)
-        logger.info(f"Scanning {target}:{port} for S7 services...")
-        
-        result = {
-            "target": target,
-            "port": port,
-            "protocol": "S7Comm",
-            "online": False,
-            "details": {}
-        }
-        
-        id_info = self.identify(target, port)
-        if id_info:
-            result["online"] = True
-            result["details"] = id_info
-            
-        return result
-
-    def identify(self, target: str, port: int) -> Optional[Dict[str, Any]]:
+    @staticmethod
+    def _connect_cotp(sock: socket.socket, candidates: List[Tuple[int, int]]) -> Optional[Tuple[int, int]]:
         """
-        Attempt to identify device via S7 Setup Communication (COTP Connection Request).
-        This is a safe operation used for initial handshake.
+        Send COTP connection requests for the rack/slot candidates, consuming
+        them in order, over the same TCP connection until one is confirmed.
+        Returns the (rack, slot) accepted, or None once the peer rejected
+        every candidate. Raises ConnectionError when the peer hangs up.
         """
-        # COTP Connection Request for S7
-        # TPKT (4 bytes) + COTP (18 bytes)
-        # Simplified handshake probe
-        cotp_cr = (
-            b"\x03\x00\x00\x16"  # TPKT: Version 3, Reserved 0, Length 22
-            b"\x11\xe0\x00\x00\x00\x01\x00\xc1\x02\x01\x00\xc2\x02\x01\x02\xc0\x01\x0a" # COTP CR
-        )
+        while candidates:
+            rack, slot = candidates[0]
+            sock.sendall(cotp_connect_request(rack, slot))
+            response = recv_tpkt(sock)
+            candidates.pop(0)
+            if len(response) > 5 and response[5] & 0xF0 == COTP_CONNECT_CONFIRM:
+                return rack, slot
+            logger.debug(f"S7 rack {rack} slot {slot} rejected (COTP {response[5:6].hex()})")
+        return None
 
-        try:
-            with socket.create_connection((target, port), timeout=3) as sock:
-                sock.sendall(cotp_cr)
-                response = sock.recv(1024)
-                
-                if response and len(response) >= 4 and response[0] == 0x03:
-                    # Successful COTP connection response usually starts with TPKT header
-                    # Byte 5 of response often indicates the PDU type. 0xd0 = CC (Connect Confirm)
-                    
-                    fingerprint = "S7 compatible"
-                    model_hint = "S7-300/400"
-                    
-                    if len(response) > 10:
-                        # Simple heuristic for MVP:
-                        # Modern S7 (1200/1500) often has different handshake lengths or signatures.
-                        fingerprint = "S7-1200/1500 compatible"
-                        model_hint = "S7-1200/1500"
+    def _deep_identify(self, sock: socket.socket) -> Dict[str, Any]:
+        """
+        After a COTP connect: negotiate the S7 PDU, then read SZL 0x0011 and
+        0x001C. Returns whatever could be read; empty if setup failed.
+        """
+        sock.sendall(setup_communication(1))
+        parsed = parse_s7(recv_tpkt(sock))
+        if parsed is None or parsed[0] != S7_ACK_DATA or len(parsed[1]) < 8:
+            return {}
+        info: Dict[str, Any] = {"pdu_size": struct.unpack_from(">H", parsed[1], 6)[0]}
+
+        for reference, szl_id in enumerate((SZL_MODULE_ID, SZL_COMPONENT_ID), 2):
+            sock.sendall(read_szl(reference, szl_id))
+            parsed = parse_s7(recv_tpkt(sock))
+            if parsed is None or parsed[0] != S7_USERDATA:
+                continue
+            records = szl_records(parsed[2])
+            info.update(parse_module_id(records) if szl_id == SZL_MODULE_ID else parse_component_id(records))
+        return info
 
+    def identify(self, target: str, port: int, timeout: float) -> Optional[Dict[str, Any]]:
+        """
+        Identify the device over one connection: COTP connect (trying rack
+        and slot candidates), S7 Setup Communication, then read SZL 0x0011
+        (order number, firmware) and 0x001C (module and PLC names, serial).
+        All of it is read-only and safe for production PLCs.
+        """
+        candidates = list(RACK_SLOTS)
+        while True:
+            with self.connect(target, port, timeout) as sock:
+                remaining = len(candidates)
+                try:
+                    accepted = self._connect_cotp(sock, candidates)
+                except ConnectionError:
+                    # Some CPUs drop the connection after rejecting a TSAP;
+                    # only then is a new one opened for the other candidates
+                    if candidates and len(candidates) < remaining:
+                        continue
+                    raise
+                if accepted is None:
                     return {
                         "status": "connected",
                         "transport": "TCP/ISO-on-TCP",
                         "vendor": "Siemens",
-                        "model_hint": model_hint,
-                        "fingerprint": fingerprint
+                        "fingerprint": "ISO-TSAP service (no rack/slot accepted)",
                     }
-        except Exception as e:
-            logger.debug(f"S7 identification failed for {target}: {e}")
-            
-        return None
+                rack, slot = accepted
+                info = {
+                    "status": "connected",
+                    "transport": "TCP/ISO-on-TCP",
+                    "vendor": "Siemens",
+                    "fingerprint": "S7 compatible",
+                    "rack": rack,
+                    "slot": slot,
+                }
+                stalled = False
+                try:
+                    identity = self._deep_identify(sock)
+                except (OSError, ValueError, struct.error) as e:
+                    # The COTP confirm alone is still an S7 fingerprint
+                    logger.debug(f"S7 deep identification of {target} stopped early: {e}")
+                    identity = {}
+                    stalled = isinstance(e, socket.timeout)
+                break
+
+        info.update(identity)
+        if identity:
+            info["fingerprint"] = "S7comm"
+        order_number = identity.get("order_number", "")
+        for prefix, model in MODEL_PREFIXES:
+            if order_number.startswith(prefix):
+                info["model_hint"] = model
+                break
+        if stalled:
+            # Flagged so the retry pass asks again, with the fingerprint kept
+            raise ProtocolTimeoutError(f"S7 identification of {target}:{port} timed out", details=info)
+        return info
@@ -1,8 +1,15 @@
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Tuple
+import contextlib
 import json
 import os
+import shutil
+import tempfile
+import textwrap
 from datetime import datetime
 from ironflow.core.logger import logger
+from ironflow.core.storage import atomic_write, write_json
+
+HTML_FOOTER = "</body></html>"
 
 class ReportGenerator:
     """
@@ -19,8 +26,7 @@ class ReportGenerator:
             filename = f"report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
         
         filepath = os.path.join(self.output_dir, filename)
-        with open(filepath, "w") as f:
-            json.dump(data, f, indent=4)
+        write_json(filepath, data, indent=4)
         
         logger.info(f"JSON report generated: {filepath}")
         return filepath
@@ -33,9 +39,27 @@ class ReportGenerator:
             filename = f"report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.html"
         
         filepath = os.path.join(self.output_dir, filename)
+        results = data.get('results', [])
+        
+        with atomic_write(filepath) as f:
+            f.write(self._html_header(len(results)))
+            for result in results:
+                f.write(self._html_asset(result))
+            f.write(HTML_FOOTER)
         
+        logger.info(f"HTML report generated: {filepath}")
+        return filepath
+
+    def stream(self, stamp: str = None) -> "ReportStream":
+        """
+        Incremental JSON + HTML report fed one asset at a time.
+        """
+        return ReportStream(self, stamp or datetime.now().strftime('%Y%m%d_%H%M%S'))
+
+    @staticmethod
+    def _html_header(total: int) -> str:
         # Simple HTML template
-        html_content = f"""
+        return f"""
         <html>
         <head>
             <title>IRONFLOW Security Report</title>
@@ -54,25 +78,83 @@ class ReportGenerator:
             <h1>IRONFLOW Security Report</h1>
             <div class="summary">
                 <p>Generated on: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}</p>
-                <p>Total Assets: {len(data.get('results', []))}</p>
+                <p>Total Assets: {total}</p>
             </div>
             <h2>Discovered Assets</h2>
         """
-        
-        for result in data.get('results', []):
-            severity = result.get('risk', {}).get('severity', 'Low')
-            html_content += f"""
+
+    @staticmethod
+    def _html_asset(result: Dict[str, Any]) -> str:
+        severity = result.get('risk', {}).get('severity', 'Low')
+        return f"""
             <div class="asset {severity}">
                 <h3>Target: {result.get('target')}</h3>
-                <p>Protocol: {result.get('protocol')}</p>
+                <p>Protocol: {', '.join(result.get('protocols') or [result.get('protocol') or ''])}</p>
                 <p>Severity: <strong>{severity}</strong> (Score: {result.get('risk', {}).get('score', 0)})</p>
             </div>
             """
-            
-        html_content += "</body></html>"
-        
-        with open(filepath, "w") as f:
-            f.write(html_content)
-        
-        logger.info(f"HTML report generated: {filepath}")
-        return filepath
+
+class ReportStream:
+    """
+    Writes JSON and HTML reports while results arrive, so nothing has to
+    be held in memory until the end of a scan. The JSON array is streamed
+    straight into a temporary file; HTML asset blocks are spooled and
+    placed after the summary (which needs the final count) on close. Both
+    files are renamed into place atomically by close().
+
+    Used as a context manager, leaving the block normally closes the
+    stream and leaving it with an exception aborts it, so no temporary
+    file outlives a failed scan.
+    """
+
+    def __init__(self, generator: ReportGenerator, stamp: str):
+        self.json_path = os.path.join(generator.output_dir, f"report_{stamp}.json")
+        self.html_path = os.path.join(generator.output_dir, f"report_{stamp}.html")
+        self.count = 0
+        self.finished = False
+        with contextlib.ExitStack() as files:
+            self._json_file = files.enter_context(atomic_write(self.json_path))
+            self._html_body = files.enter_context(tempfile.TemporaryFile("w+"))
+            self._json_file.write('{\n    "results": [')
+            # Owns the JSON temporary file and the HTML spool from here on
+            self._files = files.pop_all()
+
+    def __enter__(self) -> "ReportStream":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.abort()
+        elif not self.finished:
+            self.close()
+        return False
+
+    def add(self, result: Dict[str, Any]):
+        prefix = "," if self.count else ""
+        self._json_file.write(prefix + "\n" + textwrap.indent(json.dumps(result, indent=4, default=str), " " * 8))
+        self._html_body.write(ReportGenerator._html_asset(result))
+        self.count += 1
+
+    def close(self) -> Tuple[str, str]:
+        try:
+            self._json_file.write("\n    ]\n}" if self.count else "]\n}")
+            with atomic_write(self.html_path) as f:
+                f.write(ReportGenerator._html_header(self.count))
+                self._html_body.seek(0)
+                shutil.copyfileobj(self._html_body, f)
+                f.write(HTML_FOOTER)
+        except BaseException:
+            self.abort()
+            raise
+        # Renames the JSON report into place and drops the spool
+        self._files.close()
+        self.finished = True
+        logger.info(f"JSON report generated: {self.json_path}")
+        logger.info(f"HTML report generated: {self.html_path}")
+        return self.json_path, self.html_path
+
+    def abort(self):
+        """Drop the partial reports."""
+        # An exception makes atomic_write remove its temporary file
+        self._files.__exit__(RuntimeError, RuntimeError("aborted"), None)
+        self.finished = True
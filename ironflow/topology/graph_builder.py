@@ -1,5 +1,6 @@
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterable, Optional
 from ironflow.core.logger import logger
+from ironflow.core.storage import write_json
 
 class TopologyMapper:
     """
@@ -10,9 +11,11 @@ class TopologyMapper:
         self.nodes = {}
         self.edges = []
 
-    def build_graph(self, scan_results: List[Dict[str, Any]]) -> Dict[str, Any]:
+    def build_graph(self, scan_results: List[Dict[str, Any]], flows: Optional[Iterable[Dict[str, Any]]] = None) -> Dict[str, Any]:
         """
         Convert scan results into a graph structure (nodes and edges).
+        Conversations observed passively (see FlowTable) become the edges;
+        peers that only ever acted as clients are added as "Client" nodes.
         """
         logger.info("Building network topology graph...")
         
@@ -20,32 +23,47 @@ class TopologyMapper:
             target = result.get("target")
             protocol = result.get("protocol")
             
-            if target not in self.nodes:
-                self.nodes[target] = {
-                    "id": target,
-                    "label": target,
-                    "type": "Asset",
-                    "protocols": []
-                }
-            
-            if protocol not in self.nodes[target]["protocols"]:
-                self.nodes[target]["protocols"].append(protocol)
-                
-            # For now, we don't have direct edge info (source -> dest) 
-            # unless we have PCAP analysis. 
-            # This is a simplified asset-centric map.
+            node = self._node(target)
+            node["type"] = "Asset"
+            if protocol not in node["protocols"]:
+                node["protocols"].append(protocol)
+
+        for flow in flows or ():
+            server = self._node(flow["target"])
+            server["type"] = "Asset"
+            if flow["protocol"] not in server["protocols"]:
+                server["protocols"].append(flow["protocol"])
+            self._node(flow["source"], "Client")
+            self.edges.append({
+                "source": flow["source"],
+                "target": flow["target"],
+                "protocol": flow["protocol"],
+                "port": flow["port"],
+                "packets": flow["packets"],
+                "bytes": flow["bytes"],
+                "first_seen": flow["first_seen"],
+                "last_seen": flow["last_seen"],
+            })
             
         return {
             "nodes": list(self.nodes.values()),
             "edges": self.edges
         }
 
+    def _node(self, address: str, node_type: str = "Asset") -> Dict[str, Any]:
+        if address not in self.nodes:
+            self.nodes[address] = {
+                "id": address,
+                "label": address,
+                "type": node_type,
+                "protocols": []
+            }
+        return self.nodes[address]
+
     def export_json(self, graph_data: Dict[str, Any], path: str):
         """Export the graph data to JSON."""
-        import json
         try:
-            with open(path, "w") as f:
-                json.dump(graph_data, f, indent=2)
+            write_json(path, graph_data, indent=2)
             logger.info(f"Topology exported to {path}")
         except Exception as e:
             logger.error(f"Failed to export topology: {e}")
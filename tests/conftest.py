@@ -0,0 +1,38 @@
+import pytest
+
+from ironflow.core.config import config
+
+from tests.responders import TCPResponder, UDPResponder
+
+@pytest.fixture
+def udp_responder():
+    """Factory of loopback UDP responders, closed after the test."""
+    started = []
+
+    def start(*args, **kwargs) -> UDPResponder:
+        responder = UDPResponder(*args, **kwargs)
+        started.append(responder)
+        return responder
+
+    yield start
+    for responder in started:
+        responder.close()
+
+@pytest.fixture
+def tcp_responder():
+    """Factory of loopback TCP responders, closed after the test."""
+    started = []
+
+    def start(handler) -> TCPResponder:
+        responder = TCPResponder(handler)
+        started.append(responder)
+        return responder
+
+    yield start
+    for responder in started:
+        responder.close()
+
+@pytest.fixture
+def fast_reads(monkeypatch):
+    """Short reply waits, so silent test devices time out quickly."""
+    monkeypatch.setattr(config, "READ_TIMEOUT", 0.3)
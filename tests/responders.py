@@ -0,0 +1,216 @@
+import socket
+import struct
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+
+# I-Am of device instance 131073, max APDU 480, no segmentation, vendor 15
+I_AM = b"\x81\x0b\x00\x18\x01\x00\x10\x00\xc4\x02\x02\x00\x01\x22\x01\xe0\x91\x03\x21\x0f"
+
+def list_identity_reply(serial: int = 0xC0FFEE01, name: bytes = b"1756-L71/B LOGIX5571") -> bytes:
+    """ListIdentity reply carrying one CIP Identity item."""
+    item = (struct.pack("<H", 1) + struct.pack(">hHI8x", 2, 44818, 0x7F000001)
+            + struct.pack("<HHHBBHIB", 1, 14, 54, 20, 11, 0x3060, serial, len(name)) + name + b"\x03")
+    body = struct.pack("<H", 1) + struct.pack("<HH", 0x0C, len(item)) + item
+    return struct.pack("<HHII8sI", 0x63, len(body), 0, 0, b"\0" * 8, 0) + body
+
+class UDPResponder:
+    """
+    Loopback UDP device answering every request accepted by `match` with
+    `reply` (sent `repeat` times), from its own thread.
+    """
+
+    def __init__(self, host: str, port: int, reply: bytes, match: Optional[Callable[[bytes], bool]] = None,
+                 repeat: int = 1):
+        self.reply = reply
+        self.match = match or (lambda data: True)
+        self.repeat = repeat
+        self.requests: List[bytes] = []
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind((host, port))
+        self.sock.settimeout(0.05)
+        self.address = self.sock.getsockname()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._serve, daemon=True)
+        self._thread.start()
+
+    def _serve(self):
+        while not self._stop.is_set():
+            try:
+                data, peer = self.sock.recvfrom(4096)
+            except socket.timeout:
+                continue
+            self.requests.append(data)
+            if self.match(data):
+                for _ in range(self.repeat):
+                    self.sock.sendto(self.reply, peer)
+
+    def close(self):
+        self._stop.set()
+        self._thread.join()
+        self.sock.close()
+
+def free_udp_port(host: str = "127.0.0.2") -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        sock.bind((host, 0))
+        return sock.getsockname()[1]
+
+class TCPResponder:
+    """
+    Loopback TCP device: every accepted connection is handed to
+    `handler(conn)` on its own thread and closed when it returns.
+    """
+
+    def __init__(self, handler: Callable[[socket.socket], None], host: str = "127.0.0.1"):
+        self.handler = handler
+        self.connections = 0
+        self.server = socket.create_server((host, 0))
+        self.server.settimeout(0.05)
+        self.port = self.server.getsockname()[1]
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._serve, daemon=True)
+        self._thread.start()
+
+    def _serve(self):
+        while not self._stop.is_set():
+            try:
+                conn, _ = self.server.accept()
+            except socket.timeout:
+                continue
+            self.connections += 1
+            threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+
+    def _handle(self, conn: socket.socket):
+        conn.settimeout(5)
+        with conn:
+            try:
+                self.handler(conn)
+            except OSError:
+                pass
+
+    def close(self):
+        self._stop.set()
+        self._thread.join()
+        self.server.close()
+
+def recv_exact(conn: socket.socket, size: int) -> bytes:
+    data = b""
+    while len(data) < size:
+        chunk = conn.recv(size - len(data))
+        if not chunk:
+            raise ConnectionResetError("closed")
+        data += chunk
+    return data
+
+def device_id_pdu(objects: Dict[int, bytes], next_object: Optional[int] = None) -> bytes:
+    """Read Device ID response PDU; `next_object` sets "more follows"."""
+    more = (0xFF, next_object) if next_object is not None else (0x00, 0x00)
+    pdu = bytes((0x2B, 0x0E, 0x01, 0x01) + more + (len(objects),))
+    return pdu + b"".join(bytes((object_id, len(value))) + value for object_id, value in objects.items())
+
+def modbus_device(units: Dict[int, Dict[int, bytes]], delays: Optional[Dict[int, float]] = None):
+    """
+    Handler of a Modbus/TCP device answering Read Device ID requests from
+    `units` (unit -> requested object ID -> response PDU), each unit after
+    its delay in seconds; units or objects not listed stay silent.
+    """
+    delays = delays or {}
+
+    def handler(conn: socket.socket):
+        lock = threading.Lock()
+        timers = []
+
+        def send(frame: bytes):
+            with lock:
+                try:
+                    conn.sendall(frame)
+                except OSError:
+                    pass
+
+        try:
+            while True:
+                header = recv_exact(conn, 7)
+                transaction_id, _, length, unit = struct.unpack(">HHHB", header)
+                pdu = recv_exact(conn, length - 1)
+                reply = units.get(unit, {}).get(pdu[3] if len(pdu) > 3 else 0)
+                if reply is None:
+                    continue
+                frame = struct.pack(">HHHB", transaction_id, 0, len(reply) + 1, unit) + reply
+                timer = threading.Timer(delays.get(unit, 0), send, (frame,))
+                timers.append(timer)
+                timer.start()
+        except (OSError, ConnectionError):
+            pass
+        finally:
+            for timer in timers:
+                timer.join()
+
+    return handler
+
+def s7_module_record(index: int, text: str, version: Tuple[int, int, int]) -> bytes:
+    """28-byte SZL 0x0011 record: order number text and a version triple."""
+    return struct.pack(">H", index) + text.ljust(20).encode() + b"\x00\x00\x00" + bytes(version)
+
+def s7_component_record(index: int, text: str) -> bytes:
+    """34-byte SZL 0x001C record."""
+    return struct.pack(">H", index) + text.encode().ljust(32, b"\x00")
+
+# SZL contents of an S7-1200 CPU
+S7_MODULE_RECORDS = [
+    s7_module_record(0x0001, "6ES7 214-1AG40-0XB0", (0, 0, 0)),
+    s7_module_record(0x0006, "6ES7 214-1AG40-0XB0", (1, 0, 0)),
+    s7_module_record(0x0007, "", (4, 2, 3)),
+]
+S7_COMPONENT_RECORDS = [
+    s7_component_record(0x0001, "PLC_1"),
+    s7_component_record(0x0002, "CPU 1214C DC/DC/DC"),
+    s7_component_record(0x0005, "S C-X4U421302009"),
+]
+
+def tpkt_frame(payload: bytes) -> bytes:
+    return struct.pack(">BBH", 3, 0, len(payload) + 4) + payload
+
+def s7_ack_data(reference: int, parameters: bytes) -> bytes:
+    header = struct.pack(">BBHHHHBB", 0x32, 0x03, 0, reference, len(parameters), 0, 0, 0)
+    return tpkt_frame(b"\x02\xf0\x80" + header + parameters)
+
+def szl_response(reference: int, szl_id: int, records: List[bytes], return_code: int = 0xFF) -> bytes:
+    """Userdata response of a Read SZL request carrying `records`."""
+    record_length = len(records[0]) if records else 0
+    data = bytes((return_code, 0x09)) + struct.pack(">HHHHH", 8 + len(records) * record_length, szl_id, 0,
+                                                    record_length, len(records)) + b"".join(records)
+    parameters = b"\x00\x01\x12\x08\x12\x84\x01\x01\x00\x00\x00\x00"
+    header = struct.pack(">BBHHHH", 0x32, 0x07, 0, reference, len(parameters), len(data))
+    return tpkt_frame(b"\x02\xf0\x80" + header + parameters + data)
+
+def s7_device(accept: Tuple[int, int] = (0, 1), close_on_reject: bool = False, answer_szl: bool = True):
+    """
+    Handler of an S7 CPU that confirms the COTP connection for the
+    (rack, slot) `accept` only, hanging up after a rejection when
+    `close_on_reject`, then answers Setup Communication and, unless
+    `answer_szl` is False, the SZL 0x0011/0x001C reads.
+    """
+    accepted_tsap = 0x0100 | (accept[0] * 0x20 + accept[1])
+
+    def handler(conn: socket.socket):
+        while True:
+            header = recv_exact(conn, 4)
+            packet = header + recv_exact(conn, struct.unpack_from(">H", header, 2)[0] - 4)
+            if packet[5] == 0xE0:
+                if struct.unpack_from(">H", packet, 17)[0] == accepted_tsap:
+                    conn.sendall(tpkt_frame(b"\x11\xd0\x00\x01\x00\x01\x00\xc0\x01\x0a"))
+                    continue
+                conn.sendall(tpkt_frame(b"\x06\x80\x00\x01\x00\x01\x00"))
+                if close_on_reject:
+                    return
+                continue
+            s7 = packet[7:]
+            (reference,) = struct.unpack_from(">H", s7, 4)
+            if s7[1] == 0x01:
+                # Setup Communication, PDU size 240
+                conn.sendall(s7_ack_data(reference, b"\xf0\x00\x00\x01\x00\x01\x00\xf0"))
+            elif answer_szl:
+                (szl_id,) = struct.unpack_from(">H", s7, 22)
+                records = S7_MODULE_RECORDS if szl_id == 0x0011 else S7_COMPONENT_RECORDS
+                conn.sendall(szl_response(reference, szl_id, records))
+
+    return handler
@@ -0,0 +1,84 @@
+from ironflow.core.config import IronConfig, config
+from ironflow.core.engine import IronEngine
+from ironflow.core.error_handler import ProtocolTimeoutError
+from ironflow.discovery.active import ActiveDiscovery
+from ironflow.discovery.sweep import OPEN, PortSweeper
+from ironflow.discovery.targets import TargetSet
+from ironflow.protocols.bacnet.scanner import BACnetScanner, WHO_IS
+
+from tests.responders import I_AM, free_udp_port
+
+def start_devices(udp_responder, hosts):
+    port = free_udp_port()
+    devices = [udp_responder(host, port, I_AM, match=lambda data: data == WHO_IS) for host in hosts]
+    return port, devices
+
+def test_bacnet_identify_many_shares_one_socket(udp_responder, fast_reads):
+    port, devices = start_devices(udp_responder, ["127.0.0.2", "127.0.0.3"])
+    found = dict(BACnetScanner().identify_many(["127.0.0.2", "127.0.0.3", "127.0.0.4"], port, 0.5))
+
+    assert found["127.0.0.2"]["device_instance"] == 131073
+    assert found["127.0.0.3"]["vendor_id"] == 15
+    assert isinstance(found["127.0.0.4"], ProtocolTimeoutError)
+    assert [device.requests for device in devices] == [[WHO_IS], [WHO_IS]]
+
+def test_run_batch_results_carry_timeouts(udp_responder, fast_reads):
+    port, _ = start_devices(udp_responder, ["127.0.0.2"])
+    results = {result["target"]: result for result in
+               BACnetScanner().run_batch(["127.0.0.2", "127.0.0.4"], port=port, timeout=0.3)}
+
+    assert results["127.0.0.2"]["online"]
+    assert results["127.0.0.4"].get("timed_out")
+
+def test_scan_dispatches_host_blocks_to_batching_plugin(udp_responder, fast_reads, monkeypatch):
+    port, _ = start_devices(udp_responder, ["127.0.0.2", "127.0.0.3"])
+    monkeypatch.setattr(config, "TIMEOUT", 0.5)
+
+    plugin = BACnetScanner()
+    plugin.default_port = port
+    blocks = []
+    identify_many = plugin.identify_many
+
+    def recording(targets, *args):
+        targets = list(targets)
+        blocks.append(sorted(targets))
+        return identify_many(targets, *args)
+
+    plugin.identify_many = recording
+    engine = IronEngine()
+    engine.plugins["bacnet"] = plugin
+    settings = IronConfig(PRESWEEP=False, RETRIES=0, RATE_LIMIT_HOST=0, RATE_LIMIT_SUBNET=0)
+
+    results = ActiveDiscovery(engine, settings).scan_network(TargetSet(["127.0.0.2-4"]), ["bacnet"])
+
+    assert sorted(result["target"] for result in results) == ["127.0.0.2", "127.0.0.3"]
+    assert blocks == [["127.0.0.2", "127.0.0.3", "127.0.0.4"]]
+
+def test_retries_of_batching_plugin_go_out_in_blocks(fast_reads, monkeypatch):
+    # Open but unanswered BACnet service on three hosts: every probe is ambiguous
+    async def sweep_host(self, target, checks, scheduler=None):
+        return {service: OPEN for _, service, _ in checks}
+
+    monkeypatch.setattr(PortSweeper, "sweep_host", sweep_host)
+    monkeypatch.setattr(config, "TIMEOUT", 0.3)
+    plugin = BACnetScanner()
+    plugin.default_port = free_udp_port()
+    blocks = []
+    identify_many = plugin.identify_many
+
+    def recording(targets, *args):
+        targets = list(targets)
+        blocks.append(sorted(targets))
+        return identify_many(targets, *args)
+
+    def single(*args):
+        raise AssertionError("retry bypassed the batch path")
+
+    plugin.identify_many = recording
+    plugin.identify = single
+    engine = IronEngine()
+    engine.plugins["bacnet"] = plugin
+    settings = IronConfig(RETRIES=1, RETRY_BACKOFF=0, RATE_LIMIT_HOST=0, RATE_LIMIT_SUBNET=0)
+
+    assert ActiveDiscovery(engine, settings).scan_network(TargetSet(["127.0.0.2-4"]), ["bacnet"]) == []
+    assert blocks == [["127.0.0.2", "127.0.0.3", "127.0.0.4"]] * 2
@@ -0,0 +1,78 @@
+import pytest
+from click.testing import CliRunner
+
+from ironflow.cli.main import cli
+from ironflow.core.config import IronConfig
+from ironflow.core.engine import IronEngine
+from ironflow.discovery.active import ActiveDiscovery
+from ironflow.discovery.targets import TargetSet
+from ironflow.protocols.bacnet.scanner import BACnetScanner, WHO_IS
+from ironflow.protocols.ethernetip.scanner import EthernetIPScanner, LIST_IDENTITY
+
+from tests.responders import I_AM, free_udp_port, list_identity_reply
+
+def test_bacnet_who_is_collects_i_am(udp_responder):
+    port = free_udp_port()
+    for host in ["127.0.0.2", "127.0.0.3"]:
+        udp_responder(host, port, I_AM, match=lambda data: data == WHO_IS)
+    # The I-Am port is taken by the responders, so replies come back directly
+    found = dict(BACnetScanner().broadcast(["127.0.0.2", "127.0.0.3", "127.0.0.4"], port, 0.3))
+
+    assert sorted(found) == ["127.0.0.2", "127.0.0.3"]
+    assert found["127.0.0.2"]["device_instance"] == 131073
+    assert found["127.0.0.2"]["max_apdu"] == 480
+    assert found["127.0.0.3"]["vendor_id"] == 15
+
+def test_enip_list_identity_reports_each_responder_once(udp_responder):
+    port = free_udp_port()
+    udp_responder("127.0.0.2", port, list_identity_reply(), match=lambda data: data == LIST_IDENTITY, repeat=3)
+    # The same device reached twice still answers three times per request
+    found = list(EthernetIPScanner().broadcast(["127.0.0.2", "127.0.0.2"], port, 0.3))
+
+    assert len(found) == 1
+    responder, details = found[0]
+    assert responder == "127.0.0.2"
+    assert details["product_name"] == "1756-L71/B LOGIX5571"
+    assert details["serial"] == "c0ffee01"
+    assert details["revision"] == "20.11"
+
+def test_broadcast_ignores_unparsable_replies(udp_responder):
+    port = free_udp_port()
+    udp_responder("127.0.0.2", port, b"\x81\x0b\x00\x04")
+    assert list(BACnetScanner().broadcast(["127.0.0.2"], port, 0.2)) == []
+
+@pytest.mark.parametrize("address", ["ff02::1", "::ffff:10.0.0.255", "plc.local", "10.0.0.256"])
+def test_broadcast_rejects_non_ipv4(address):
+    with pytest.raises(ValueError):
+        list(EthernetIPScanner().broadcast([address], 44818, 0.1))
+
+def test_cli_rejects_ipv6_broadcast_address():
+    result = CliRunner().invoke(cli, ["scan", "--target", "10.0.0.1", "--no-db", "--broadcast-address", "ff02::1"])
+    assert result.exit_code == 2
+    assert "--broadcast-address" in result.output
+
+def test_unicast_skipped_only_where_broadcast_was_answered(monkeypatch):
+    engine = IronEngine()
+    engine.plugins["bacnet"] = BACnetScanner()
+    probed = []
+
+    async def run_broadcast_async(name, addresses, **kwargs):
+        # The routed 10.0.2.0/24 drops the directed broadcast
+        assert sorted(addresses) == ["10.0.1.255", "10.0.2.255"]
+        return [{"target": "10.0.1.5", "port": 47808, "protocol": "BACnet/IP", "online": True,
+                 "details": {"device_instance": 5}, "broadcast": True}]
+
+    async def run_batch_async(name, targets, **kwargs):
+        probed.extend(targets)
+        return dict.fromkeys(targets)
+
+    monkeypatch.setattr(engine, "run_broadcast_async", run_broadcast_async)
+    monkeypatch.setattr(engine, "run_batch_async", run_batch_async)
+    settings = IronConfig(BROADCAST_DISCOVERY=True, PRESWEEP=False, RETRIES=0,
+                          RATE_LIMIT_GLOBAL=0, RATE_LIMIT_HOST=0, RATE_LIMIT_SUBNET=0)
+
+    results = ActiveDiscovery(engine, settings).scan_network(TargetSet(["10.0.1.0/24", "10.0.2.0/24"]), ["bacnet"])
+
+    assert [result["target"] for result in results] == ["10.0.1.5"]
+    assert len(probed) == 256
+    assert all(target.startswith("10.0.2.") for target in probed)
@@ -0,0 +1,41 @@
+from ironflow.discovery.journal import ScanJournal
+
+def crashed_journal(path) -> ScanJournal:
+    journal = ScanJournal(str(path))
+    journal.start("10.0.0.0/29", ["modbus"])
+    journal.record_host("10.0.0.1", [])
+    journal.record_host("10.0.0.2", [])
+    journal.close()
+    # A crash mid-write leaves half a record behind
+    with open(path, "rb+") as f:
+        f.truncate(f.seek(0, 2) - 10)
+    return journal
+
+def test_resume_after_truncated_record_keeps_new_records(tmp_path):
+    path = tmp_path / "journal.jsonl"
+    crashed_journal(path)
+
+    journal = ScanJournal(str(path))
+    assert journal.load()
+    assert set(journal.hosts) == {"10.0.0.1"}
+    journal.start("10.0.0.0/29", ["modbus"], resume=True)
+    journal.record_host("10.0.0.3", [{"target": "10.0.0.3", "online": True}])
+    journal.close()
+
+    reloaded = ScanJournal(str(path))
+    assert reloaded.load()
+    assert set(reloaded.hosts) == {"10.0.0.1", "10.0.0.3"}
+    assert reloaded.hosts["10.0.0.3"][0]["online"]
+
+def test_resume_keeps_complete_journal_intact(tmp_path):
+    path = tmp_path / "journal.jsonl"
+    journal = ScanJournal(str(path))
+    journal.start("10.0.0.0/29", ["modbus"])
+    journal.record_probe("10.0.0.1", "modbus", None)
+    journal.close()
+    before = path.read_bytes()
+
+    resumed = ScanJournal(str(path))
+    resumed.start("10.0.0.0/29", ["modbus"], resume=True)
+    resumed.close()
+    assert path.read_bytes() == before
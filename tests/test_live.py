@@ -0,0 +1,101 @@
+import io
+import os
+import struct
+import sys
+
+import pytest
+from click.testing import CliRunner
+
+from ironflow.cli.main import cli
+from ironflow.discovery import live
+from ironflow.discovery.live import LiveCapture
+from ironflow.discovery.passive import PassiveDiscovery
+from ironflow.discovery.ports import PortClassifier
+
+def tcp_frame(src: str, dst: str, sport: int, dport: int) -> bytes:
+    """Ethernet/IPv4/TCP frame without payload (checksums left at zero)."""
+    tcp = struct.pack(">HHIIBBHHH", sport, dport, 0, 0, 5 << 4, 0x18, 8192, 0, 0)
+    ip = struct.pack(">BBHHHBBH4s4s", 0x45, 0, 20 + len(tcp), 0, 0, 64, 6, 0,
+                     bytes(map(int, src.split("."))), bytes(map(int, dst.split("."))))
+    return b"\x00\x11\x22\x33\x44\x55\x66\x77\x88\x99\xaa\xbb\x08\x00" + ip + tcp
+
+def pcap(frames) -> bytes:
+    """Classic little-endian pcap with an Ethernet link type."""
+    data = struct.pack("<IHHiIII", 0xA1B2C3D4, 2, 4, 0, 0, 65535, 1)
+    for number, frame in enumerate(frames):
+        data += struct.pack("<IIII", 1700000000 + number, 0, len(frame), len(frame)) + frame
+    return data
+
+CAPTURE = pcap([
+    tcp_frame("10.0.0.5", "10.0.0.10", 40000, 502),
+    tcp_frame("10.0.0.10", "10.0.0.5", 502, 40000),
+    tcp_frame("10.0.0.6", "10.0.0.11", 40001, 102),
+    tcp_frame("10.0.0.6", "10.0.0.12", 40002, 80),
+])
+
+class RecordingDatabase:
+    def __init__(self):
+        self.saved = []
+
+    def save_assets(self, assets):
+        self.saved.extend(assets)
+
+@pytest.fixture
+def piped_stdin(monkeypatch):
+    """Replay CAPTURE through a real pipe standing in for stdin."""
+    read_fd, write_fd = os.pipe()
+    with os.fdopen(write_fd, "wb") as writer:
+        writer.write(CAPTURE)
+    stdin = io.TextIOWrapper(os.fdopen(read_fd, "rb"))
+    monkeypatch.setattr(sys, "stdin", stdin)
+    yield
+    stdin.close()
+
+def test_live_capture_replays_stdin(piped_stdin):
+    db = RecordingDatabase()
+    live = LiveCapture(PassiveDiscovery(), db=db, flush_interval=0.05)
+    findings = live.run("-", duration=10)
+
+    assert {finding["target"]: finding["protocol"] for finding in findings} == {
+        "10.0.0.10": "Modbus TCP",
+        "10.0.0.11": "S7Comm",
+    }
+    assert live.stats["captured"] == 4
+    assert live.stats["processed"] == 4
+    assert live.stats["dropped"] == 0
+    assert {asset["target"] for asset in db.saved} == {"10.0.0.10", "10.0.0.11"}
+    assert live.passive.stats["packets"] == 4
+
+def test_process_packet_is_public():
+    passive = PassiveDiscovery()
+    findings = {}
+    infos = list(passive.decode_records([(1.0, 1, CAPTURE, 40, 54, 54)]))
+    assert passive.process_packet(infos[0], findings) == "10.0.0.10"
+    assert findings["10.0.0.10"]["protocol"] == "Modbus TCP"
+
+@pytest.mark.parametrize("interval", [0, -1.0])
+def test_live_capture_rejects_non_positive_flush_interval(interval):
+    with pytest.raises(ValueError):
+        LiveCapture(PassiveDiscovery(PortClassifier()), flush_interval=interval)
+
+def test_cli_rejects_zero_flush_interval():
+    result = CliRunner().invoke(cli, ["analyze", "--live", "-", "--flush-interval", "0"])
+    assert result.exit_code == 2
+    assert "--flush-interval" in result.output
+
+def test_followed_capture_file_is_closed(tmp_path, monkeypatch):
+    path = tmp_path / "growing.pcap"
+    path.write_bytes(CAPTURE)
+    opened = []
+
+    class RecordingFollowStream(live.FollowStream):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            opened.append(self)
+
+    monkeypatch.setattr(live, "FollowStream", RecordingFollowStream)
+    findings = LiveCapture(PassiveDiscovery(), flush_interval=0.05).run(str(path), duration=0.3)
+
+    assert len(findings) == 2
+    assert len(opened) == 1
+    assert opened[0].file.closed
@@ -0,0 +1,78 @@
+import time
+
+from ironflow.core.config import config
+from ironflow.protocols.modbus.scanner import ModbusScanner
+
+from tests.responders import device_id_pdu, modbus_device
+
+# Basic identification stream of unit 255: vendor and product code
+IDENTITY = {0x00: device_id_pdu({0x00: b"Acme Co", 0x01: b"X-10"})}
+
+def test_silent_units_do_not_cost_the_timeout(tcp_responder):
+    device = tcp_responder(modbus_device({255: IDENTITY}))
+    started = time.monotonic()
+    info = ModbusScanner().identify("127.0.0.1", device.port, 3.0)
+
+    assert time.monotonic() - started < config.MODBUS_UNIT_GAP + 0.5
+    assert info["unit_id"] == 255
+    assert info["vendor"] == "Acme Co"
+    assert info["product_code"] == "X-10"
+
+def test_slow_reply_outlives_the_learned_connect_timeout(tcp_responder):
+    # A serial gateway: fast handshake, half a second to answer
+    device = tcp_responder(modbus_device({255: IDENTITY}, delays={255: 0.5}))
+    info = ModbusScanner().identify("127.0.0.1", device.port, 0.25)
+
+    assert info["vendor"] == "Acme Co"
+
+def test_silent_device_is_flagged_for_retry(tcp_responder, fast_reads):
+    device = tcp_responder(modbus_device({}))
+    result = ModbusScanner().run("127.0.0.1", port=device.port, timeout=0.25)
+
+    assert result["timed_out"]
+    assert result["online"]
+    assert result["details"]["fingerprint"] == "Modbus TCP port open (no response)"
+
+def test_exception_response_without_identification(tcp_responder):
+    # Illegal function: a Modbus device without Read Device Identification
+    device = tcp_responder(modbus_device({255: {0x00: b"\xab\x01"}}))
+    info = ModbusScanner().identify("127.0.0.1", device.port, 3.0)
+
+    assert info["fingerprint"] == "Modbus TCP (device identification not supported)"
+    assert info["exception_code"] == 1
+    assert info["units"] == [255]
+
+def test_more_follows_is_continued(tcp_responder):
+    device = tcp_responder(modbus_device({255: {
+        0x00: device_id_pdu({0x00: b"Acme Co", 0x01: b"X-10"}, next_object=0x02),
+        0x02: device_id_pdu({0x02: b"v2.1"}),
+    }}))
+    info = ModbusScanner().identify("127.0.0.1", device.port, 3.0)
+
+    assert (info["vendor"], info["product_code"], info["revision"]) == ("Acme Co", "X-10", "v2.1")
+
+def test_slow_unit_behind_gateway_is_kept(tcp_responder):
+    # The gateway itself answers at once, the serial slave 0.6 s later
+    device = tcp_responder(modbus_device(
+        {255: IDENTITY, 1: {0x00: device_id_pdu({0x00: b"Slave Co"})}}, delays={1: 0.6}))
+    info = ModbusScanner().identify("127.0.0.1", device.port, 3.0)
+
+    assert info["units"] == [1, 255]
+    assert info["vendor"] == "Acme Co"
+
+def test_unit_gap_follows_a_slow_device(tcp_responder, monkeypatch):
+    monkeypatch.setattr(config, "MODBUS_UNIT_GAP", 0.2)
+    # First answer after 0.4 s: the others get twice that, not 0.2 s
+    device = tcp_responder(modbus_device(
+        {255: IDENTITY, 1: {0x00: device_id_pdu({0x00: b"Slave Co"})}}, delays={255: 0.4, 1: 0.9}))
+    info = ModbusScanner().identify("127.0.0.1", device.port, 3.0)
+
+    assert info["units"] == [1, 255]
+
+def test_unit_gap_is_configurable(tcp_responder, monkeypatch):
+    monkeypatch.setattr(config, "MODBUS_UNIT_GAP", 0.2)
+    device = tcp_responder(modbus_device(
+        {255: IDENTITY, 1: {0x00: device_id_pdu({0x00: b"Slave Co"})}}, delays={1: 0.6}))
+    info = ModbusScanner().identify("127.0.0.1", device.port, 3.0)
+
+    assert info["units"] == [255]
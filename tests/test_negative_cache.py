@@ -0,0 +1,57 @@
+import pytest
+
+from ironflow.core.config import IronConfig
+from ironflow.core.engine import IronEngine
+from ironflow.discovery.active import ActiveDiscovery
+from ironflow.discovery.sweep import FILTERED, PortSweeper
+from ironflow.protocols.bacnet.scanner import BACnetScanner
+from ironflow.protocols.modbus.scanner import ModbusScanner
+from ironflow.protocols.s7.scanner import S7Scanner
+
+@pytest.fixture
+def firewalled(monkeypatch):
+    """Every swept service times out, as behind a dropping firewall."""
+    swept = []
+
+    async def sweep_host(self, target, checks, scheduler=None):
+        services = [service for _, service, _ in checks]
+        swept.append(sorted(services))
+        return {service: FILTERED for service in services}
+
+    monkeypatch.setattr(PortSweeper, "sweep_host", sweep_host)
+    return swept
+
+def discovery() -> ActiveDiscovery:
+    engine = IronEngine()
+    engine.plugins.update(modbus=ModbusScanner(), s7=S7Scanner())
+    return ActiveDiscovery(engine, IronConfig(RETRIES=0, RATE_LIMIT_HOST=0, RATE_LIMIT_SUBNET=0))
+
+def test_partial_protocol_selection_does_not_cache_host(firewalled):
+    active = discovery()
+    assert active.scan_network("10.0.0.1", ["modbus"]) == []
+    assert not active.engine.negative_cache.is_dead("10.0.0.1")
+
+    # A later scan of every protocol still sweeps the S7 service
+    assert active.scan_network("10.0.0.1", ["modbus", "s7"]) == []
+    assert firewalled[-1] == [("tcp", 102), ("tcp", 502)]
+
+def test_sweep_of_every_service_caches_host(firewalled):
+    active = discovery()
+    active.scan_network("10.0.0.1", ["modbus", "s7"])
+    assert active.engine.negative_cache.is_dead("10.0.0.1")
+
+def test_silent_host_gets_no_retries(firewalled):
+    engine = IronEngine()
+    engine.plugins.update(modbus=ModbusScanner(), bacnet=BACnetScanner())
+    active = ActiveDiscovery(engine, IronConfig(RETRIES=2, RETRY_BACKOFF=0, RATE_LIMIT_HOST=0, RATE_LIMIT_SUBNET=0))
+    retried = []
+
+    async def run_plugin_async(name, target, **kwargs):
+        retried.append((name, target))
+
+    engine.run_plugin_async = run_plugin_async
+    engine.run_batch_async = run_plugin_async
+
+    assert active.scan_network("10.0.0.1-16", ["modbus", "bacnet"]) == []
+    assert retried == []
+    assert all(engine.negative_cache.is_dead(f"10.0.0.{host}") for host in range(1, 17))
@@ -0,0 +1,35 @@
+import json
+import os
+
+import pytest
+
+from ironflow.reporting.generator import ReportGenerator
+
+ASSET = {"target": "10.0.0.10", "protocols": ["Modbus TCP"], "risk": {"severity": "High", "score": 80}}
+
+def test_stream_writes_reports_on_exit(tmp_path):
+    with ReportGenerator(str(tmp_path)).stream("t") as stream:
+        stream.add(ASSET)
+        stream.add(dict(ASSET, target="10.0.0.11"))
+
+    assert sorted(os.listdir(tmp_path)) == ["report_t.html", "report_t.json"]
+    with open(stream.json_path) as f:
+        assert [result["target"] for result in json.load(f)["results"]] == ["10.0.0.10", "10.0.0.11"]
+    with open(stream.html_path) as f:
+        assert "Total Assets: 2" in f.read()
+
+def test_stream_leaves_nothing_behind_on_error(tmp_path):
+    with pytest.raises(KeyError):
+        with ReportGenerator(str(tmp_path)).stream("t") as stream:
+            stream.add(ASSET)
+            raise KeyError("scan failed")
+
+    assert os.listdir(tmp_path) == []
+
+def test_explicit_abort_and_close_are_final(tmp_path):
+    with ReportGenerator(str(tmp_path)).stream("a") as stream:
+        stream.abort()
+    with ReportGenerator(str(tmp_path)).stream("c") as stream:
+        stream.close()
+
+    assert sorted(os.listdir(tmp_path)) == ["report_c.html", "report_c.json"]
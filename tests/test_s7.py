@@ -0,0 +1,90 @@
+import struct
+
+from ironflow.protocols.s7.scanner import (
+    S7Scanner, cotp_connect_request, parse_component_id, parse_module_id, parse_s7, read_szl,
+    setup_communication, szl_records, tpkt,
+)
+
+from tests.responders import (
+    S7_COMPONENT_RECORDS, S7_MODULE_RECORDS, s7_ack_data, s7_device, szl_response, tpkt_frame,
+)
+
+def test_tpkt_and_cotp_framing():
+    assert tpkt(b"\x01\x02") == b"\x03\x00\x00\x06\x01\x02"
+    request = cotp_connect_request(0, 2)
+    assert struct.unpack_from(">H", request, 2)[0] == len(request)
+    # Length indicator, then CR TPDU code
+    assert request[4] == len(request) - 5
+    assert request[5] == 0xE0
+    assert struct.unpack_from(">H", request, 17)[0] == 0x0102
+    assert struct.unpack_from(">H", cotp_connect_request(1, 3), 17)[0] == 0x0123
+
+def test_requests_are_s7_jobs_and_userdata():
+    rosctr, parameters, data = parse_s7(setup_communication(1))
+    assert (rosctr, parameters[0], data) == (0x01, 0xF0, b"")
+    rosctr, _, data = parse_s7(read_szl(2, 0x001C))
+    assert rosctr == 0x07
+    assert struct.unpack_from(">HH", data, 4) == (0x001C, 0)
+
+def test_parse_s7_ack_data_skips_error_bytes():
+    rosctr, parameters, data = parse_s7(s7_ack_data(1, b"\xf0\x00\x00\x01\x00\x01\x00\xf0"))
+    assert rosctr == 0x03
+    assert struct.unpack_from(">H", parameters, 6)[0] == 240
+    assert data == b""
+
+def test_parse_s7_rejects_other_tpdus():
+    assert parse_s7(tpkt_frame(b"\x11\xd0\x00\x01\x00\x01\x00\xc0\x01\x0a")) is None
+    assert parse_s7(tpkt_frame(b"\x02\xf0\x80" + b"\x00" * 10)) is None
+
+def test_szl_records_and_parsers():
+    module = parse_module_id(szl_records(parse_s7(szl_response(2, 0x0011, S7_MODULE_RECORDS))[2]))
+    assert module == {
+        "order_number": "6ES7 214-1AG40-0XB0",
+        "hardware_version": "V1.0.0",
+        "firmware": "V4.2.3",
+    }
+    component = parse_component_id(szl_records(parse_s7(szl_response(3, 0x001C, S7_COMPONENT_RECORDS))[2]))
+    assert component == {
+        "plc_name": "PLC_1",
+        "module_name": "CPU 1214C DC/DC/DC",
+        "serial_number": "S C-X4U421302009",
+    }
+
+def test_szl_error_return_code_has_no_records():
+    assert szl_records(parse_s7(szl_response(2, 0x0011, S7_MODULE_RECORDS, return_code=0x0A))[2]) == []
+
+def test_identify_reads_module_and_component(tcp_responder):
+    device = tcp_responder(s7_device(accept=(0, 1)))
+    info = S7Scanner().identify("127.0.0.1", device.port, 1.0)
+
+    assert (info["rack"], info["slot"]) == (0, 1)
+    assert info["fingerprint"] == "S7comm"
+    assert info["pdu_size"] == 240
+    assert info["model_hint"] == "S7-1200"
+    assert info["firmware"] == "V4.2.3"
+    assert info["plc_name"] == "PLC_1"
+    assert device.connections == 1
+
+def test_identify_reconnects_after_peer_hangs_up_on_rejection(tcp_responder):
+    device = tcp_responder(s7_device(accept=(0, 0), close_on_reject=True))
+    info = S7Scanner().identify("127.0.0.1", device.port, 1.0)
+
+    assert (info["rack"], info["slot"]) == (0, 0)
+    assert info["serial_number"] == "S C-X4U421302009"
+    # Slots 2 and 1 were each rejected on a connection of their own
+    assert device.connections == 3
+
+def test_identify_without_accepted_rack_slot(tcp_responder):
+    device = tcp_responder(s7_device(accept=(7, 7)))
+    info = S7Scanner().identify("127.0.0.1", device.port, 1.0)
+
+    assert info["fingerprint"] == "ISO-TSAP service (no rack/slot accepted)"
+    assert "rack" not in info
+
+def test_stalled_szl_read_is_retried_with_fingerprint(tcp_responder, fast_reads):
+    device = tcp_responder(s7_device(answer_szl=False))
+    result = S7Scanner().run("127.0.0.1", port=device.port, timeout=0.25)
+
+    assert result["timed_out"]
+    assert result["online"]
+    assert result["details"]["fingerprint"] == "S7 compatible"
@@ -0,0 +1,16 @@
+from itertools import islice
+
+from ironflow.discovery.targets import TargetSet
+
+def test_size_counts_ranges_exclusions_and_hostnames():
+    targets = TargetSet(["10.0.0.0/24", "10.0.0.10-20", "plc.local"], exclude=["10.0.0.0/28"])
+    assert targets.size == 256 - 16 + 1
+    assert targets.size == len(list(targets))
+
+def test_ipv6_slash_64_has_an_int_size():
+    targets = TargetSet(["fd00::/64"], randomize=True, seed=1)
+    assert targets.size == 2 ** 64
+    sample = list(islice(targets, 100))
+    assert len(set(sample)) == 100
+    assert all(address in targets for address in sample)
+    assert "fd00:0:0:1::1" not in targets